@@ -1,9 +1,36 @@
-import boto3
 import os
 import argparse
 import datetime
+import importlib.util
 from botocore.exceptions import ClientError
-import pandas as pd
+
+
+# Modules lourds utilisés par chaque action. boto3 et pandas ne sont importés
+# qu'au moment où une action s'en sert : create_bucket ou list_bucket démarrent
+# sans charger pandas (voir startup_benchmark.py).
+ACTION_DEPENDENCIES = {
+    "create_bucket": ["boto3"],
+    "upload_file": ["boto3"],
+    "list_bucket": ["boto3"],
+    "process_pipeline": ["boto3", "pandas", "pyarrow"],
+    "revenue": ["boto3", "pandas", "pyarrow"],
+    "preview": ["boto3", "pandas", "pyarrow"],
+    "query": ["boto3", "pandas", "pyarrow"],
+    "all": ["boto3"],
+}
+
+
+def missing_dependencies(action):
+    """
+    Modules requis par une action mais non installés (vérifiés sans les importer).
+    
+    Args:
+        action (str): Action de la ligne de commande
+    
+    Returns:
+        list[str]: Modules manquants
+    """
+    return [module for module in ACTION_DEPENDENCIES[action] if importlib.util.find_spec(module) is None]
 
 
 def create_bucket(bucket_name):
@@ -117,7 +144,9 @@ def process_pipeline(bucket_name, raw_key, processed_key=None):
     1. Télécharge le fichier CSV depuis raw/current/
     2. Lit et valide le contenu avec pandas
     3. Transforme les données (suppression des NaN)
-    4. Sauvegarde en Parquet dans processed/
+    4. Sauvegarde en Parquet dans processed/, enregistre son footer dans le
+       catalogue local (processed_catalog.db) et met à jour les agrégats
+       de chiffre d'affaires (processed/_aggregates/revenue.parquet)
     5. Archive le fichier brut dans raw/archived/ avec timestamp
     6. Supprime le fichier de raw/current/
     
@@ -137,10 +166,8 @@ def process_pipeline(bucket_name, raw_key, processed_key=None):
     """
     global s3
     
-    # Vérifier que pyarrow est installé
-    try:
-        import pyarrow
-    except ImportError:
+    # Vérifier que pyarrow est installé (sans l'importer : pandas le chargera pour l'écriture Parquet)
+    if importlib.util.find_spec("pyarrow") is None:
         print("❌ Erreur : pyarrow n'est pas installé.")
         print("   Le format Parquet nécessite pyarrow.")
         print("   Installez-le avec : pip install pyarrow")
@@ -149,6 +176,11 @@ def process_pipeline(bucket_name, raw_key, processed_key=None):
             "Installez-le avec: pip install pyarrow"
         )
     
+    import pandas as pd
+    from parquet_catalog import CATALOG_PATH, open_catalog, register_uploaded_file
+    from parquet_tuning import describe, load_writer_config, writer_options
+    from sales_analytics import REVENUE_COLUMNS, has_revenue_columns, update_aggregates
+    
     # Déterminer le nom du fichier et la clé de destination
     filename = os.path.basename(raw_key)
     base_name = os.path.splitext(filename)[0]  # "ventes" sans extension
@@ -190,10 +222,28 @@ def process_pipeline(bucket_name, raw_key, processed_key=None):
         
         # Étape 4 : Sauvegarder en Parquet
         print(f"\nÉtape 4 : Sauvegarde en format Parquet...")
-        df.to_parquet(local_parquet)
+        # Codec / encodages choisis par parquet_tuning.py pour ce jeu de données (défauts de pandas sinon)
+        writer_config = load_writer_config().get(base_name)
+        df.to_parquet(local_parquet, **writer_options(base_name, list(df.columns)))
+        if writer_config:
+            print(f"   ⚙️  Options d'écriture réglées: {describe(writer_config)}")
         s3.upload_file(local_parquet, bucket_name, processed_key)
         print(f"   ✅ Fichier transformé déposé dans: {processed_key}")
         
+        # Catalogue local des footers Parquet (lignes, row groups, min / max par colonne)
+        catalog = open_catalog()
+        register_uploaded_file(catalog, s3, bucket_name, processed_key, local_parquet)
+        catalog.close()
+        print(f"   ✅ Métadonnées ajoutées au catalogue: {os.path.basename(CATALOG_PATH)}")
+        
+        # Étape 4 bis : Mettre à jour les agrégats de chiffre d'affaires (fichiers de ventes seulement)
+        print(f"\nÉtape 4 bis : Mise à jour des agrégats de chiffre d'affaires...")
+        if has_revenue_columns(df):
+            aggregates_key = update_aggregates(s3, bucket_name, processed_key, df)
+            print(f"   ✅ Agrégats mis à jour dans: {aggregates_key}")
+        else:
+            print(f"   ℹ️  Ignorée : {filename} n'a pas les colonnes {', '.join(REVENUE_COLUMNS)}")
+        
         # Étape 5 : Archiver le fichier brut
         print(f"\nÉtape 5 : Archivage du fichier brut...")
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -260,8 +310,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gestion de fichiers avec AWS S3")
     parser.add_argument(
         "action",
-        choices=["create_bucket", "upload_file", "list_bucket", "process_pipeline", "all"],
-        help="Action à exécuter: create_bucket, upload_file, list_bucket, process_pipeline, ou all"
+        choices=["create_bucket", "upload_file", "list_bucket", "process_pipeline", "revenue", "preview", "query", "all"],
+        help="Action à exécuter: create_bucket, upload_file, list_bucket, process_pipeline, revenue, preview, query, ou all"
     )
     parser.add_argument(
         "--bucket",
@@ -298,9 +348,69 @@ if __name__ == "__main__":
         default=None,
         help="Clé S3 de destination pour le fichier transformé (défaut: processed/ventes.parquet)"
     )
+    parser.add_argument(
+        "--by",
+        nargs="+",
+        default=["region"],
+        help="Dimensions du chiffre d'affaires pour l'action revenue: date, country, region, product (défaut: region)"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="revenue : garder les objets lus dans le cache local (.s3_cache), revalidé par ETag"
+    )
+    parser.add_argument(
+        "--key",
+        default=None,
+        help="Objet à prévisualiser avec preview, csv/json/parquet (défaut: --raw-key)"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=5,
+        help="Nombre de lignes affichées par preview et query sans --agg (défaut: 5)"
+    )
+    parser.add_argument(
+        "--select",
+        action="store_true",
+        help="preview : demander l'échantillon à S3 Select (repli sur des GET par plage si non disponible)"
+    )
+    parser.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        help="query : filtre colonne opérateur valeur, répétable (ex: --where \"region = West\")"
+    )
+    parser.add_argument(
+        "--group-by",
+        nargs="+",
+        default=[],
+        help="query : colonnes de regroupement"
+    )
+    parser.add_argument(
+        "--agg",
+        action="append",
+        default=[],
+        help="query : agrégation, répétable : count, count:col, sum:col, min:col, max:col, mean:col"
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        default=[],
+        help="query : colonnes affichées sans --agg ; preview : colonnes de l'échantillon (défaut: toutes)"
+    )
     
     args = parser.parse_args()
     
+    missing = missing_dependencies(args.action)
+    if missing:
+        print(f"❌ Module(s) manquant(s) pour {args.action} : {', '.join(missing)}")
+        print(f"   Installez-le(s) avec : pip install {' '.join(missing)}")
+        raise SystemExit(1)
+    
+    # Import après l'analyse des arguments : --help et les erreurs de saisie restent instantanés
+    import boto3
+    
     # Initialisation du client S3 avec ou sans profil
     if args.profile:
         session = boto3.Session(profile_name=args.profile)
@@ -317,6 +427,26 @@ if __name__ == "__main__":
         list_bucket(args.bucket, prefix=args.prefix)
     elif args.action == "process_pipeline":
         process_pipeline(args.bucket, args.raw_key, args.processed_key)
+    elif args.action == "revenue":
+        from object_cache import ObjectCache
+        from sales_analytics import query_revenue
+        cache = ObjectCache() if args.cache else None
+        print(query_revenue(s3, args.bucket, by=args.by, cache=cache).to_string(index=False))
+        if cache is not None:
+            print(cache.summary())
+    elif args.action == "preview":
+        from object_preview import preview_object, print_preview
+        key = args.key or args.raw_key
+        print_preview(key, preview_object(s3, args.bucket, key, args.rows, args.select, args.columns))
+    elif args.action == "query":
+        from parquet_catalog import parse_filter
+        from parquet_query import parse_aggregation, print_stats, run_query
+        result, stats = run_query(
+            s3, args.bucket, args.columns, [parse_filter(w) for w in args.where], args.group_by,
+            [parse_aggregation(a) for a in args.agg], limit=None if args.agg else args.rows,
+        )
+        print(result.to_pandas().to_string(index=False) if result.num_columns else "(aucun résultat)")
+        print_stats(stats)
     elif args.action == "all":
         # Exécution de tous les blocs
         create_bucket(args.bucket)
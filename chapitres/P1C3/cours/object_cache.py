@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".s3_cache")
+INDEX_FILENAME = "index.json"
+# Budgets par défaut : 512 Mo sur disque, 64 Mo en mémoire (objets les plus récents)
+DISK_BUDGET_BYTES = 512 * 1024 * 1024
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+class ObjectCache:
+    """
+    Cache local (mémoire + disque) devant `get_object`.
+
+    Chaque objet est rangé sous (bucket, clé) avec son ETag. Avant de servir
+    une copie locale, un GET conditionnel (`If-None-Match: <ETag>`) vérifie
+    auprès de S3 / MinIO qu'elle est à jour : la réponse 304 ne contient aucun
+    octet. Si l'objet a changé, la nouvelle version remplace l'ancienne.
+
+    Les deux niveaux ont un budget en octets et évincent l'objet utilisé le
+    moins récemment (LRU). L'index du disque (ordre LRU, ETag, taille) est
+    conservé dans `index.json`, pour resservir le cache d'une exécution à l'autre.
+
+    Attributes:
+        hits (int): Lectures servies par le cache (copie confirmée par un 304)
+        misses (int): Lectures téléchargées (objet absent du cache ou modifié)
+        bytes_saved (int): Octets non retéléchargés grâce au cache
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, disk_budget=DISK_BUDGET_BYTES, memory_budget=MEMORY_BUDGET_BYTES):
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_budget
+        self.memory_budget = memory_budget
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self.load_index()
+
+    # ------------------------------------------------------------------
+    # Index du disque
+    # ------------------------------------------------------------------
+
+    def load_index(self):
+        """Index du disque dans l'ordre LRU (du moins au plus récemment utilisé)."""
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        if not os.path.exists(path):
+            return OrderedDict()
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return OrderedDict()
+        # Les fichiers effacés à la main sont oubliés
+        return OrderedDict(
+            (entry["name"], entry) for entry in entries
+            if os.path.exists(os.path.join(self.cache_dir, entry["name"]))
+        )
+
+    def save_index(self):
+        """Réécrit l'index de façon atomique (fichier temporaire puis renommage)."""
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(list(self.index.values()), f)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def disk_bytes(self):
+        return sum(entry["size"] for entry in self.index.values())
+
+    @staticmethod
+    def entry_name(bucket_name, key):
+        """Nom du fichier local d'un objet (hash de bucket/clé)."""
+        return hashlib.sha256(f"{bucket_name}/{key}".encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture des deux niveaux
+    # ------------------------------------------------------------------
+
+    def lookup(self, name):
+        """
+        Copie locale d'un objet.
+
+        Returns:
+            tuple: (ETag, contenu), ou (None, None) si l'objet n'est pas en cache
+        """
+        if name in self.memory:
+            self.memory.move_to_end(name)
+            if name in self.index:
+                self.index.move_to_end(name)
+            return self.memory[name]
+        entry = self.index.get(name)
+        if entry is None:
+            return None, None
+        try:
+            with open(os.path.join(self.cache_dir, name), "rb") as f:
+                body = f.read()
+        except OSError:
+            del self.index[name]
+            return None, None
+        self.index.move_to_end(name)
+        self.remember(name, entry["etag"], body)
+        return entry["etag"], body
+
+    def remember(self, name, etag, body):
+        """Place un objet dans le niveau mémoire, en évinçant les moins récents."""
+        if name in self.memory:
+            self.memory_bytes -= len(self.memory.pop(name)[1])
+        if len(body) > self.memory_budget:
+            return
+        self.memory[name] = (etag, body)
+        self.memory_bytes += len(body)
+        while self.memory_bytes > self.memory_budget:
+            _, (_, evicted) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def store(self, name, bucket_name, key, etag, body):
+        """Écrit un objet sur disque (et en mémoire), en évinçant les moins récents."""
+        self.remember(name, etag, body)
+        self.index.pop(name, None)
+        if len(body) > self.disk_budget:
+            return
+        path = os.path.join(self.cache_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        self.index[name] = {"name": name, "bucket": bucket_name, "key": key, "etag": etag, "size": len(body)}
+        self.evict()
+
+    def evict(self):
+        """Supprime les objets les moins récemment utilisés tant que le budget disque est dépassé."""
+        total = self.disk_bytes
+        while total > self.disk_budget and self.index:
+            name, entry = self.index.popitem(last=False)
+            total -= entry["size"]
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def get(self, s3, bucket_name, key):
+        """
+        Contenu d'un objet : la copie locale si S3 confirme qu'elle est à jour (304),
+        sinon l'objet téléchargé, mis en cache au passage.
+
+        Args:
+            s3: Client boto3 S3
+            bucket_name (str): Nom du bucket
+            key (str): Clé de l'objet
+
+        Returns:
+            bytes: Contenu de l'objet
+
+        Raises:
+            ClientError: Objet absent (NoSuchKey) ou autre erreur S3
+        """
+        name = self.entry_name(bucket_name, key)
+        # Le verrou protège les niveaux et l'index, pas les requêtes : les GET partent en parallèle
+        with self.lock:
+            etag, body = self.lookup(name)
+        try:
+            if etag is None:
+                resp = s3.get_object(Bucket=bucket_name, Key=key)
+            else:
+                resp = s3.get_object(Bucket=bucket_name, Key=key, IfNoneMatch=etag)
+        except ClientError as e:
+            if etag is not None and e.response.get("Error", {}).get("Code", "") in ("304", "NotModified"):
+                with self.lock:
+                    self.hits += 1
+                    self.bytes_saved += len(body)
+                    self.save_index()
+                return body
+            raise
+
+        body = resp["Body"].read()
+        with self.lock:
+            self.misses += 1
+            self.store(name, bucket_name, key, resp["ETag"], body)
+            self.save_index()
+        return body
+
+    def clear(self):
+        """Vide les deux niveaux du cache."""
+        with self.lock:
+            for name in list(self.index):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+            self.index.clear()
+            self.memory.clear()
+            self.memory_bytes = 0
+            self.save_index()
+
+    def summary(self):
+        """Une ligne : succès / échecs, octets économisés et occupation du cache."""
+        return (f"📦 Cache : {self.hits} hit(s), {self.misses} miss(es), "
+                f"{self.bytes_saved:,} octets économisés, {len(self.index)} objet(s) sur disque "
+                f"({self.disk_bytes:,} / {self.disk_budget:,} octets)")
+
+
+def read_object(s3, bucket_name, key, cache=None):
+    """
+    Contenu d'un objet S3, à travers `cache` s'il est fourni.
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket
+        key (str): Clé de l'objet
+        cache (ObjectCache, optionnel): Cache local
+
+    Returns:
+        bytes: Contenu de l'objet
+    """
+    if cache is None:
+        return s3.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+    return cache.get(s3, bucket_name, key)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="État du cache local des objets S3")
+    parser.add_argument("action", choices=["show", "clear"], help="show: contenu du cache, clear: le vider")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Dossier du cache (défaut: .s3_cache)")
+
+    args = parser.parse_args()
+    cache = ObjectCache(args.cache_dir)
+    if args.action == "clear":
+        cache.clear()
+        print(f"🗑️  Cache vidé : {args.cache_dir}")
+    else:
+        # Du plus récemment au moins récemment utilisé
+        for entry in reversed(cache.index.values()):
+            print(f" - s3://{entry['bucket']}/{entry['key']}  {entry['size']:,} octets  ETag {entry['etag']}")
+        print(f"\n{len(cache.index)} objet(s), {cache.disk_bytes:,} octets dans {args.cache_dir}")
@@ -0,0 +1,319 @@
+import io
+import json
+import posixpath
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+
+# Premier bloc lu pour un CSV / JSON ; doublé tant que les N lignes ne sont pas complètes
+FIRST_RANGE_BYTES = 64 * 1024
+# Lecture spéculative de la fin d'un Parquet : footer + métadonnées en un seul GET dans la plupart des cas
+PARQUET_TAIL_BYTES = 64 * 1024
+
+
+class RangedObject(io.RawIOBase):
+    """
+    Objet S3 vu comme un fichier en lecture seule : chaque `read` devient
+    un GET avec un en-tête `Range`. La fin de l'objet (footer Parquet) est
+    gardée en mémoire après la première lecture.
+
+    Attributes:
+        size (int): Taille de l'objet en octets
+        bytes_read (int): Octets réellement transférés
+        requests (int): Nombre de GET effectués
+    """
+
+    def __init__(self, s3, bucket_name, key, size):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = size
+        self.position = 0
+        self.bytes_read = 0
+        self.requests = 0
+        self.tail = b""
+
+    def get_range(self, start, end):
+        """Octets [start, end) de l'objet, en un GET."""
+        if start >= end:
+            return b""
+        resp = self.s3.get_object(Bucket=self.bucket_name, Key=self.key, Range=f"bytes={start}-{end - 1}")
+        data = resp["Body"].read()
+        self.bytes_read += len(data)
+        self.requests += 1
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, min(offset, self.size))
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+        if not self.tail and end > self.size - PARQUET_TAIL_BYTES:
+            # Lecture près de la fin (footer Parquet) : on ramène d'un coup les derniers Ko
+            self.tail = self.get_range(max(0, self.size - PARQUET_TAIL_BYTES), self.size)
+        tail_start = self.size - len(self.tail)
+        if self.tail and end > tail_start:
+            data = (self.get_range(self.position, tail_start)
+                    + self.tail[max(self.position, tail_start) - tail_start:end - tail_start])
+        else:
+            data = self.get_range(self.position, end)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def detect_format(key):
+    """
+    Format d'après l'extension de la clé.
+
+    Args:
+        key (str): Clé S3 (ex: "raw/current/ventes.csv")
+
+    Returns:
+        str: "csv", "json" ou "parquet"
+    """
+    extension = posixpath.splitext(key)[1].lower().lstrip(".")
+    if extension in ("csv", "txt"):
+        return "csv"
+    if extension in ("json", "jsonl", "ndjson"):
+        return "json"
+    if extension in ("parquet", "pq"):
+        return "parquet"
+    raise ValueError(f"Format non pris en charge pour {key} (csv, json ou parquet)")
+
+
+def complete_csv_rows(text, rows, at_end=False):
+    """
+    Texte de l'en-tête et des `rows` premières lignes complètes, ou None
+    s'il en manque (tout le texte si `at_end`). Suppose qu'aucun champ ne
+    contient de saut de ligne.
+    """
+    lines = text.split("\n")
+    if len(lines) <= rows + 1:
+        return text if at_end else None
+    return "\n".join(lines[:rows + 1])
+
+
+def complete_json_records(text, rows, at_end=False):
+    """
+    Les `rows` premiers enregistrements d'un tableau JSON (`[{...}, ...]`)
+    ou d'un JSON Lines, décodés un par un ; None s'il en manque (ceux
+    trouvés si `at_end`).
+    """
+    decoder = json.JSONDecoder()
+    stripped = text.lstrip()
+    position = len(text) - len(stripped)
+    is_array = stripped.startswith("[")
+    if is_array:
+        position += 1
+
+    records = []
+    while len(records) < rows:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text):
+            return records if at_end else None
+        if is_array and text[position] == "]":
+            return records
+        try:
+            record, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return records if at_end else None
+        records.append(record)
+    return records
+
+
+def read_head(reader, rows, parse):
+    """
+    Lit le début de l'objet par plages croissantes (64 Ko, 128 Ko, ...)
+    jusqu'à ce que `parse` trouve les `rows` premiers enregistrements.
+    """
+    data = b""
+    length = FIRST_RANGE_BYTES
+    while True:
+        data += reader.get_range(len(data), min(length, reader.size))
+        text = data.decode("utf-8-sig", errors="ignore")
+        parsed = parse(text, rows)
+        if parsed is not None:
+            return parsed
+        if len(data) >= reader.size:
+            # Objet entièrement lu : il a moins de `rows` enregistrements
+            return parse(text, rows, at_end=True)
+        length *= 2
+
+
+def sample_schema(df):
+    """Schéma (colonne, type) déduit de l'échantillon."""
+    return [(column, str(dtype)) for column, dtype in df.dtypes.items()]
+
+
+def select_sample(s3, bucket_name, key, file_format, rows):
+    """
+    Échantillon via S3 Select (`SELECT * FROM s3object s LIMIT n`) : le
+    serveur ne renvoie que les lignes demandées. Non disponible sur tous
+    les backends (désactivé sur les nouveaux comptes AWS, retiré de MinIO).
+    Un `.jsonl` / `.ndjson` est lu en JSON Lines, un `.json` comme un
+    document dont on parcourt le tableau (`FROM s3object[*]`).
+
+    Returns:
+        pd.DataFrame | None: Échantillon, ou None si le backend refuse S3 Select
+    """
+    source = "s3object"
+    if file_format == "csv":
+        input_serialization = {"CSV": {"FileHeaderInfo": "USE"}}
+    elif file_format == "json" and key.lower().endswith((".jsonl", ".ndjson")):
+        input_serialization = {"JSON": {"Type": "LINES"}}
+    elif file_format == "json":
+        # .json : un document (tableau d'enregistrements), dont chaque élément devient une ligne
+        input_serialization = {"JSON": {"Type": "DOCUMENT"}}
+        source = "s3object[*]"
+    else:
+        input_serialization = {"Parquet": {}}
+    try:
+        resp = s3.select_object_content(
+            Bucket=bucket_name,
+            Key=key,
+            ExpressionType="SQL",
+            Expression=f"SELECT * FROM {source} s LIMIT {int(rows)}",
+            InputSerialization=input_serialization,
+            OutputSerialization={"JSON": {}},
+        )
+        payload = b"".join(
+            event["Records"]["Payload"] for event in resp["Payload"] if "Records" in event
+        )
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code', '')
+        if error_code in ("NotImplemented", "MethodNotAllowed", "InvalidRequest", "XNotImplemented",
+                          "AccessDenied", "UnsupportedSyntax"):
+            return None
+        raise
+    return pd.DataFrame([json.loads(line) for line in payload.decode("utf-8").splitlines() if line.strip()])
+
+
+def preview_object(s3, bucket_name, key, rows=5, use_select=False, columns=None):
+    """
+    Schéma et premières lignes d'un objet CSV, JSON ou Parquet sans le télécharger.
+
+    - CSV / JSON : GET du début de l'objet par plages croissantes, jusqu'à
+      obtenir `rows` lignes complètes ;
+    - Parquet : footer (schéma, nombre de lignes, row groups) puis, pour
+      l'échantillon, la première page de chaque colonne du premier row group.
+      Une page se décode en entier (jusqu'à 1 Mo par colonne avec les
+      réglages par défaut de pyarrow) : l'échantillon ne coûte pas que le
+      footer. `columns` limite les pages lues, `rows=0` s'en tient au footer ;
+    - avec `use_select`, l'échantillon est d'abord demandé à S3 Select
+      (repli sur les GET par plage si le backend ne le permet pas).
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        key (str): Clé de l'objet
+        rows (int): Nombre de lignes de l'échantillon (défaut: 5)
+        use_select (bool): Essayer S3 Select pour l'échantillon (défaut: False)
+        columns (list[str], optionnel): Colonnes de l'échantillon (défaut: toutes)
+
+    Returns:
+        dict: format, size, schema [(colonne, type)], sample (DataFrame), num_rows
+              (Parquet uniquement), bytes_read, requests, method
+    """
+    file_format = detect_format(key)
+    size = s3.head_object(Bucket=bucket_name, Key=key)["ContentLength"]
+    reader = RangedObject(s3, bucket_name, key, size)
+    result = {"format": file_format, "size": size, "num_rows": None, "method": "range"}
+
+    if use_select:
+        sample = select_sample(s3, bucket_name, key, file_format, rows)
+        if sample is not None:
+            if columns:
+                sample = sample[columns]
+            result.update(schema=sample_schema(sample), sample=sample, method="select",
+                          bytes_read=None, requests=1)
+            return result
+
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        # Lecture bufferisée : seules les premières pages de chaque colonne sont lues, pas tout le row group
+        parquet_file = pq.ParquetFile(reader, buffer_size=FIRST_RANGE_BYTES, pre_buffer=False)
+        metadata = parquet_file.metadata
+        result["schema"] = [(field.name, str(field.type)) for field in parquet_file.schema_arrow]
+        result["num_rows"] = metadata.num_rows
+        columns = columns or [name for name, _ in result["schema"]]
+        batch = None
+        if metadata.num_row_groups and rows:
+            # Un Parquet sans ligne peut avoir un row group vide : pas de lot
+            batch = next(parquet_file.iter_batches(batch_size=rows, row_groups=[0], columns=columns), None)
+        result["sample"] = batch.to_pandas() if batch is not None else pd.DataFrame(columns=columns)
+    elif file_format == "csv":
+        text = read_head(reader, rows, complete_csv_rows)
+        # Objet vide : pas même une ligne d'en-tête, read_csv lèverait EmptyDataError
+        result["sample"] = pd.read_csv(io.StringIO(text), nrows=rows) if text.strip() else pd.DataFrame()
+        result["schema"] = sample_schema(result["sample"])
+    else:
+        records = read_head(reader, rows, complete_json_records)
+        result["sample"] = pd.DataFrame(records[:rows])
+        result["schema"] = sample_schema(result["sample"])
+    if columns and file_format != "parquet":
+        result["sample"] = result["sample"][columns]
+
+    result.update(bytes_read=reader.bytes_read, requests=reader.requests)
+    return result
+
+
+def print_preview(key, preview):
+    """Affiche le résultat de `preview_object`."""
+    print(f"📄 {key} ({preview['format']}, {preview['size']:,} octets)")
+    if preview["num_rows"] is not None:
+        print(f"   Lignes (footer Parquet) : {preview['num_rows']:,}")
+    print("\n   Schéma :")
+    for column, dtype in preview["schema"]:
+        print(f"   - {column}: {dtype}")
+    print(f"\n   Échantillon ({len(preview['sample'])} ligne(s)) :")
+    print(preview["sample"].to_string(index=False))
+    if preview["method"] == "select":
+        print("\n📦 Échantillon obtenu par S3 Select")
+    else:
+        share = preview["bytes_read"] / preview["size"] * 100 if preview["size"] else 0
+        print(f"\n📦 Lu : {preview['bytes_read']:,} octets sur {preview['size']:,} ({share:.1f} %), "
+              f"{preview['requests']} GET")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Aperçu (schéma + premières lignes) d'un objet S3 sans le télécharger")
+    parser.add_argument("--bucket", default="openclassrooms-datalake-8481716", help="Nom du bucket S3")
+    parser.add_argument("--key", default="raw/current/ventes.csv", help="Clé de l'objet (csv, json ou parquet)")
+    parser.add_argument("--rows", type=int, default=5, help="Nombre de lignes de l'échantillon (défaut: 5)")
+    parser.add_argument("--select", action="store_true", help="Essayer S3 Select pour l'échantillon")
+    parser.add_argument("--columns", nargs="+", default=None,
+                        help="Colonnes de l'échantillon (défaut: toutes ; pour un Parquet, seules leurs pages sont lues)")
+    parser.add_argument("--endpoint", default=None, help="Endpoint compatible S3, ex: http://localhost:9000 (MinIO)")
+    parser.add_argument("--profile", default=None, help="Nom du profil AWS à utiliser (optionnel)")
+
+    args = parser.parse_args()
+    session = boto3.Session(profile_name=args.profile) if args.profile else boto3.Session()
+    s3 = session.client("s3", endpoint_url=args.endpoint)
+
+    print_preview(args.key, preview_object(s3, args.bucket, args.key, args.rows, args.select, args.columns))
@@ -0,0 +1,382 @@
+import datetime
+import json
+import os
+import posixpath
+import re
+import sqlite3
+
+
+# Catalogue local des fichiers Parquet de processed/ (créé à la première utilisation)
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "processed_catalog.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    etag TEXT,
+    size INTEGER,
+    num_rows INTEGER,
+    num_row_groups INTEGER,
+    schema TEXT,
+    created_by TEXT,
+    cataloged_at TEXT,
+    PRIMARY KEY (bucket, key)
+);
+CREATE TABLE IF NOT EXISTS row_groups (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    row_group INTEGER NOT NULL,
+    num_rows INTEGER,
+    total_byte_size INTEGER,
+    PRIMARY KEY (bucket, key, row_group)
+);
+CREATE TABLE IF NOT EXISTS column_chunks (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    row_group INTEGER NOT NULL,
+    column_name TEXT NOT NULL,
+    physical_type TEXT,
+    min_value,
+    max_value,
+    null_count INTEGER,
+    compressed_size INTEGER,
+    uncompressed_size INTEGER,
+    PRIMARY KEY (bucket, key, row_group, column_name)
+);
+CREATE TABLE IF NOT EXISTS excluded_rows (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    start_row INTEGER NOT NULL,
+    stop_row INTEGER NOT NULL
+);
+"""
+
+# Opérateurs de filtre : condition sur (min_value, max_value) pour qu'un row group PUISSE contenir une ligne
+PRUNING_CONDITIONS = {
+    "=": "c.min_value <= :v AND c.max_value >= :v",
+    "!=": "NOT (c.min_value = :v AND c.max_value = :v)",
+    "<": "c.min_value < :v",
+    "<=": "c.min_value <= :v",
+    ">": "c.max_value > :v",
+    ">=": "c.max_value >= :v",
+}
+FILTER_PATTERN = re.compile(r"^\s*(\w+)\s*(!=|<=|>=|=|<|>)\s*(.+?)\s*$")
+# Types physiques dont les statistiques sont rangées en texte : la valeur du filtre est comparée telle quelle
+TEXT_PHYSICAL_TYPES = ("BYTE_ARRAY", "FIXED_LEN_BYTE_ARRAY")
+
+
+def open_catalog(path=CATALOG_PATH):
+    """
+    Ouvre (et crée si besoin) le catalogue SQLite.
+
+    Args:
+        path (str): Fichier SQLite (défaut: processed_catalog.db à côté du script)
+
+    Returns:
+        sqlite3.Connection: Connexion au catalogue
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def stat_value(value):
+    """
+    Valeur de statistique Parquet sous une forme comparable dans SQLite :
+    nombres tels quels, dates et timestamps en texte ISO (UTC, sans fuseau).
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def parse_value(text):
+    """Valeur d'un filtre en ligne de commande : entier, décimal, date ISO ou texte."""
+    text = text.strip().strip("'\"")
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    try:
+        return datetime.date.fromisoformat(text).isoformat()
+    except ValueError:
+        pass
+    try:
+        return stat_value(datetime.datetime.fromisoformat(text.replace("Z", "+00:00")))
+    except ValueError:
+        return text
+
+
+def parse_filter(expression):
+    """
+    Filtre "colonne opérateur valeur" (ex: "device_id = capteur_03").
+
+    La valeur reste du texte : elle est convertie au type de la colonne au
+    moment de la comparaison (find_row_groups, parquet_query.typed_scalar),
+    pour que "store = 007" reste "007" sur une colonne texte.
+
+    Returns:
+        tuple: (colonne, opérateur, valeur)
+    """
+    match = FILTER_PATTERN.match(expression)
+    if not match:
+        raise ValueError(f"Filtre invalide : {expression!r} (attendu: colonne opérateur valeur)")
+    column, operator, value = match.groups()
+    return column, operator, value.strip("'\"")
+
+
+def register_parquet(conn, bucket_name, key, metadata, etag=None, size=None):
+    """
+    Enregistre (ou remplace) les métadonnées du footer d'un fichier Parquet :
+    row groups, et pour chaque colonne min / max, nombre de nulls et tailles.
+
+    Args:
+        conn (sqlite3.Connection): Catalogue
+        bucket_name (str): Nom du bucket S3
+        key (str): Clé du fichier Parquet
+        metadata (pyarrow.parquet.FileMetaData): Footer du fichier
+        etag (str, optionnel): ETag de l'objet (sert à détecter un fichier modifié)
+        size (int, optionnel): Taille de l'objet en octets
+    """
+    arrow_schema = metadata.schema.to_arrow_schema()
+    schema = [(field.name, str(field.type)) for field in arrow_schema]
+    row_groups, chunks = [], []
+    for index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(index)
+        row_groups.append((bucket_name, key, index, row_group.num_rows, row_group.total_byte_size))
+        for position in range(row_group.num_columns):
+            column = row_group.column(position)
+            stats = column.statistics
+            has_min_max = stats is not None and stats.has_min_max
+            chunks.append((
+                bucket_name, key, index, column.path_in_schema, column.physical_type,
+                stat_value(stats.min) if has_min_max else None,
+                stat_value(stats.max) if has_min_max else None,
+                stats.null_count if stats is not None and stats.has_null_count else None,
+                column.total_compressed_size, column.total_uncompressed_size,
+            ))
+
+    with conn:
+        unregister(conn, bucket_name, key)
+        conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (bucket_name, key, etag, size, metadata.num_rows, metadata.num_row_groups,
+             json.dumps(schema), metadata.created_by,
+             datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")),
+        )
+        conn.executemany("INSERT INTO row_groups VALUES (?, ?, ?, ?, ?)", row_groups)
+        conn.executemany("INSERT INTO column_chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", chunks)
+
+
+def unregister(conn, bucket_name, key):
+    """Retire un fichier du catalogue."""
+    for table in ("files", "row_groups", "column_chunks", "excluded_rows"):
+        conn.execute(f"DELETE FROM {table} WHERE bucket = ? AND key = ?", (bucket_name, key))
+
+
+def register_uploaded_file(conn, s3, bucket_name, key, local_path):
+    """
+    Catalogue un Parquet qui vient d'être uploadé : le footer est lu sur le
+    fichier local, seul l'ETag est demandé à S3 (HEAD).
+
+    Args:
+        conn (sqlite3.Connection): Catalogue
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        key (str): Clé du fichier uploadé
+        local_path (str): Fichier Parquet local correspondant
+    """
+    import pyarrow.parquet as pq
+
+    head = s3.head_object(Bucket=bucket_name, Key=key)
+    register_parquet(conn, bucket_name, key, pq.read_metadata(local_path), head["ETag"], head["ContentLength"])
+
+
+def is_data_file(key):
+    """Fichier de données Parquet (les dossiers commençant par _ , ex: _aggregates/, sont ignorés)."""
+    return key.endswith(".parquet") and not any(part.startswith("_") for part in key.split("/")[:-1])
+
+
+def sync_catalog(conn, s3, bucket_name, prefix="processed/"):
+    """
+    Met le catalogue à jour à partir du bucket : un listing paginé, puis la
+    lecture du footer (GET par plage) des seuls fichiers nouveaux ou dont
+    l'ETag a changé. Les fichiers supprimés du bucket, ou remplacés par une
+    compaction (parquet_compaction.py), sont retirés. Les lignes périmées
+    d'un fichier compacté (source réécrite depuis) sont rangées dans
+    excluded_rows, à chaque synchronisation : l'ETag du fichier ne change pas.
+
+    Args:
+        conn (sqlite3.Connection): Catalogue
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        prefix (str): Préfixe à cataloguer (défaut: processed/)
+
+    Returns:
+        dict: Nombre de fichiers added, updated, removed, unchanged et octets lus
+    """
+    import pyarrow.parquet as pq
+
+    from object_preview import RangedObject
+    from parquet_compaction import list_live_files
+
+    known = dict(conn.execute(
+        "SELECT key, etag FROM files WHERE bucket = ? AND key LIKE ? || '%'", (bucket_name, prefix)
+    ))
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "bytes_read": 0}
+    seen, excluded = set(), []
+    for obj in list_live_files(s3, bucket_name, prefix):
+        key = obj["Key"]
+        seen.add(key)
+        excluded.extend((bucket_name, key, start, stop) for start, stop in obj.get("ExcludedRows", []))
+        if known.get(key) == obj["ETag"]:
+            counts["unchanged"] += 1
+            continue
+        reader = RangedObject(s3, bucket_name, key, obj["Size"])
+        register_parquet(conn, bucket_name, key, pq.ParquetFile(reader).metadata, obj["ETag"], obj["Size"])
+        counts["bytes_read"] += reader.bytes_read
+        counts["updated" if key in known else "added"] += 1
+
+    with conn:
+        for key in set(known) - seen:
+            unregister(conn, bucket_name, key)
+            counts["removed"] += 1
+        conn.execute("DELETE FROM excluded_rows WHERE bucket = ? AND key LIKE ? || '%'", (bucket_name, prefix))
+        conn.executemany("INSERT INTO excluded_rows VALUES (?, ?, ?, ?)", excluded)
+    return counts
+
+
+def excluded_rows(conn, bucket_name, key):
+    """
+    Returns:
+        list[tuple]: Plages [début, fin) de lignes périmées d'un fichier compacté (voir sync_catalog)
+    """
+    return list(conn.execute(
+        "SELECT start_row, stop_row FROM excluded_rows WHERE bucket = ? AND key = ? ORDER BY start_row",
+        (bucket_name, key),
+    ))
+
+
+def find_row_groups(conn, bucket_name, filters=(), prefix="processed/"):
+    """
+    Row groups qui peuvent contenir des lignes vérifiant TOUS les filtres,
+    d'après les min / max du catalogue (sans ouvrir les fichiers). Un row
+    group sans statistiques pour une colonne filtrée est gardé ; un fichier
+    sans la colonne est écarté.
+
+    La valeur d'un filtre est comparée sous le type physique de chaque
+    colonne : texte tel quel pour une colonne texte (BYTE_ARRAY), nombre ou
+    date ISO (parse_value) pour les autres.
+
+    Args:
+        conn (sqlite3.Connection): Catalogue
+        bucket_name (str): Nom du bucket S3
+        filters (list[tuple]): (colonne, opérateur, valeur), ex: [("device_id", "=", "capteur_03")]
+        prefix (str): Préfixe des fichiers (défaut: processed/)
+
+    Returns:
+        dict: Clé -> liste des numéros de row groups à lire
+    """
+    clauses, params = [], {"bucket": bucket_name, "prefix": prefix}
+    text_types = ", ".join(f"'{physical_type}'" for physical_type in TEXT_PHYSICAL_TYPES)
+    for position, (column, operator, value) in enumerate(filters):
+        typed_value = f"(CASE WHEN c.physical_type IN ({text_types}) THEN :t{position} ELSE :v{position} END)"
+        condition = PRUNING_CONDITIONS[operator].replace(":v", typed_value)
+        clauses.append(
+            "EXISTS (SELECT 1 FROM column_chunks c WHERE c.bucket = rg.bucket AND c.key = rg.key "
+            f"AND c.row_group = rg.row_group AND c.column_name = :c{position} "
+            f"AND (c.min_value IS NULL OR c.max_value IS NULL OR ({condition})))"
+        )
+        params[f"c{position}"] = column
+        params[f"t{position}"] = value if isinstance(value, str) else str(stat_value(value))
+        params[f"v{position}"] = parse_value(value) if isinstance(value, str) else stat_value(value)
+
+    query = (
+        "SELECT rg.key, rg.row_group FROM row_groups rg "
+        "WHERE rg.bucket = :bucket AND rg.key LIKE :prefix || '%'"
+        + "".join(f" AND {clause}" for clause in clauses)
+        + " ORDER BY rg.key, rg.row_group"
+    )
+    selected = {}
+    for key, row_group in conn.execute(query, params):
+        selected.setdefault(key, []).append(row_group)
+    return selected
+
+
+def catalog_summary(conn, bucket_name, prefix="processed/"):
+    """
+    Returns:
+        list[tuple]: (clé, lignes, row groups, taille, schéma) de chaque fichier catalogué
+    """
+    return [
+        (key, num_rows, num_row_groups, size, json.loads(schema))
+        for key, num_rows, num_row_groups, size, schema in conn.execute(
+            "SELECT key, num_rows, num_row_groups, size, schema FROM files "
+            "WHERE bucket = ? AND key LIKE ? || '%' ORDER BY key", (bucket_name, prefix)
+        )
+    ]
+
+
+def column_stats(conn, bucket_name, key):
+    """
+    Returns:
+        list[tuple]: (colonne, min, max, nulls, octets compressés) sur tout le fichier
+    """
+    return list(conn.execute(
+        "SELECT column_name, MIN(min_value), MAX(max_value), SUM(null_count), SUM(compressed_size) "
+        "FROM column_chunks WHERE bucket = ? AND key = ? GROUP BY column_name ORDER BY MIN(rowid)",
+        (bucket_name, key),
+    ))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Catalogue des footers Parquet de processed/ (SQLite)")
+    parser.add_argument("action", choices=["sync", "show", "files"],
+                        help="sync: met à jour le catalogue depuis le bucket, show: contenu du catalogue, "
+                             "files: fichiers / row groups qui peuvent vérifier les filtres --where")
+    parser.add_argument("--bucket", default="openclassrooms-datalake-8481716", help="Nom du bucket S3")
+    parser.add_argument("--prefix", default="processed/", help="Préfixe catalogué (défaut: processed/)")
+    parser.add_argument("--where", action="append", default=[],
+                        help="Filtre colonne opérateur valeur, répétable (ex: --where \"device_id = capteur_03\")")
+    parser.add_argument("--db", default=CATALOG_PATH, help="Fichier SQLite du catalogue")
+    parser.add_argument("--endpoint", default=None, help="Endpoint compatible S3, ex: http://localhost:9000 (MinIO)")
+    parser.add_argument("--profile", default=None, help="Nom du profil AWS à utiliser (optionnel)")
+
+    args = parser.parse_args()
+    conn = open_catalog(args.db)
+
+    if args.action == "sync":
+        import boto3
+
+        session = boto3.Session(profile_name=args.profile) if args.profile else boto3.Session()
+        s3 = session.client("s3", endpoint_url=args.endpoint)
+        counts = sync_catalog(conn, s3, args.bucket, args.prefix)
+        print(f"✅ Catalogue {args.db} : {counts['added']} ajouté(s), {counts['updated']} mis à jour, "
+              f"{counts['removed']} retiré(s), {counts['unchanged']} inchangé(s) "
+              f"({counts['bytes_read']:,} octets de footers lus)")
+    elif args.action == "show":
+        for key, num_rows, num_row_groups, size, schema in catalog_summary(conn, args.bucket, args.prefix):
+            print(f"\n📄 {key} : {num_rows:,} lignes, {num_row_groups} row group(s), {size or 0:,} octets")
+            for column, min_value, max_value, nulls, compressed in column_stats(conn, args.bucket, key):
+                print(f"   - {column:<20} min={min_value!s:<28} max={max_value!s:<28} "
+                      f"nulls={nulls if nulls is not None else '?'}  {compressed:,} o")
+    else:
+        filters = [parse_filter(expression) for expression in args.where]
+        total = conn.execute("SELECT COUNT(*), COALESCE(SUM(num_row_groups), 0) FROM files "
+                             "WHERE bucket = ? AND key LIKE ? || '%'", (args.bucket, args.prefix)).fetchone()
+        selected = find_row_groups(conn, args.bucket, filters, args.prefix)
+        for key, row_groups in selected.items():
+            print(f" - {posixpath.basename(key):<30} row groups {row_groups}  ({key})")
+        print(f"\n🔎 {len(selected)}/{total[0]} fichier(s), "
+              f"{sum(len(groups) for groups in selected.values())}/{total[1]} row group(s) à lire")
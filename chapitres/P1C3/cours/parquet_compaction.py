@@ -0,0 +1,427 @@
+import datetime
+import json
+import os
+import posixpath
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from object_preview import RangedObject
+from parquet_catalog import is_data_file
+
+
+# Manifeste de compaction, un par dossier (partition) de processed/
+MANIFEST_FILENAME = "_compaction.json"
+COMPACTED_PREFIX = "compacted-"
+# Fichiers "petits" (candidats à la compaction) et taille visée des fichiers compactés
+SMALL_FILE_BYTES = 32 * 1024 * 1024
+TARGET_FILE_BYTES = 128 * 1024 * 1024
+# Lignes par row group des fichiers compactés (seul ce row group est en mémoire pendant l'écriture)
+ROW_GROUP_ROWS = 128 * 1024
+
+
+def partition_of(key):
+    """Dossier (partition) d'une clé, avec le / final (ex: "processed/")."""
+    return posixpath.dirname(key) + "/"
+
+
+def empty_manifest():
+    return {"version": 0, "files": [], "replaced": [], "updated_at": None}
+
+
+def load_manifest(s3, bucket_name, partition):
+    """
+    Manifeste d'une partition (vide s'il n'existe pas encore).
+
+    - `files` : fichiers compactés publiés, {key, etag, sources}. `sources`
+      liste les fichiers d'origine fusionnés, {key, etag, rows} où rows est
+      la plage [début, fin) de leurs lignes dans le fichier compacté ;
+    - `replaced` : fichiers d'origine remplacés, {key, etag}. Ils sont
+      ignorés par les lecteurs tant qu'ils gardent cet ETag, même s'ils
+      n'ont pas encore été supprimés.
+
+    Returns:
+        tuple: (manifeste, ETag du manifeste ou None)
+    """
+    try:
+        resp = s3.get_object(Bucket=bucket_name, Key=partition + MANIFEST_FILENAME)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") in ("NoSuchKey", "404"):
+            return empty_manifest(), None
+        raise
+    return json.loads(resp["Body"].read()), resp["ETag"]
+
+
+def save_manifest(s3, bucket_name, partition, manifest, expected_etag):
+    """
+    Publie le manifeste en un seul PUT : c'est ce PUT qui remplace
+    atomiquement les fichiers d'origine par les fichiers compactés.
+
+    Le PUT est conditionnel (If-Match sur l'ETag lu, ou If-None-Match: *
+    pour un premier manifeste) : si une autre compaction a publié entre-temps,
+    il échoue au lieu d'écraser son manifeste.
+
+    Returns:
+        tuple: (manifeste publié, son ETag)
+
+    Raises:
+        RuntimeError: Le manifeste a été modifié par une autre compaction
+    """
+    manifest = dict(manifest, version=manifest["version"] + 1,
+                    updated_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+    condition = {"IfMatch": expected_etag} if expected_etag else {"IfNoneMatch": "*"}
+    try:
+        resp = s3.put_object(Bucket=bucket_name, Key=partition + MANIFEST_FILENAME,
+                             Body=json.dumps(manifest, indent=2).encode("utf-8"),
+                             ContentType="application/json", **condition)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") in ("PreconditionFailed", "ConditionalRequestConflict", "412"):
+            raise RuntimeError(f"Manifeste {partition}{MANIFEST_FILENAME} modifié par une autre compaction") from e
+        raise
+    return manifest, resp["ETag"]
+
+
+def list_partitions(s3, bucket_name, prefix="processed/"):
+    """
+    Listing paginé de `prefix`, regroupé par partition.
+
+    Returns:
+        dict: Partition -> liste des objets Parquet listés (Key, ETag, Size)
+    """
+    partitions = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if is_data_file(obj["Key"]):
+                partitions.setdefault(partition_of(obj["Key"]), []).append(obj)
+    return partitions
+
+
+def stale_rows(objects, manifest):
+    """
+    Lignes périmées des fichiers compactés : celles d'un fichier d'origine
+    dont la clé est de nouveau listée (réécrit par le pipeline après la
+    compaction). Sa nouvelle version est visible, l'ancienne ne doit plus l'être.
+
+    Returns:
+        dict: Clé du fichier compacté -> plages [début, fin) de lignes à ignorer
+    """
+    replaced = {(entry["key"], entry["etag"]) for entry in manifest["replaced"]}
+    listed = {obj["Key"] for obj in objects if (obj["Key"], obj["ETag"]) not in replaced}
+    stale = {}
+    for entry in manifest["files"]:
+        ranges = [source["rows"] for source in entry.get("sources", []) if source["key"] in listed]
+        if ranges:
+            stale[entry["key"]] = ranges
+    return stale
+
+
+def live_objects(objects, manifest):
+    """
+    Objets visibles d'une partition d'après son manifeste : les fichiers
+    remplacés (même clé et même ETag) et les fichiers compactés pas encore
+    publiés (compaction en cours ou interrompue) sont exclus. Un fichier
+    d'origine réécrit depuis (nouvel ETag) redevient visible : les lignes
+    de son ancienne version sont indiquées dans `ExcludedRows` du fichier
+    compacté qui les contient, jusqu'à la compaction suivante.
+    """
+    replaced = {(entry["key"], entry["etag"]) for entry in manifest["replaced"]}
+    published = {entry["key"] for entry in manifest["files"]}
+    stale = stale_rows(objects, manifest)
+    return [
+        dict(obj, ExcludedRows=stale[obj["Key"]]) if obj["Key"] in stale else obj
+        for obj in objects
+        if (obj["Key"], obj["ETag"]) not in replaced
+        and (not posixpath.basename(obj["Key"]).startswith(COMPACTED_PREFIX) or obj["Key"] in published)
+    ]
+
+
+def kept_rows(start, length, excluded):
+    """
+    Masque des lignes [start, start + length) d'un fichier : False pour
+    celles qui tombent dans une plage exclue (voir live_objects).
+
+    Returns:
+        pa.Array: Booléens, un par ligne
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    mask = np.ones(length, dtype=bool)
+    for first, stop in excluded:
+        mask[max(first - start, 0):max(min(stop - start, length), 0)] = False
+    return pa.array(mask)
+
+
+def list_live_files(s3, bucket_name, prefix="processed/"):
+    """
+    Fichiers Parquet de `prefix` à lire, manifestes de compaction appliqués
+    (utilisé par parquet_catalog.sync_catalog).
+
+    Returns:
+        list[dict]: Objets listés (Key, ETag, Size)
+    """
+    files = []
+    for partition, objects in list_partitions(s3, bucket_name, prefix).items():
+        files.extend(live_objects(objects, load_manifest(s3, bucket_name, partition)[0]))
+    return files
+
+
+def read_schemas(s3, bucket_name, objects, workers=8):
+    """Schéma Arrow de chaque fichier, lu dans son footer (GET par plage, en parallèle)."""
+    import pyarrow.parquet as pq
+
+    def footer_schema(obj):
+        return pq.ParquetFile(RangedObject(s3, bucket_name, obj["Key"], obj["Size"])).schema_arrow
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(footer_schema, objects))
+
+
+def plan_compaction(objects, schemas, target_bytes=TARGET_FILE_BYTES, small_bytes=SMALL_FILE_BYTES):
+    """
+    Regroupe les petits fichiers d'une partition en lots d'environ
+    `target_bytes` (tailles compressées additionnées). Seuls des fichiers de
+    même schéma sont fusionnés, et un lot d'un seul fichier est abandonné.
+    Un fichier compacté qui a des lignes périmées (`ExcludedRows`) est
+    toujours réécrit, quelle que soit sa taille, même seul dans son lot.
+
+    Args:
+        objects (list[dict]): Objets visibles de la partition
+        schemas (list[pa.Schema]): Schéma de chaque objet
+        target_bytes (int): Taille visée d'un fichier compacté
+        small_bytes (int): Taille sous laquelle un fichier est candidat
+
+    Returns:
+        list[tuple]: (schéma, liste d'objets) par fichier compacté à écrire
+    """
+    by_schema = []
+    for obj, schema in sorted(zip(objects, schemas), key=lambda pair: pair[0]["Key"]):
+        if obj["Size"] >= small_bytes and not obj.get("ExcludedRows"):
+            continue
+        for group_schema, group in by_schema:
+            if group_schema.equals(schema):
+                group.append(obj)
+                break
+        else:
+            by_schema.append((schema, [obj]))
+
+    batches = []
+    for schema, group in by_schema:
+        current, current_bytes = [], 0
+        for obj in group:
+            if current and current_bytes + obj["Size"] > target_bytes:
+                batches.append((schema, current))
+                current, current_bytes = [], 0
+            current.append(obj)
+            current_bytes += obj["Size"]
+        batches.append((schema, current))
+    return [(schema, batch) for schema, batch in batches
+            if len(batch) > 1 or any(obj.get("ExcludedRows") for obj in batch)]
+
+
+def write_compacted(s3, bucket_name, schema, objects, local_path, compacted_sources=None,
+                    row_group_rows=ROW_GROUP_ROWS):
+    """
+    Fusionne des fichiers dans un Parquet local en streaming : les sources
+    sont lues par lots (GET par plage) et écrites row group par row group ;
+    au plus un row group de sortie est en mémoire. Les lignes périmées
+    (`ExcludedRows`) d'un fichier compacté ne sont pas recopiées.
+
+    Args:
+        compacted_sources (dict, optionnel): Clé d'un fichier compacté -> ses `sources` dans le manifeste
+
+    Returns:
+        tuple: (nombre de lignes écrites, sources du fichier écrit pour le manifeste)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    compacted_sources = compacted_sources or {}
+    rows, pending, pending_rows, sources = 0, [], 0, []
+    with pq.ParquetWriter(local_path, schema, compression="snappy") as writer:
+        for obj in objects:
+            excluded = obj.get("ExcludedRows", [])
+            start = rows + pending_rows
+            source = pq.ParquetFile(RangedObject(s3, bucket_name, obj["Key"], obj["Size"]), pre_buffer=True)
+            if obj["Key"] in compacted_sources:
+                # Fichier recompacté : ses sources encore valides, décalées à leur nouvelle position
+                for entry in compacted_sources[obj["Key"]]:
+                    if entry["rows"] not in excluded:
+                        length = entry["rows"][1] - entry["rows"][0]
+                        sources.append(dict(entry, rows=[start, start + length]))
+                        start += length
+            else:
+                sources.append({"key": obj["Key"], "etag": obj["ETag"],
+                                "rows": [start, start + source.metadata.num_rows]})
+            position = 0
+            for batch in source.iter_batches(batch_size=row_group_rows):
+                if excluded:
+                    mask = kept_rows(position, batch.num_rows, excluded)
+                    position += batch.num_rows
+                    batch = batch.filter(mask)
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                if pending_rows >= row_group_rows:
+                    writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+                    rows += pending_rows
+                    pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+            rows += pending_rows
+    return rows, sources
+
+
+def delete_if_unchanged(s3, bucket_name, entries):
+    """
+    Supprime les objets qui ont encore l'ETag indiqué. Un fichier réécrit
+    depuis par le pipeline est conservé : c'est une nouvelle version, visible.
+
+    Returns:
+        int: Nombre d'objets supprimés
+    """
+    deleted = 0
+    for entry in entries:
+        try:
+            current = s3.head_object(Bucket=bucket_name, Key=entry["key"])["ETag"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") in ("NoSuchKey", "404"):
+                continue
+            raise
+        if current == entry["etag"]:
+            s3.delete_object(Bucket=bucket_name, Key=entry["key"])
+            deleted += 1
+    return deleted
+
+
+def compact_partition(s3, bucket_name, partition, objects, target_bytes=TARGET_FILE_BYTES,
+                      small_bytes=SMALL_FILE_BYTES, dry_run=False, workers=8):
+    """
+    Compacte une partition :
+
+    1. nettoyage d'une compaction interrompue (fichiers remplacés pas encore
+       supprimés, fichiers compactés jamais publiés) ;
+    2. écriture des fichiers compactés (invisibles tant qu'ils ne sont pas
+       dans le manifeste) ;
+    3. publication du manifeste en un PUT : les lecteurs passent d'un coup
+       des fichiers d'origine aux fichiers compactés ;
+    4. suppression des fichiers d'origine.
+
+    Une seule compaction à la fois par partition : le PUT conditionnel du
+    manifeste échoue si une autre l'a modifié entre-temps.
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        partition (str): Dossier à compacter (ex: "processed/")
+        objects (list[dict]): Objets Parquet listés dans la partition
+        target_bytes (int): Taille visée d'un fichier compacté
+        small_bytes (int): Taille sous laquelle un fichier est candidat
+        dry_run (bool): Afficher le plan sans rien écrire ni supprimer
+        workers (int): Footers lus en parallèle pour le plan
+
+    Returns:
+        dict: files_in, files_out, bytes_in, bytes_out, rows, cleaned
+    """
+    manifest, manifest_etag = load_manifest(s3, bucket_name, partition)
+    stats = {"files_in": 0, "files_out": 0, "bytes_in": 0, "bytes_out": 0, "rows": 0, "cleaned": 0}
+    live = live_objects(objects, manifest)
+
+    if not dry_run:
+        published = {entry["key"] for entry in manifest["files"]}
+        orphans = [obj for obj in objects if posixpath.basename(obj["Key"]).startswith(COMPACTED_PREFIX)
+                   and obj["Key"] not in published]
+        for obj in orphans:
+            s3.delete_object(Bucket=bucket_name, Key=obj["Key"])
+        stats["cleaned"] = len(orphans) + delete_if_unchanged(s3, bucket_name, manifest["replaced"])
+        if manifest["replaced"]:
+            manifest, manifest_etag = save_manifest(s3, bucket_name, partition, dict(manifest, replaced=[]),
+                                                    manifest_etag)
+
+    candidates = [obj for obj in live if obj["Size"] < small_bytes or obj.get("ExcludedRows")]
+    if len(candidates) < 2 and not any(obj.get("ExcludedRows") for obj in candidates):
+        return stats
+    compacted_sources = {entry["key"]: entry.get("sources", []) for entry in manifest["files"]}
+    plan = plan_compaction(candidates, read_schemas(s3, bucket_name, candidates, workers), target_bytes, small_bytes)
+
+    written = []
+    for schema, batch in plan:
+        stats["files_in"] += len(batch)
+        stats["bytes_in"] += sum(obj["Size"] for obj in batch)
+        if dry_run:
+            print(f"   {partition} : {len(batch)} fichier(s), {sum(obj['Size'] for obj in batch):,} octets -> 1")
+            continue
+        out_key = (f"{partition}{COMPACTED_PREFIX}"
+                   f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        with tempfile.TemporaryDirectory() as tmp:
+            local_path = os.path.join(tmp, "compacted.parquet")
+            rows, sources = write_compacted(s3, bucket_name, schema, batch, local_path, compacted_sources)
+            stats["rows"] += rows
+            s3.upload_file(local_path, bucket_name, out_key)
+        head = s3.head_object(Bucket=bucket_name, Key=out_key)
+        written.append(({"key": out_key, "etag": head["ETag"], "sources": sources}, batch))
+        stats["files_out"] += 1
+        stats["bytes_out"] += head["ContentLength"]
+
+    if dry_run or not written:
+        return stats
+
+    replaced = [{"key": obj["Key"], "etag": obj["ETag"]} for _, batch in written for obj in batch]
+    replaced_keys = {entry["key"] for entry in replaced}
+    manifest, manifest_etag = save_manifest(s3, bucket_name, partition, dict(
+        manifest,
+        files=[entry for entry in manifest["files"] if entry["key"] not in replaced_keys]
+        + [entry for entry, _ in written],
+        replaced=replaced,
+    ), manifest_etag)
+
+    # Le manifeste publié rend les originaux invisibles : leur suppression peut échouer sans conséquence
+    delete_if_unchanged(s3, bucket_name, replaced)
+    save_manifest(s3, bucket_name, partition, dict(manifest, replaced=[]), manifest_etag)
+    return stats
+
+
+def compact(s3, bucket_name, prefix="processed/", target_bytes=TARGET_FILE_BYTES, small_bytes=SMALL_FILE_BYTES,
+            dry_run=False, workers=8):
+    """
+    Compacte toutes les partitions de `prefix`.
+
+    Returns:
+        dict: Partition -> statistiques de compact_partition
+    """
+    return {
+        partition: compact_partition(s3, bucket_name, partition, objects, target_bytes, small_bytes, dry_run, workers)
+        for partition, objects in list_partitions(s3, bucket_name, prefix).items()
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Compaction des petits fichiers Parquet de processed/")
+    parser.add_argument("--bucket", default="openclassrooms-datalake-8481716", help="Nom du bucket S3")
+    parser.add_argument("--prefix", default="processed/", help="Préfixe à compacter (défaut: processed/)")
+    parser.add_argument("--target-mb", type=float, default=TARGET_FILE_BYTES / 1024 ** 2,
+                        help="Taille visée des fichiers compactés en Mo (défaut: 128)")
+    parser.add_argument("--small-mb", type=float, default=SMALL_FILE_BYTES / 1024 ** 2,
+                        help="Fichiers plus petits que cette taille compactés, en Mo (défaut: 32)")
+    parser.add_argument("--dry-run", action="store_true", help="Afficher le plan sans rien écrire ni supprimer")
+    parser.add_argument("--endpoint", default=None, help="Endpoint compatible S3, ex: http://localhost:9000 (MinIO)")
+    parser.add_argument("--profile", default=None, help="Nom du profil AWS à utiliser (optionnel)")
+
+    args = parser.parse_args()
+    session = boto3.Session(profile_name=args.profile) if args.profile else boto3.Session()
+    s3 = session.client("s3", endpoint_url=args.endpoint)
+
+    results = compact(s3, args.bucket, args.prefix, int(args.target_mb * 1024 ** 2), int(args.small_mb * 1024 ** 2),
+                      args.dry_run)
+    for partition, stats in results.items():
+        if args.dry_run:
+            continue
+        print(f"{'✅' if stats['files_out'] else '➖'} {partition} : {stats['files_in']} fichier(s) "
+              f"({stats['bytes_in']:,} octets) -> {stats['files_out']} ({stats['bytes_out']:,} octets), "
+              f"{stats['rows']:,} lignes" + (f", {stats['cleaned']} reste(s) nettoyé(s)" if stats["cleaned"] else ""))
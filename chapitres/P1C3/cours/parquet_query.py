@@ -0,0 +1,287 @@
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from object_preview import RangedObject
+from parquet_catalog import excluded_rows, find_row_groups, open_catalog, parse_filter, parse_value, sync_catalog
+from parquet_compaction import kept_rows
+
+
+# Agrégations disponibles, et leurs partiels par fichier (additionnables entre fichiers)
+AGGREGATIONS = ("count", "sum", "min", "max", "mean")
+PARTIAL_MERGE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+COMPARISONS = {
+    "=": pc.equal, "!=": pc.not_equal, "<": pc.less, "<=": pc.less_equal,
+    ">": pc.greater, ">=": pc.greater_equal,
+}
+
+
+def parse_aggregation(text):
+    """
+    Agrégation "fonction:colonne" (ex: "mean:temperature") ou "count".
+    "count" compte les lignes, "count:colonne" les valeurs non nulles.
+
+    Returns:
+        tuple: (fonction, colonne ou None)
+    """
+    function, _, column = text.partition(":")
+    if function not in AGGREGATIONS or (function != "count" and not column):
+        raise ValueError(f"Agrégation invalide : {text!r} (count, count:col, sum:col, min:col, max:col, mean:col)")
+    return function, column or None
+
+
+def typed_scalar(value, arrow_type):
+    """
+    Valeur d'un filtre convertie au type Arrow de la colonne (timestamps du
+    catalogue en UTC). Sur une colonne texte, le texte est gardé tel quel.
+    """
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pa.scalar(str(value), arrow_type)
+    if pa.types.is_timestamp(arrow_type):
+        moment = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if arrow_type.tz is not None and moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone.utc)
+        return pa.scalar(moment, arrow_type)
+    if pa.types.is_date(arrow_type):
+        return pa.scalar(datetime.date.fromisoformat(str(value)[:10]), arrow_type)
+    if isinstance(value, str):
+        value = parse_value(value)
+    return pa.scalar(value).cast(arrow_type)
+
+
+def filter_mask(table, filters):
+    """Masque des lignes vérifiant tous les filtres (les nulls ne passent pas)."""
+    mask = None
+    for column, operator, value in filters:
+        values = table.column(column)
+        condition = COMPARISONS[operator](values, typed_scalar(value, values.type))
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return pc.fill_null(mask, False)
+
+
+def partial_aggregates(table, group_by, aggregations):
+    """
+    Agrégats partiels d'un morceau de données : sommes, comptes, min et max,
+    que l'on peut combiner entre fichiers (une moyenne = somme / compte).
+    """
+    specs = [([], "count_all")]
+    for function, column in aggregations:
+        if function == "mean":
+            needed = [(column, "sum"), (column, "count")]
+        else:
+            # "count" sans colonne : count_all, toujours calculé
+            needed = [(column, function)] if column else []
+        for spec in needed:
+            if spec not in specs:
+                specs.append(spec)
+    return table.group_by(list(group_by)).aggregate(specs)
+
+
+def merge_partials(partials, group_by, aggregations):
+    """
+    Combine les partiels de tous les fichiers et calcule le résultat final.
+
+    Returns:
+        pa.Table: Une ligne par groupe (ou une seule ligne sans group_by)
+    """
+    combined = pa.concat_tables(partials)
+    value_columns = [name for name in combined.schema.names if name not in group_by]
+    merged = combined.group_by(list(group_by)).aggregate([
+        (name, "sum" if name == "count_all" else PARTIAL_MERGE[name.rsplit("_", 1)[1]]) for name in value_columns
+    ])
+    merged = merged.rename_columns([
+        name if name in group_by else name.rsplit("_", 1)[0] for name in merged.schema.names
+    ])
+
+    columns, names = [merged.column(name) for name in group_by], list(group_by)
+    for function, column in aggregations:
+        if function == "count" and column is None:
+            columns.append(merged.column("count_all"))
+            names.append("count")
+        elif function == "mean":
+            columns.append(pc.divide(pc.cast(merged.column(f"{column}_sum"), pa.float64()),
+                                     merged.column(f"{column}_count")))
+            names.append(f"mean_{column}")
+        else:
+            columns.append(merged.column(f"{column}_{function}"))
+            names.append(f"{function}_{column}")
+    result = pa.table(columns, names=names)
+    return result.sort_by([(name, "ascending") for name in group_by]) if group_by else result
+
+
+def file_columns(conn, bucket_name, key):
+    """Colonnes d'un fichier d'après le catalogue."""
+    return {name for (name,) in conn.execute(
+        "SELECT DISTINCT column_name FROM column_chunks WHERE bucket = ? AND key = ?", (bucket_name, key)
+    )}
+
+
+def scan_file(s3, bucket_name, key, row_groups, columns, filters, group_by, aggregations, excluded=()):
+    """
+    Lit dans un fichier les seules colonnes utiles des row groups retenus
+    (GET par plage), filtre les lignes, puis renvoie des agrégats partiels
+    (ou les lignes filtrées si aucune agrégation n'est demandée). Les lignes
+    périmées d'un fichier compacté (`excluded`, plages [début, fin)) sont écartées.
+
+    Returns:
+        tuple: (clé, pa.Table, octets lus, nombre de GET)
+    """
+    size = s3.head_object(Bucket=bucket_name, Key=key)["ContentLength"]
+    reader = RangedObject(s3, bucket_name, key, size)
+    # pre_buffer : les colonnes d'un row group sont lues en quelques GET regroupés
+    parquet_file = pq.ParquetFile(reader, pre_buffer=True)
+    available = set(parquet_file.schema_arrow.names)
+    needed = [column for column in columns if column in available]
+
+    table = parquet_file.read_row_groups(row_groups, columns=needed)
+    if excluded:
+        metadata = parquet_file.metadata
+        starts = [0]
+        for index in range(metadata.num_row_groups):
+            starts.append(starts[-1] + metadata.row_group(index).num_rows)
+        table = table.filter(pa.concat_arrays([
+            kept_rows(starts[index], starts[index + 1] - starts[index], excluded) for index in row_groups
+        ]))
+    if filters:
+        table = table.filter(filter_mask(table, filters))
+    if aggregations:
+        table = partial_aggregates(table, group_by, aggregations)
+    return key, table, reader.bytes_read, reader.requests + 1
+
+
+def run_query(s3, bucket_name, columns=(), filters=(), group_by=(), aggregations=(), prefix="processed/",
+              workers=8, limit=None, conn=None, sync=True, on_result=None):
+    """
+    Requête sur les fichiers Parquet de `prefix` :
+
+    1. le catalogue (parquet_catalog.py) est synchronisé, puis il écarte les
+       fichiers et row groups dont les min / max excluent les filtres ;
+    2. chaque fichier restant est lu en parallèle (`workers` threads) :
+       seulement les colonnes nécessaires, des row groups retenus ;
+    3. les résultats arrivent au fil de l'eau (`on_result` est appelé pour
+       chaque fichier terminé) ; sans agrégation, la lecture s'arrête dès
+       que `limit` lignes sont obtenues.
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        columns (list[str]): Colonnes à renvoyer (sans agrégation ; toutes si vide)
+        filters (list[tuple]): (colonne, opérateur, valeur), voir parquet_catalog.parse_filter
+        group_by (list[str]): Colonnes de regroupement
+        aggregations (list[tuple]): (fonction, colonne), voir parse_aggregation
+        prefix (str): Préfixe des fichiers (défaut: processed/)
+        workers (int): Fichiers lus en parallèle (défaut: 8)
+        limit (int, optionnel): Nombre maximal de lignes renvoyées (sans agrégation)
+        conn (sqlite3.Connection, optionnel): Catalogue (défaut: processed_catalog.db)
+        sync (bool): Synchroniser le catalogue avant la requête (défaut: True)
+        on_result (callable, optionnel): Appelée avec (clé, table) à chaque fichier terminé
+
+    Returns:
+        tuple: (pa.Table résultat, dict de statistiques : files, row_groups, bytes_read, requests, seconds)
+    """
+    start = time.perf_counter()
+    conn = conn or open_catalog()
+    if sync:
+        sync_catalog(conn, s3, bucket_name, prefix)
+    plan = find_row_groups(conn, bucket_name, filters, prefix)
+    if aggregations:
+        # Un fichier sans les colonnes à regrouper / agréger (ex: ventes.parquet pour device_id) est écarté
+        required = {*group_by, *(column for _, column in aggregations if column)}
+        plan = {key: row_groups for key, row_groups in plan.items()
+                if required <= file_columns(conn, bucket_name, key)}
+
+    if aggregations:
+        needed = list(dict.fromkeys([*group_by, *(c for _, c in aggregations if c), *(c for c, _, _ in filters)]))
+    else:
+        needed = list(dict.fromkeys([*columns, *(c for c, _, _ in filters)])) if columns else None
+    if needed is None:
+        # Toutes les colonnes : lues depuis le schéma de chaque fichier
+        needed = [name for (name,) in conn.execute(
+            "SELECT DISTINCT column_name FROM column_chunks WHERE bucket = ? AND key LIKE ? || '%'",
+            (bucket_name, prefix),
+        )]
+
+    stats = {"files": len(plan), "row_groups": sum(len(groups) for groups in plan.values()),
+             "bytes_read": 0, "requests": 0}
+    results, rows = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(scan_file, s3, bucket_name, key, row_groups, needed, filters, group_by, aggregations,
+                        excluded_rows(conn, bucket_name, key))
+            for key, row_groups in plan.items()
+        ]
+        for future in as_completed(futures):
+            key, table, bytes_read, requests = future.result()
+            stats["bytes_read"] += bytes_read
+            stats["requests"] += requests
+            if not aggregations and columns:
+                table = table.select([column for column in columns if column in table.schema.names])
+            results.append(table)
+            rows += table.num_rows
+            if on_result is not None:
+                on_result(key, table)
+            if not aggregations and limit is not None and rows >= limit:
+                for pending in futures:
+                    pending.cancel()
+                break
+
+    stats["seconds"] = time.perf_counter() - start
+    if aggregations:
+        if not results:
+            return pa.table({}), stats
+        return merge_partials(results, group_by, aggregations), stats
+    if not results:
+        return pa.table({}), stats
+    result = pa.concat_tables(results, promote_options="permissive")
+    return (result.slice(0, limit) if limit is not None else result), stats
+
+
+def print_stats(stats, total_bytes=None):
+    """Affiche ce que la requête a coûté."""
+    read = f"{stats['bytes_read']:,} octets lus"
+    if total_bytes:
+        read += f" sur {total_bytes:,} ({stats['bytes_read'] / total_bytes * 100:.1f} %)"
+    print(f"\n📦 {stats['files']} fichier(s), {stats['row_groups']} row group(s), {read}, "
+          f"{stats['requests']} requête(s), {stats['seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Requêtes filtrées / agrégées sur les Parquet de processed/")
+    parser.add_argument("--bucket", default="openclassrooms-datalake-8481716", help="Nom du bucket S3")
+    parser.add_argument("--prefix", default="processed/", help="Préfixe des fichiers (défaut: processed/)")
+    parser.add_argument("--columns", nargs="+", default=[], help="Colonnes à afficher (sans --agg)")
+    parser.add_argument("--where", action="append", default=[],
+                        help="Filtre colonne opérateur valeur, répétable (ex: --where \"device_id = capteur_03\")")
+    parser.add_argument("--group-by", nargs="+", default=[], help="Colonnes de regroupement")
+    parser.add_argument("--agg", action="append", default=[],
+                        help="Agrégation, répétable : count, count:col, sum:col, min:col, max:col, mean:col")
+    parser.add_argument("--limit", type=int, default=20, help="Lignes affichées sans agrégation (défaut: 20)")
+    parser.add_argument("--workers", type=int, default=8, help="Fichiers lus en parallèle (défaut: 8)")
+    parser.add_argument("--no-sync", action="store_true", help="Ne pas synchroniser le catalogue avant la requête")
+    parser.add_argument("--endpoint", default=None, help="Endpoint compatible S3, ex: http://localhost:9000 (MinIO)")
+    parser.add_argument("--profile", default=None, help="Nom du profil AWS à utiliser (optionnel)")
+
+    args = parser.parse_args()
+    session = boto3.Session(profile_name=args.profile) if args.profile else boto3.Session()
+    s3 = session.client("s3", endpoint_url=args.endpoint)
+
+    conn = open_catalog()
+    result, stats = run_query(
+        s3, args.bucket, args.columns, [parse_filter(w) for w in args.where], args.group_by,
+        [parse_aggregation(a) for a in args.agg], args.prefix, args.workers,
+        None if args.agg else args.limit, conn, not args.no_sync,
+        on_result=lambda key, table: print(f"   ✅ {key} : {table.num_rows} ligne(s)"),
+    )
+    print()
+    print(result.to_pandas().to_string(index=False) if result.num_columns else "(aucun résultat)")
+    total = conn.execute("SELECT SUM(size) FROM files WHERE bucket = ? AND key LIKE ? || '%'",
+                         (args.bucket, args.prefix)).fetchone()[0]
+    print_stats(stats, total)
@@ -0,0 +1,302 @@
+import datetime
+import io
+import json
+import os
+import time
+
+
+# Options d'écriture Parquet retenues par jeu de données (lues par process_pipeline)
+WRITER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parquet_writer_config.json")
+
+# Codecs essayés : (compression, niveau)
+CODEC_CANDIDATES = [("snappy", None), ("lz4", None), ("zstd", 1), ("zstd", 3), ("zstd", 9)]
+# Encodage "DICTIONARY" = dictionnaire (défaut de pandas), les autres passent par column_encoding
+DICTIONARY = "DICTIONARY"
+# Le dictionnaire est gardé sauf si un autre encodage réduit la colonne d'au moins 10 % :
+# il se décode vite et garde les colonnes répétitives (device_id, region) compactes en mémoire
+DICTIONARY_MARGIN = 0.10
+# Taille visée d'un row group (données décompressées en mémoire), bornée par le défaut de pyarrow
+ROW_GROUP_TARGET_BYTES = 64 * 1024 * 1024
+MIN_ROW_GROUP_ROWS = 10_000
+MAX_ROW_GROUP_ROWS = 1024 * 1024
+# Un codec plus lent à décoder que le plus rapide de plus de cette proportion est écarté
+DEFAULT_TOLERANCE = 0.5
+
+
+def encoding_candidates(arrow_type):
+    """
+    Encodages essayés pour une colonne selon son type Arrow :
+
+    - texte (device_id, region, product) : dictionnaire, PLAIN, DELTA_LENGTH_BYTE_ARRAY ;
+    - entiers, dates et timestamps (croissants) : dictionnaire, PLAIN, DELTA_BINARY_PACKED ;
+    - flottants (mesures) : dictionnaire, PLAIN, BYTE_STREAM_SPLIT.
+
+    Returns:
+        list[str]: Encodages candidats (un seul si le type n'est pas réglable)
+    """
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) or pa.types.is_binary(arrow_type):
+        return [DICTIONARY, "PLAIN", "DELTA_LENGTH_BYTE_ARRAY"]
+    if (pa.types.is_integer(arrow_type) or pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type)
+            or pa.types.is_time(arrow_type)):
+        return [DICTIONARY, "PLAIN", "DELTA_BINARY_PACKED"]
+    if pa.types.is_floating(arrow_type):
+        return [DICTIONARY, "PLAIN", "BYTE_STREAM_SPLIT"]
+    return [DICTIONARY]
+
+
+def load_transform(spec):
+    """
+    Fonction de transformation désignée par "fichier.py:fonction"
+    (ex: "../correction/main.py:transform_iot").
+
+    Returns:
+        callable: DataFrame brut -> DataFrame tel que le pipeline l'écrit
+    """
+    import importlib.util
+
+    path, _, name = spec.rpartition(":")
+    if not path or not name:
+        raise ValueError(f"Transformation invalide : {spec!r} (attendu: fichier.py:fonction)")
+    module_spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def load_sample(path, rows=100_000, transform=None):
+    """
+    Échantillon d'un fichier local (csv, json ou parquet), lu comme le pipeline le lit.
+
+    Args:
+        path (str): Fichier local (ex: src/ventes.csv)
+        rows (int): Nombre maximal de lignes (défaut: 100 000)
+        transform (callable, optionnel): Transformation du pipeline, appliquée à
+            l'échantillon brut : le réglage porte sur les colonnes réellement
+            écrites (ex: temp_c, temp_c_roll3 pour l'IoT)
+
+    Returns:
+        pa.Table: Échantillon sans l'index pandas
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    from object_preview import detect_format
+
+    file_format = detect_format(path)
+    if file_format == "csv":
+        df = pd.read_csv(path, nrows=rows)
+    elif file_format == "json":
+        df = pd.read_json(path, lines=path.endswith((".jsonl", ".ndjson"))).head(rows)
+    else:
+        df = pd.read_parquet(path).head(rows)
+    if transform is not None:
+        df = transform(df)
+    return pa.Table.from_pandas(df.dropna(), preserve_index=False)
+
+
+def writer_kwargs(config):
+    """Arguments de pq.write_table / DataFrame.to_parquet d'une configuration (sans ses métadonnées)."""
+    kwargs = {
+        "compression": config["compression"],
+        "use_dictionary": config["use_dictionary"],
+        "row_group_size": config["row_group_size"],
+    }
+    if config.get("compression_level") is not None:
+        kwargs["compression_level"] = config["compression_level"]
+    if config.get("column_encoding"):
+        kwargs["column_encoding"] = config["column_encoding"]
+    return kwargs
+
+
+def encode(table, **kwargs):
+    """Écrit une table en Parquet en mémoire. Returns: bytes"""
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, **kwargs)
+    return buffer.getvalue()
+
+
+def decode_seconds(data, repeat=3):
+    """Meilleur temps de lecture complète d'un Parquet en mémoire (secondes)."""
+    import pyarrow.parquet as pq
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pq.read_table(io.BytesIO(data))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def choose_encodings(table, compression, compression_level=None):
+    """
+    Pour un codec donné, l'encodage qui donne la colonne la plus petite,
+    essayé colonne par colonne (le dictionnaire, s'il est possible, n'est
+    abandonné que pour un gain d'au moins DICTIONARY_MARGIN).
+
+    Returns:
+        dict: Colonne -> encodage retenu
+    """
+    chosen = {}
+    for field in table.schema:
+        candidates = encoding_candidates(field.type)
+        if len(candidates) == 1:
+            chosen[field.name] = candidates[0]
+            continue
+        column = table.select([field.name])
+        sizes = {}
+        for encoding in candidates:
+            options = {"compression": compression, "compression_level": compression_level}
+            if encoding == DICTIONARY:
+                options["use_dictionary"] = True
+            else:
+                options.update(use_dictionary=False, column_encoding={field.name: encoding})
+            sizes[encoding] = len(encode(column, **options))
+        smallest = min(candidates, key=sizes.get)
+        if sizes[smallest] > sizes[DICTIONARY] * (1 - DICTIONARY_MARGIN):
+            smallest = DICTIONARY
+        chosen[field.name] = smallest
+    return chosen
+
+
+def row_group_rows(table, target_bytes=ROW_GROUP_TARGET_BYTES):
+    """Lignes par row group pour environ `target_bytes` de données en mémoire."""
+    bytes_per_row = table.nbytes / max(table.num_rows, 1)
+    return min(MAX_ROW_GROUP_ROWS, max(MIN_ROW_GROUP_ROWS, int(target_bytes / max(bytes_per_row, 1))))
+
+
+def tune(table, tolerance=DEFAULT_TOLERANCE, codecs=CODEC_CANDIDATES):
+    """
+    Essaie chaque codec, avec pour chacun les meilleurs encodages par
+    colonne, et mesure la taille du fichier et le temps de lecture.
+
+    Choix : le fichier le plus petit parmi les candidats dont la lecture
+    n'est pas plus lente que le plus rapide de plus de `tolerance`
+    (0.5 = 50 %). Sur de gros volumes, la taille (stockage, transfert)
+    compte ; ce garde-fou évite de la payer en lecture.
+
+    Args:
+        table (pa.Table): Échantillon représentatif
+        tolerance (float): Lenteur de lecture acceptée par rapport au plus rapide
+        codecs (list[tuple]): (compression, niveau) à essayer
+
+    Returns:
+        tuple: (configuration retenue, liste des candidats mesurés)
+    """
+    rows_per_group = row_group_rows(table)
+    results = []
+    for compression, level in codecs:
+        encodings = choose_encodings(table, compression, level)
+        config = {
+            "compression": compression,
+            "compression_level": level,
+            "use_dictionary": [name for name, encoding in encodings.items() if encoding == DICTIONARY],
+            "column_encoding": {name: encoding for name, encoding in encodings.items() if encoding != DICTIONARY},
+            "row_group_size": rows_per_group,
+        }
+        start = time.perf_counter()
+        data = encode(table, **writer_kwargs(config))
+        write_seconds = time.perf_counter() - start
+        results.append({"config": config, "size": len(data), "write_seconds": write_seconds,
+                        "read_seconds": decode_seconds(data)})
+
+    # Référence : les options par défaut de df.to_parquet (snappy, dictionnaire partout)
+    default = encode(table, compression="snappy")
+    fastest = min(result["read_seconds"] for result in results)
+    eligible = [result for result in results if result["read_seconds"] <= fastest * (1 + tolerance)]
+    best = min(eligible, key=lambda result: result["size"])
+    best["config"].update(sample_rows=table.num_rows, default_size=len(default), tuned_size=best["size"])
+    return best["config"], results
+
+
+def load_writer_config(path=WRITER_CONFIG_PATH):
+    """Configuration d'écriture enregistrée ({} si aucun réglage)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_writer_config(dataset, config, path=WRITER_CONFIG_PATH):
+    """Enregistre (ou remplace) la configuration d'un jeu de données."""
+    configs = load_writer_config(path)
+    configs[dataset] = dict(config, tuned_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(configs, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def writer_options(dataset, columns=None, path=WRITER_CONFIG_PATH):
+    """
+    Options de `df.to_parquet` pour un jeu de données (ex: "ventes"), ou {}
+    s'il n'a pas été réglé (défauts de pandas).
+
+    Args:
+        dataset (str): Nom du jeu de données (nom du fichier brut sans extension)
+        columns (list[str], optionnel): Colonnes réellement écrites ; les
+            réglages de colonnes absentes sont ignorés
+        path (str): Fichier de configuration
+
+    Returns:
+        dict: Arguments de DataFrame.to_parquet
+    """
+    config = load_writer_config(path).get(dataset)
+    if config is None:
+        return {}
+    kwargs = writer_kwargs(config)
+    if columns is not None:
+        kwargs["use_dictionary"] = [name for name in kwargs["use_dictionary"] if name in columns]
+        if "column_encoding" in kwargs:
+            kwargs["column_encoding"] = {name: encoding for name, encoding in kwargs["column_encoding"].items()
+                                         if name in columns}
+    return kwargs
+
+
+def describe(config):
+    """Résumé d'une configuration sur une ligne (ex: "zstd(3), dictionnaire: region, product, ...")."""
+    codec = config["compression"] + (f"({config['compression_level']})" if config.get("compression_level") else "")
+    parts = [codec, f"dictionnaire: {', '.join(config['use_dictionary']) or '-'}"]
+    parts += [f"{name}: {encoding}" for name, encoding in config.get("column_encoding", {}).items()]
+    return ", ".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Choix du codec et des encodages Parquet d'un jeu de données")
+    parser.add_argument("file", help="Fichier local représentatif (csv, json ou parquet), ex: src/ventes.csv")
+    parser.add_argument("--dataset", default=None,
+                        help="Nom du jeu de données (défaut: nom du fichier sans extension, comme dans processed/)")
+    parser.add_argument("--rows", type=int, default=100_000, help="Lignes de l'échantillon (défaut: 100 000)")
+    parser.add_argument("--transform", default=None,
+                        help="Transformation du pipeline appliquée à l'échantillon, fichier.py:fonction "
+                             "(ex: ../correction/main.py:transform_iot)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Lenteur de lecture acceptée par rapport au codec le plus rapide (défaut: 0.5 = 50 %%)")
+    parser.add_argument("--dry-run", action="store_true", help="Afficher les mesures sans enregistrer le choix")
+    parser.add_argument("--config", default=WRITER_CONFIG_PATH, help="Fichier de configuration d'écriture")
+
+    args = parser.parse_args()
+    dataset = args.dataset or os.path.splitext(os.path.basename(args.file))[0]
+    table = load_sample(args.file, args.rows, load_transform(args.transform) if args.transform else None)
+    config, results = tune(table, args.tolerance)
+
+    print(f"📊 {dataset} : échantillon de {table.num_rows:,} lignes\n")
+    print(f"   {'codec':<10} {'taille':>12} {'écriture':>10} {'lecture':>10}")
+    for result in results:
+        candidate = result["config"]
+        codec = candidate["compression"] + (f"({candidate['compression_level']})"
+                                            if candidate["compression_level"] else "")
+        marker = " ⬅️" if candidate is config else ""
+        print(f"   {codec:<10} {result['size']:>12,} {result['write_seconds'] * 1000:>8.1f} ms "
+              f"{result['read_seconds'] * 1000:>7.1f} ms{marker}")
+    print(f"\n   Défauts de pandas (snappy, dictionnaire partout) : {config['default_size']:,} octets")
+    print(f"   Retenu : {describe(config)}, row groups de {config['row_group_size']:,} lignes")
+    print(f"   Gain : {(1 - config['tuned_size'] / config['default_size']) * 100:.1f} % sur l'échantillon")
+
+    if not args.dry_run:
+        save_writer_config(dataset, config, args.config)
+        print(f"\n✅ Configuration enregistrée dans {os.path.basename(args.config)} (utilisée par process_pipeline)")
@@ -0,0 +1,198 @@
+import datetime
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import sys
+
+from botocore.exceptions import ClientError
+
+
+# Client S3 de substitution utilisé par startup_benchmark.py : les objets sont
+# des fichiers d'un dossier local (<racine>/<bucket>/<clé>), sans appel réseau.
+# Seules les opérations dont main.py se sert sont couvertes.
+
+
+class LocalS3:
+    """
+    Sous-ensemble de l'API du client boto3 S3, sur disque.
+
+    Les erreurs sont des ClientError avec les mêmes codes que S3 (NoSuchBucket,
+    NoSuchKey, 404 pour HEAD, 304 pour un GET conditionnel, PreconditionFailed) :
+    le code de main.py suit les mêmes chemins qu'avec un vrai bucket.
+
+    Attributes:
+        root (str): Dossier contenant un sous-dossier par bucket
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def error(code, operation):
+        return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+    def bucket_path(self, bucket, operation):
+        path = os.path.join(self.root, bucket)
+        if not os.path.isdir(path):
+            raise self.error("NoSuchBucket", operation)
+        return path
+
+    def object_path(self, bucket, key, operation, missing="NoSuchKey"):
+        path = os.path.join(self.bucket_path(bucket, operation), *key.split("/"))
+        if not os.path.isfile(path):
+            raise self.error(missing, operation)
+        return path
+
+    def new_object_path(self, bucket, key, operation):
+        path = os.path.join(self.bucket_path(bucket, operation), *key.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    @staticmethod
+    def head(path):
+        with open(path, "rb") as f:
+            etag = f'"{hashlib.md5(f.read()).hexdigest()}"'
+        stat = os.stat(path)
+        return {
+            "ETag": etag,
+            "ContentLength": stat.st_size,
+            "LastModified": datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc),
+        }
+
+    def create_bucket(self, Bucket, **kwargs):
+        path = os.path.join(self.root, Bucket)
+        if os.path.isdir(path):
+            raise self.error("BucketAlreadyOwnedByYou", "CreateBucket")
+        os.makedirs(path)
+        return {}
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **kwargs):
+        path = self.new_object_path(Bucket, Key, "PutObject")
+        exists = os.path.isfile(path)
+        if (IfNoneMatch == "*" and exists) or (IfMatch is not None and (not exists or self.head(path)["ETag"] != IfMatch)):
+            raise self.error("PreconditionFailed", "PutObject")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif hasattr(Body, "read"):
+            Body = Body.read()
+        with open(path, "wb") as f:
+            f.write(Body)
+        return {"ETag": self.head(path)["ETag"]}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        shutil.copyfile(Filename, self.new_object_path(Bucket, Key, "PutObject"))
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        # boto3 commence par un HEAD : un objet absent donne une erreur 404
+        shutil.copyfile(self.object_path(Bucket, Key, "HeadObject", missing="404"), Filename)
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return self.head(self.object_path(Bucket, Key, "HeadObject", missing="404"))
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, **kwargs):
+        path = self.object_path(Bucket, Key, "GetObject")
+        head = self.head(path)
+        if IfNoneMatch is not None and IfNoneMatch == head["ETag"]:
+            raise self.error("304", "GetObject")
+        with open(path, "rb") as f:
+            if Range is None:
+                body = f.read()
+            else:
+                first, last = Range.removeprefix("bytes=").split("-")
+                if first:
+                    f.seek(int(first))
+                    body = f.read(int(last) - int(first) + 1 if last else -1)
+                else:
+                    f.seek(max(0, head["ContentLength"] - int(last)))
+                    body = f.read()
+        return {**head, "Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        source = self.object_path(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        path = self.new_object_path(Bucket, Key, "CopyObject")
+        shutil.copyfile(source, path)
+        head = self.head(path)
+        return {"CopyObjectResult": {"ETag": head["ETag"], "LastModified": head["LastModified"]}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        path = os.path.join(self.bucket_path(Bucket, "DeleteObject"), *Key.split("/"))
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        bucket = self.bucket_path(Bucket, "ListObjectsV2")
+        contents = []
+        for directory, _, filenames in os.walk(bucket):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, bucket).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    head = self.head(path)
+                    contents.append({"Key": key, "Size": head["ContentLength"],
+                                     "ETag": head["ETag"], "LastModified": head["LastModified"]})
+        contents.sort(key=lambda obj: obj["Key"])
+        # Comme S3 : pas de clé "Contents" quand rien ne correspond
+        return {"KeyCount": len(contents), **({"Contents": contents} if contents else {})}
+
+    def get_paginator(self, operation_name):
+        return LocalPaginator(getattr(self, operation_name))
+
+    def select_object_content(self, **kwargs):
+        # Comme MinIO sans S3 Select : l'appelant se replie sur des GET par plage
+        raise self.error("NotImplemented", "SelectObjectContent")
+
+
+class LocalPaginator:
+    """Paginateur d'une seule page (le dossier local est listé en entier)."""
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        yield self.operation(**kwargs)
+
+
+class Boto3Hook:
+    """
+    Remplace boto3.client et boto3.Session.client par un LocalS3 au moment
+    où boto3 est importé : l'import de boto3 reste réel (et mesuré), seuls
+    les appels S3 sont simulés.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.searching = False
+
+    def find_spec(self, name, path=None, target=None):
+        # main.py vérifie aussi ses dépendances avec find_spec, sans importer
+        if name != "boto3" or self.searching:
+            return None
+        self.searching = True
+        try:
+            spec = importlib.util.find_spec(name)
+        finally:
+            self.searching = False
+        exec_module = spec.loader.exec_module
+        client = self.client
+
+        def patched_exec_module(module):
+            exec_module(module)
+            module.client = lambda *args, **kwargs: client
+            module.Session.client = lambda session, *args, **kwargs: client
+            sys.meta_path.remove(self)
+
+        spec.loader.exec_module = patched_exec_module
+        return spec
+
+
+def install(root):
+    """
+    Branche le client LocalS3 sur boto3, avant tout import de boto3.
+
+    Args:
+        root (str): Dossier des buckets simulés
+    """
+    sys.meta_path.insert(0, Boto3Hook(LocalS3(root)))
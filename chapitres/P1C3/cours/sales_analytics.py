@@ -0,0 +1,278 @@
+import io
+import os
+import posixpath
+import random
+import time
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from object_cache import ObjectCache, read_object
+
+
+# Dimensions d'analyse du chiffre d'affaires (seules celles présentes dans le fichier sont utilisées :
+# ventes.csv a une colonne region, le sales.csv du notebook P2C4 une colonne country)
+REVENUE_DIMENSIONS = ["date", "country", "region", "product"]
+# Colonnes nécessaires au calcul du chiffre d'affaires (absentes d'un fichier IoT, par exemple)
+REVENUE_COLUMNS = ["quantity", "unit_price"]
+AGGREGATES_FILENAME = "revenue.parquet"
+# Relectures / réécritures de la table d'agrégats quand un autre traitement l'a modifiée entre-temps
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def aggregates_key(processed_key):
+    """
+    Clé S3 de la table d'agrégats, rangée à côté du Parquet traité.
+
+    Args:
+        processed_key (str): Clé du fichier traité (ex: "processed/ventes.parquet")
+
+    Returns:
+        str: Clé des agrégats (ex: "processed/_aggregates/revenue.parquet")
+    """
+    return posixpath.join(posixpath.dirname(processed_key), "_aggregates", AGGREGATES_FILENAME)
+
+
+def has_revenue_columns(df):
+    """Indique si le fichier contient des ventes (colonnes quantity et unit_price)."""
+    return all(column in df.columns for column in REVENUE_COLUMNS)
+
+
+def revenue_aggregates(df, source):
+    """
+    Agrège les ventes au grain (date, country/region, product).
+
+    Le chiffre d'affaires est recalculé comme dans le notebook P2C4
+    (SUM(quantity * unit_price)). Chaque ligne garde le fichier d'origine
+    (`source`) pour pouvoir remplacer ses agrégats lors d'un nouveau traitement.
+
+    Args:
+        df (pd.DataFrame): Ventes nettoyées (colonnes quantity, unit_price + dimensions)
+        source (str): Clé S3 du fichier traité dont proviennent les ventes
+
+    Returns:
+        pd.DataFrame: Une ligne par combinaison de dimensions (orders, quantity, revenue)
+    """
+    dimensions = [column for column in REVENUE_DIMENSIONS if column in df.columns]
+    sales = df[dimensions].copy()
+    if "date" in sales.columns:
+        sales["date"] = pd.to_datetime(sales["date"]).dt.date
+    sales["quantity"] = df["quantity"]
+    sales["revenue"] = df["quantity"] * df["unit_price"]
+
+    aggregates = (
+        sales.groupby(dimensions, as_index=False, dropna=False)
+        .agg(orders=("revenue", "size"), quantity=("quantity", "sum"), revenue=("revenue", "sum"))
+    )
+    aggregates.insert(0, "source", source)
+    return aggregates
+
+
+def load_aggregates(s3, bucket_name, key, cache=None):
+    """
+    Télécharge la table d'agrégats (vide si elle n'existe pas encore).
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        key (str): Clé de la table d'agrégats
+        cache (ObjectCache, optionnel): Cache local (pas de nouveau téléchargement si la table n'a pas changé)
+
+    Returns:
+        pd.DataFrame: Agrégats existants
+    """
+    try:
+        body = read_object(s3, bucket_name, key, cache)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") in ("NoSuchKey", "404"):
+            return pd.DataFrame()
+        raise
+    return pd.read_parquet(io.BytesIO(body))
+
+
+def fetch_aggregates(s3, bucket_name, key):
+    """
+    Télécharge la table d'agrégats avec son ETag, pour la réécrire par un PUT conditionnel.
+
+    Returns:
+        tuple: (agrégats, ETag), ou (DataFrame vide, None) si la table n'existe pas encore
+    """
+    try:
+        resp = s3.get_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") in ("NoSuchKey", "404"):
+            return pd.DataFrame(), None
+        raise
+    return pd.read_parquet(io.BytesIO(resp["Body"].read())), resp["ETag"]
+
+
+def update_aggregates(s3, bucket_name, processed_key, df):
+    """
+    Met à jour les agrégats de chiffre d'affaires après le traitement d'un fichier.
+
+    Les agrégats déjà calculés pour `processed_key` sont remplacés (le fichier
+    traité est réécrit à chaque exécution du pipeline) ; ceux des autres
+    fichiers sont conservés. La table est réécrite en un seul PUT.
+
+    Le PUT est conditionnel (If-Match sur l'ETag lu, ou If-None-Match: *
+    pour une première table), comme pour le manifeste de parquet_compaction :
+    si un autre traitement a réécrit la table entre-temps (deux pipelines,
+    ou main.py et le worker), elle est relue et la mise à jour rejouée au
+    lieu d'écraser ses agrégats.
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        processed_key (str): Clé du fichier traité (ex: "processed/ventes.parquet")
+        df (pd.DataFrame): Ventes nettoyées écrites dans `processed_key`
+
+    Returns:
+        str: Clé de la table d'agrégats
+
+    Raises:
+        RuntimeError: La table a changé à chacune des MAX_UPDATE_ATTEMPTS tentatives
+    """
+    key = aggregates_key(processed_key)
+    new_aggregates = revenue_aggregates(df, processed_key)
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        existing, etag = fetch_aggregates(s3, bucket_name, key)
+        if not existing.empty:
+            existing = existing[existing["source"] != processed_key]
+        aggregates = pd.concat([existing, new_aggregates], ignore_index=True)
+
+        buffer = io.BytesIO()
+        aggregates.to_parquet(buffer, index=False)
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue(), **condition)
+            return key
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") not in ("PreconditionFailed", "ConditionalRequestConflict", "412"):
+                raise
+        # Backoff exponentiel avec jitter avant de relire la table
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    raise RuntimeError(f"Agrégats s3://{bucket_name}/{key} modifiés en continu : mise à jour abandonnée")
+
+
+def query_revenue(s3, bucket_name, processed_prefix="processed/", by=("region",), filters=None, cache=None):
+    """
+    Chiffre d'affaires groupé par dimension(s), servi depuis les agrégats
+    (sans relire les ventes ligne à ligne).
+
+    Args:
+        s3: Client boto3 S3
+        bucket_name (str): Nom du bucket S3
+        processed_prefix (str): Dossier des fichiers traités (défaut: "processed/")
+        by (tuple[str]): Dimensions de regroupement parmi date, country, region, product
+        filters (dict, optionnel): Égalités à appliquer avant regroupement (ex: {"region": "West"})
+        cache (ObjectCache, optionnel): Cache local des objets lus
+
+    Returns:
+        pd.DataFrame: Dimensions demandées + orders, quantity, total_revenue (tri décroissant)
+    """
+    key = posixpath.join(processed_prefix.rstrip("/"), "_aggregates", AGGREGATES_FILENAME)
+    aggregates = load_aggregates(s3, bucket_name, key, cache)
+    if aggregates.empty:
+        raise FileNotFoundError(
+            f"Aucun agrégat dans s3://{bucket_name}/{key}. Lancez d'abord: python main.py process_pipeline"
+        )
+
+    missing = [column for column in list(by) + list(filters or {}) if column not in aggregates.columns]
+    if missing:
+        raise ValueError(f"Dimension(s) absente(s) des agrégats : {', '.join(missing)}")
+
+    for column, value in (filters or {}).items():
+        aggregates = aggregates[aggregates[column].astype(str) == str(value)]
+
+    result = aggregates.groupby(list(by), as_index=False, dropna=False).agg(
+        orders=("orders", "sum"), quantity=("quantity", "sum"), total_revenue=("revenue", "sum")
+    )
+    return result.sort_values("total_revenue", ascending=False).reset_index(drop=True)
+
+
+def read_processed(s3, bucket_name, processed_key, cache=None):
+    """
+    Ventes actuelles d'un fichier traité, manifeste de compaction appliqué
+    (voir parquet_compaction.list_live_files) : le fichier lui-même s'il est
+    encore visible, sinon ses lignes dans le fichier compacté qui l'a remplacé.
+
+    Returns:
+        pd.DataFrame: Ventes du fichier traité
+
+    Raises:
+        FileNotFoundError: Fichier ni listé ni recensé par un manifeste
+    """
+    import pyarrow.parquet as pq
+
+    from parquet_compaction import list_partitions, live_objects, load_manifest, partition_of
+
+    partition = partition_of(processed_key)
+    objects = list_partitions(s3, bucket_name, partition).get(partition, [])
+    manifest = load_manifest(s3, bucket_name, partition)[0]
+    if any(obj["Key"] == processed_key for obj in live_objects(objects, manifest)):
+        return pd.read_parquet(io.BytesIO(read_object(s3, bucket_name, processed_key, cache)))
+
+    for entry in manifest["files"]:
+        for source in entry.get("sources", []):
+            if source["key"] == processed_key:
+                table = pq.read_table(io.BytesIO(read_object(s3, bucket_name, entry["key"], cache)))
+                start, stop = source["rows"]
+                return table.slice(start, stop - start).to_pandas()
+    raise FileNotFoundError(f"s3://{bucket_name}/{processed_key} : ni listé, ni dans un fichier compacté")
+
+
+def scan_revenue(s3, bucket_name, processed_key, by=("region",), filters=None, cache=None):
+    """
+    Même requête calculée en relisant toutes les ventes du fichier traité
+    (référence pour comparer temps et résultat), y compris après sa compaction.
+    """
+    df = read_processed(s3, bucket_name, processed_key, cache)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+    for column, value in (filters or {}).items():
+        df = df[df[column].astype(str) == str(value)]
+    df["revenue"] = df["quantity"] * df["unit_price"]
+    result = df.groupby(list(by), as_index=False, dropna=False).agg(
+        orders=("revenue", "size"), quantity=("quantity", "sum"), total_revenue=("revenue", "sum")
+    )
+    return result.sort_values("total_revenue", ascending=False).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Chiffre d'affaires servi depuis les agrégats de processed/")
+    parser.add_argument("--bucket", default="openclassrooms-datalake-8481716", help="Nom du bucket S3")
+    parser.add_argument("--by", nargs="+", default=["region"], help="Dimensions (date, country, region, product)")
+    parser.add_argument("--where", nargs="*", default=[], help="Filtres colonne=valeur (ex: region=West)")
+    parser.add_argument("--processed-prefix", default="processed/", help="Dossier des fichiers traités")
+    parser.add_argument("--compare", default=None,
+                        help="Clé d'un fichier traité à relire entièrement pour comparer (ex: processed/ventes.parquet)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Garder les objets lus dans le cache local (.s3_cache), revalidé par ETag")
+    parser.add_argument("--profile", default=None, help="Nom du profil AWS à utiliser (optionnel)")
+
+    args = parser.parse_args()
+    s3 = boto3.Session(profile_name=args.profile).client("s3") if args.profile else boto3.client("s3")
+    cache = ObjectCache() if args.cache else None
+
+    filters = dict(item.split("=", 1) for item in args.where)
+    start = time.perf_counter()
+    result = query_revenue(s3, args.bucket, args.processed_prefix, by=args.by, filters=filters, cache=cache)
+    print(result.to_string(index=False))
+    print(f"\n⏱️  Depuis les agrégats : {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if args.compare:
+        start = time.perf_counter()
+        scanned = scan_revenue(s3, args.bucket, args.compare, by=args.by, filters=filters, cache=cache)
+        print(f"⏱️  En relisant {os.path.basename(args.compare)} : {(time.perf_counter() - start) * 1000:.1f} ms")
+        print("✅ Même résultat ?", bool(
+            (result[args.by].astype(str).values == scanned[args.by].astype(str).values).all()
+            and ((result["total_revenue"] - scanned["total_revenue"]).abs() < 1e-6).all()
+        ))
+
+    if cache is not None:
+        print(cache.summary())
@@ -0,0 +1,154 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Imports en tête de main.py avant le chargement paresseux (toutes actions confondues)
+EAGER_IMPORTS = ["boto3", "pandas"]
+BUCKET = "startup-benchmark"
+# Dossier de s3_stub.py
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Fichiers générés par les exécutions, pas copiés dans le dossier de mesure
+IGNORED = shutil.ignore_patterns("__pycache__", ".s3_cache", "_arrow_snapshots", "processed_catalog.db")
+
+
+def main_command(store, argv, eager=False):
+    """
+    Commande qui exécute main.py comme `python main.py <argv>` dans un
+    interpréteur neuf, avec le client S3 simulé par s3_stub.py.
+
+    Args:
+        store (str): Dossier des buckets simulés
+        argv (list[str]): Arguments de main.py (action et options)
+        eager (bool): Importer boto3 et pandas avant main.py (mesure "avant")
+
+    Returns:
+        list[str]: Commande pour subprocess
+    """
+    code = "import sys, s3_stub; s3_stub.install(sys.argv.pop(1))\n"
+    if eager:
+        code += f"import {', '.join(EAGER_IMPORTS)}\n"
+    code += "import runpy; sys.argv[0] = 'main.py'; runpy.run_path('main.py', run_name='__main__')"
+    return [sys.executable, "-c", code, store, *argv]
+
+
+def child_env():
+    """
+    Environnement des lancements : le dossier de ce script est ajouté au
+    PYTHONPATH, après celui de la copie de main.py (pour s3_stub.py).
+    """
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])))
+
+
+def cold_start_ms(command, cwd, repeat, reset=None):
+    """
+    Durée médiane (ms) d'un interpréteur neuf qui exécute `command`.
+
+    Args:
+        command (list[str]): Commande à lancer
+        cwd (str): Dossier d'exécution (copie du dossier de main.py)
+        repeat (int): Nombre de lancements
+        reset (callable, optionnel): Appelée avant chaque lancement, hors chronomètre
+
+    Returns:
+        float: Médiane des durées en millisecondes
+    """
+    durations = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=child_env(), check=True, stdout=subprocess.DEVNULL)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def action_imports(script):
+    """
+    Lit ACTION_DEPENDENCIES dans le main.py à mesurer.
+
+    Args:
+        script (str): Chemin du main.py
+
+    Returns:
+        dict: Action -> modules importés par cette action
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    try:
+        import main
+        return main.ACTION_DEPENDENCIES
+    finally:
+        sys.path.pop(0)
+
+
+def benchmark(script, repeat=5):
+    """
+    Temps de démarrage et d'exécution de chaque action de main.py, lancé
+    comme en ligne de commande (runpy) sur un bucket simulé (s3_stub.py) :
+    le chemin réel de l'action est exécuté, imports paresseux compris.
+
+    Le dossier de main.py est copié dans un dossier temporaire (catalogue et
+    fichiers locaux n'y sont pas modifiés). Le bucket est préparé avec les
+    actions upload_file puis process_pipeline, et remis dans cet état avant
+    chaque lancement. La colonne "avant" importe boto3 et pandas avant
+    main.py, comme le faisaient ses imports en tête de fichier.
+
+    Args:
+        script (str): Chemin du main.py
+        repeat (int): Lancements par mesure (médiane)
+
+    Returns:
+        list[tuple]: (action, ms avant, ms après)
+    """
+    actions = action_imports(script)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = os.path.join(tmp, "app")
+        baseline = os.path.join(tmp, "baseline")
+        store = os.path.join(tmp, "s3")
+        shutil.copytree(os.path.dirname(os.path.abspath(script)), workdir, ignore=IGNORED)
+
+        # État de départ du bucket : fichier brut déposé, traité, puis redéposé
+        for argv in (["create_bucket"], ["upload_file"], ["process_pipeline"], ["upload_file"]):
+            subprocess.run(main_command(baseline, [*argv, "--bucket", BUCKET]), cwd=workdir, env=child_env(),
+                           check=True, stdout=subprocess.DEVNULL)
+
+        def reset():
+            shutil.rmtree(store, ignore_errors=True)
+            shutil.copytree(baseline, store)
+
+        results = []
+        for action in ["--help", *actions]:
+            argv = [action] if action == "--help" else [action, "--bucket", BUCKET]
+            results.append((
+                action,
+                cold_start_ms(main_command(store, argv, eager=True), workdir, repeat, reset),
+                cold_start_ms(main_command(store, argv), workdir, repeat, reset),
+            ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps de démarrage de main.py, action par action")
+    parser.add_argument(
+        "--script",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+        help="main.py à mesurer (défaut: celui de ce dossier, ex: ../correction/main.py)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Nombre de lancements par mesure, la médiane est affichée (défaut: 5)"
+    )
+
+    args = parser.parse_args()
+
+    print(f"Démarrage à froid de {args.script} (médiane sur {args.repeat} lancements)\n")
+    print(f"{'Action':<18} {'avant':>9} {'après':>9} {'gain':>9}")
+    for action, eager_ms, lazy_ms in benchmark(args.script, args.repeat):
+        print(f"{action:<18} {eager_ms:>6.0f} ms {lazy_ms:>6.0f} ms {eager_ms - lazy_ms:>6.0f} ms")
@@ -0,0 +1,53 @@
+"""
+Vérification de non-régression du pipeline sur un CSV qui n'est pas un
+fichier de ventes (S3 simulé par moto) : `pytest test_process_pipeline.py`.
+"""
+import os
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import main
+import parquet_catalog
+
+
+BUCKET = "bucket-test"
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    # Fichiers locaux du pipeline et catalogue écrits dans un dossier temporaire
+    monkeypatch.chdir(tmp_path)
+    open_catalog = parquet_catalog.open_catalog
+    monkeypatch.setattr(parquet_catalog, "open_catalog",
+                        lambda path=str(tmp_path / "processed_catalog.db"): open_catalog(path))
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        monkeypatch.setattr(main, "s3", client, raising=False)
+        yield client
+
+
+def test_csv_without_revenue_columns_is_archived(s3):
+    s3.put_object(Bucket=BUCKET, Key="raw/current/iot_1.csv",
+                  Body=b"device_id,timestamp,temperature\ncapteur_01,2026-01-01T00:00:00,21.5\n")
+
+    main.process_pipeline(BUCKET, "raw/current/iot_1.csv")
+
+    keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET).get("Contents", [])]
+    assert "processed/iot_1.parquet" in keys
+    assert "raw/current/iot_1.csv" not in keys
+    assert any(key.startswith("raw/archived/iot_1_") for key in keys)
+    assert "processed/_aggregates/revenue.parquet" not in keys
+    assert not os.path.exists("iot_1.csv") and not os.path.exists("iot_1.parquet")
+
+
+def test_sales_csv_updates_aggregates(s3):
+    s3.put_object(Bucket=BUCKET, Key="raw/current/ventes.csv",
+                  Body=b"date,region,product,quantity,unit_price\n2026-01-01,West,A,2,10.0\n")
+
+    main.process_pipeline(BUCKET, "raw/current/ventes.csv")
+
+    s3.head_object(Bucket=BUCKET, Key="processed/_aggregates/revenue.parquet")
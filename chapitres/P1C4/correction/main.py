@@ -1,9 +1,120 @@
-import boto3
 import os
+import json
 import argparse
 import datetime
+import importlib.util
 from botocore.exceptions import ClientError
-import pandas as pd
+
+# Réglages d'écriture Parquet par jeu de données, choisis par ../../P1C3/cours/parquet_tuning.py
+# (option --config) et lus par process_pipeline ; défauts de pandas si le fichier n'existe pas
+WRITER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parquet_writer_config.json")
+
+
+# Modules lourds utilisés par chaque action. boto3 et pandas ne sont importés
+# qu'au moment où une action s'en sert : create_bucket ou list_bucket démarrent
+# sans charger pandas (voir ../../P1C3/cours/startup_benchmark.py).
+ACTION_DEPENDENCIES = {
+    "create_bucket": ["boto3"],
+    "upload_file": ["boto3"],
+    "list_bucket": ["boto3"],
+    "process_pipeline": ["boto3", "pandas", "pyarrow"],
+    "all": ["boto3", "pandas", "pyarrow"],
+}
+
+
+def missing_dependencies(action):
+    """
+    Modules requis par une action mais non installés (vérifiés sans les importer).
+    
+    Args:
+        action (str): Action de la ligne de commande
+    
+    Returns:
+        list[str]: Modules manquants
+    """
+    return [module for module in ACTION_DEPENDENCIES[action] if importlib.util.find_spec(module) is None]
+
+
+def transform_iot(df, verbose=False):
+    """
+    Transformation des mesures IoT brutes (étape 3 du pipeline) : timestamps
+    convertis, temperature renommée en temp_c, tri par capteur et par date,
+    moyenne glissante sur 3 mesures (temp_c_roll3).
+
+    Aussi utilisée par parquet_tuning.py (--transform) pour régler l'écriture
+    Parquet sur le schéma traité plutôt que sur les colonnes brutes.
+
+    Args:
+        df (pd.DataFrame): Mesures telles que lues dans le JSON brut
+        verbose (bool): Afficher chaque étape
+
+    Returns:
+        pd.DataFrame: Mesures transformées
+    """
+    import pandas as pd
+
+    # Convertir timestamps
+    if verbose:
+        print("   - Conversion des timestamps...")
+    df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+
+    # Renommer la colonne temperature
+    if verbose:
+        print("   - Renommage des colonnes...")
+    df = df.rename(columns={"temperature": "temp_c"})
+
+    # Ordonnancement logique
+    if verbose:
+        print("   - Tri des données par device_id et timestamp...")
+    df = df.sort_values(["device_id", "timestamp"])
+
+    # Calcul moyenne glissante sur 3 mesures
+    if verbose:
+        print("   - Calcul de la moyenne glissante (rolling 3)...")
+    df["temp_c_roll3"] = (
+        df.groupby("device_id")["temp_c"]
+        .rolling(3, min_periods=1)
+        .mean()
+        .reset_index(level=0, drop=True)
+    )
+    return df
+
+
+def load_writer_config(path=WRITER_CONFIG_PATH):
+    """Configuration d'écriture enregistrée par parquet_tuning.py ({} si aucun réglage)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def writer_options(config, columns):
+    """
+    Options de `df.to_parquet` d'une configuration de parquet_tuning.py, ou {}
+    sans configuration (défauts de pandas). Les réglages de colonnes absentes
+    de `columns` sont ignorés.
+    """
+    if not config:
+        return {}
+    kwargs = {
+        "compression": config["compression"],
+        "use_dictionary": [name for name in config["use_dictionary"] if name in columns],
+        "row_group_size": config["row_group_size"],
+    }
+    if config.get("compression_level") is not None:
+        kwargs["compression_level"] = config["compression_level"]
+    if config.get("column_encoding"):
+        kwargs["column_encoding"] = {name: encoding for name, encoding in config["column_encoding"].items()
+                                     if name in columns}
+    return kwargs
+
+
+def describe_writer_config(config):
+    """Résumé d'une configuration sur une ligne (ex: "zstd(3), dictionnaire: device_id")."""
+    codec = config["compression"] + (f"({config['compression_level']})" if config.get("compression_level") else "")
+    parts = [codec, f"dictionnaire: {', '.join(config['use_dictionary']) or '-'}"]
+    parts += [f"{name}: {encoding}" for name, encoding in config.get("column_encoding", {}).items()]
+    return ", ".join(parts)
 
 
 def create_bucket(bucket_name):
@@ -74,7 +185,7 @@ def upload_file(bucket_name, local_file_path, s3_key):
         raise
 
 
-def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
+def process_iot_pipeline(bucket_name, raw_key, processed_key=None, writer_config=WRITER_CONFIG_PATH):
     """
     Traite un fichier JSON IoT du Data Lake : télécharge, transforme, sauvegarde en Parquet et archive.
     
@@ -95,6 +206,8 @@ def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
         raw_key (str): Clé du fichier brut dans raw/current/ (ex: "raw/current/iot.json")
         processed_key (str, optionnel): Clé de destination dans processed/ 
                                        (par défaut: "processed/iot.parquet")
+        writer_config (str): Fichier des réglages d'écriture Parquet (défaut:
+                             parquet_writer_config.json à côté de main.py)
     
     Returns:
         None
@@ -106,10 +219,8 @@ def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
     """
     global s3
     
-    # Vérifier que pyarrow est installé
-    try:
-        import pyarrow
-    except ImportError:
+    # Vérifier que pyarrow est installé (sans l'importer : pandas le chargera pour l'écriture Parquet)
+    if importlib.util.find_spec("pyarrow") is None:
         print("❌ Erreur : pyarrow n'est pas installé.")
         print("   Le format Parquet nécessite pyarrow.")
         print("   Installez-le avec : pip install pyarrow")
@@ -118,6 +229,8 @@ def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
             "Installez-le avec: pip install pyarrow"
         )
     
+    import pandas as pd
+    
     # Déterminer le nom du fichier et la clé de destination
     filename = os.path.basename(raw_key)
     base_name = os.path.splitext(filename)[0]  # "iot" sans extension
@@ -147,27 +260,7 @@ def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
         
         # Étape 3 : Transformer les données
         print(f"\nÉtape 3 : Transformation des données...")
-        
-        # Convertir timestamps
-        print("   - Conversion des timestamps...")
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        
-        # Renommer la colonne temperature
-        print("   - Renommage des colonnes...")
-        df = df.rename(columns={"temperature": "temp_c"})
-        
-        # Ordonnancement logique
-        print("   - Tri des données par device_id et timestamp...")
-        df = df.sort_values(["device_id", "timestamp"])
-        
-        # Calcul moyenne glissante sur 3 mesures
-        print("   - Calcul de la moyenne glissante (rolling 3)...")
-        df["temp_c_roll3"] = (
-            df.groupby("device_id")["temp_c"]
-            .rolling(3, min_periods=1)
-            .mean()
-            .reset_index(level=0, drop=True)
-        )
+        df = transform_iot(df, verbose=True)
         
         print(f"   ✅ Transformation terminée")
         print(f"   Dimensions finales: {df.shape[0]} lignes, {df.shape[1]} colonnes")
@@ -176,7 +269,11 @@ def process_iot_pipeline(bucket_name, raw_key, processed_key=None):
         
         # Étape 4 : Sauvegarder en Parquet
         print(f"\nÉtape 4 : Sauvegarde en format Parquet...")
-        df.to_parquet(local_parquet)
+        # Codec / encodages choisis par parquet_tuning.py sur le schéma traité (défauts de pandas sinon)
+        config = load_writer_config(writer_config).get(base_name)
+        df.to_parquet(local_parquet, **writer_options(config, list(df.columns)))
+        if config:
+            print(f"   ⚙️  Options d'écriture réglées: {describe_writer_config(config)}")
         s3.upload_file(local_parquet, bucket_name, processed_key)
         print(f"   ✅ Fichier transformé déposé dans: {processed_key}")
         
@@ -313,6 +410,11 @@ if __name__ == "__main__":
         default="raw/",
         help="Préfixe pour filtrer les objets (défaut: raw/)"
     )
+    parser.add_argument(
+        "--writer-config",
+        default=WRITER_CONFIG_PATH,
+        help="Réglages d'écriture Parquet de parquet_tuning.py (défaut: parquet_writer_config.json à côté de main.py)"
+    )
     parser.add_argument(
         "--endpoint",
         default="http://localhost:9000",
@@ -336,6 +438,15 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    missing = missing_dependencies(args.action)
+    if missing:
+        print(f"❌ Module(s) manquant(s) pour {args.action} : {', '.join(missing)}")
+        print(f"   Installez-le(s) avec : pip install {' '.join(missing)}")
+        raise SystemExit(1)
+    
+    # Import après l'analyse des arguments : --help et les erreurs de saisie restent instantanés
+    import boto3
+    
     # Initialisation du client MinIO (compatible S3)
     s3 = boto3.client(
         's3',
@@ -352,12 +463,12 @@ if __name__ == "__main__":
     elif args.action == "upload_file":
         upload_file(args.bucket, args.file, args.s3_key)
     elif args.action == "process_pipeline":
-        process_iot_pipeline(args.bucket, args.raw_key, args.processed_key)
+        process_iot_pipeline(args.bucket, args.raw_key, args.processed_key, args.writer_config)
     elif args.action == "list_bucket":
         list_bucket(args.bucket, prefix=args.prefix)
     elif args.action == "all":
         # Exécution de tous les blocs
         create_bucket(args.bucket)
         upload_file(args.bucket, args.file, args.s3_key)
-        process_iot_pipeline(args.bucket, args.raw_key, args.processed_key)
+        process_iot_pipeline(args.bucket, args.raw_key, args.processed_key, args.writer_config)
         list_bucket(args.bucket, prefix=args.prefix)
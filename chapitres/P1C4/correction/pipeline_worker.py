@@ -0,0 +1,299 @@
+import argparse
+import contextlib
+import io
+import json
+import queue
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus
+
+import boto3
+from botocore.exceptions import ClientError
+
+import main
+
+
+RAW_PREFIX = "raw/current/"
+
+
+def create_client(endpoint, access_key, secret_key, use_ssl=False):
+    """
+    Client MinIO (compatible S3), créé une seule fois pour toute la durée du worker.
+
+    Args:
+        endpoint (str): URL de l'endpoint MinIO
+        access_key (str): Access Key MinIO
+        secret_key (str): Secret Key MinIO
+        use_ssl (bool): Utiliser SSL/TLS
+
+    Returns:
+        Client boto3 S3
+    """
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        use_ssl=use_ssl,
+        verify=False  # Désactiver la vérification SSL pour les instances locales
+    )
+
+
+def warm_up():
+    """
+    Importe une fois pour toutes les bibliothèques du pipeline (pandas, pyarrow),
+    pour que le premier fichier ne paie pas leur chargement.
+
+    Returns:
+        float: Durée du chargement en secondes
+    """
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    return time.perf_counter() - start
+
+
+class KeyPoller:
+    """
+    Détecte les nouveaux fichiers de raw/current/ par listing.
+
+    Chaque listing reprend après la dernière clé vue (`StartAfter`) : seules
+    les clés plus récentes dans l'ordre lexicographique sont renvoyées, page
+    par page. Quand un listing ne renvoie rien, le curseur est remis à zéro
+    et le listing suivant reparcourt tout le préfixe. Cela rattrape un fichier
+    dont le nom est avant le curseur, ou déposé à nouveau sous le même nom
+    (le pipeline vide raw/current/ : ce parcours reste court).
+    """
+
+    def __init__(self, s3, bucket_name, prefix=RAW_PREFIX, suffix=".json"):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.suffix = suffix
+        self.start_after = ""
+
+    def poll(self):
+        """
+        Returns:
+            list[tuple[str, str]]: (clé, ETag) des fichiers trouvés, dans l'ordre du listing
+        """
+        found = []
+        start_after = self.start_after
+        while True:
+            resp = self.s3.list_objects_v2(
+                Bucket=self.bucket_name, Prefix=self.prefix, StartAfter=start_after or self.prefix
+            )
+            contents = resp.get("Contents", [])
+            found.extend((obj["Key"], obj["ETag"]) for obj in contents if obj["Key"].endswith(self.suffix))
+            if not resp.get("IsTruncated") or not contents:
+                break
+            start_after = contents[-1]["Key"]
+
+        self.start_after = found[-1][0] if found else ""
+        return found
+
+
+class NotificationHandler(BaseHTTPRequestHandler):
+    """
+    Reçoit les notifications webhook de MinIO (format des événements S3)
+    et place les clés créées sous le préfixe surveillé dans la file du worker.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            records = json.loads(body or b"{}").get("Records", [])
+        except json.JSONDecodeError:
+            records = []
+        for record in records:
+            if "ObjectCreated" not in record.get("eventName", ""):
+                continue
+            s3_info = record.get("s3", {})
+            key = unquote_plus(s3_info.get("object", {}).get("key", ""))
+            if (s3_info.get("bucket", {}).get("name") == self.server.bucket_name
+                    and key.startswith(self.server.prefix) and key.endswith(self.server.suffix)):
+                self.server.keys.put((key, s3_info["object"].get("eTag", "")))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_webhook(port, bucket_name, prefix=RAW_PREFIX, suffix=".json"):
+    """
+    Démarre le serveur de notifications dans un thread.
+
+    Args:
+        port (int): Port d'écoute (cible webhook configurée dans MinIO)
+        bucket_name (str): Bucket surveillé
+        prefix (str): Préfixe surveillé (défaut: raw/current/)
+        suffix (str): Extension des fichiers à traiter (défaut: .json)
+
+    Returns:
+        ThreadingHTTPServer: Serveur démarré ; sa file `keys` reçoit les (clé, ETag)
+    """
+    server = ThreadingHTTPServer(("0.0.0.0", port), NotificationHandler)
+    server.bucket_name, server.prefix, server.suffix = bucket_name, prefix, suffix
+    server.keys = queue.Queue()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def process_key(bucket_name, raw_key, quiet=True):
+    """
+    Lance le pipeline existant sur un fichier, avec le client et les
+    bibliothèques déjà chargés.
+
+    Args:
+        bucket_name (str): Nom du bucket
+        raw_key (str): Clé du fichier brut dans raw/current/
+        quiet (bool): Masquer le détail des étapes (défaut: True)
+
+    Returns:
+        str: "ok", "absent" (déjà traité, ex: notification reçue deux fois) ou "erreur"
+    """
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            main.process_iot_pipeline(bucket_name, raw_key)
+        return "ok"
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code', '') in ('NoSuchKey', '404'):
+            return "absent"
+        print(output.getvalue(), end="")
+        print(traceback.format_exc(), end="")
+        return "erreur"
+    except Exception:
+        # La sortie capturée peut être vide (échec avant le premier print) : la cause vient de la trace
+        print(output.getvalue(), end="")
+        print(traceback.format_exc(), end="")
+        return "erreur"
+
+
+def run_worker(s3, bucket_name, source="poll", interval=2.0, port=8765, max_files=None, quiet=True):
+    """
+    Boucle du worker : attend les nouveaux fichiers de raw/current/ et les traite un par un.
+
+    Args:
+        s3: Client boto3 S3, partagé avec main.py
+        bucket_name (str): Nom du bucket
+        source (str): "poll" (listing avec StartAfter) ou "webhook" (notifications MinIO)
+        interval (float): Secondes entre deux listings (mode poll)
+        port (int): Port du serveur de notifications (mode webhook)
+        max_files (int, optionnel): S'arrêter après ce nombre de fichiers traités
+        quiet (bool): Masquer le détail des étapes du pipeline
+
+    Returns:
+        list[float]: Latence de traitement de chaque fichier (secondes)
+    """
+    main.s3 = s3
+    poller = KeyPoller(s3, bucket_name)
+    server = start_webhook(port, bucket_name) if source == "webhook" else None
+    failed = set()
+    latencies = []
+
+    # Fichiers déposés pendant que le worker était arrêté
+    pending = poller.poll()
+    print(f"👀 En attente de fichiers dans {bucket_name}/{RAW_PREFIX} "
+          f"({'listing toutes les %.1f s' % interval if server is None else f'notifications sur le port {port}'})")
+    try:
+        while max_files is None or len(latencies) < max_files:
+            if not pending:
+                if server is None:
+                    time.sleep(interval)
+                    pending = poller.poll()
+                else:
+                    pending = [server.keys.get()]
+                continue
+
+            raw_key, etag = pending.pop(0)
+            if (raw_key, etag) in failed:
+                continue
+            start = time.perf_counter()
+            status = process_key(bucket_name, raw_key, quiet)
+            elapsed = time.perf_counter() - start
+            if status == "ok":
+                latencies.append(elapsed)
+                print(f"✅ {raw_key} traité en {elapsed * 1000:.0f} ms")
+            elif status == "erreur":
+                # Pas de nouvel essai tant que le fichier n'est pas remplacé (nouvel ETag)
+                failed.add((raw_key, etag))
+                print(f"❌ {raw_key} en échec, laissé dans {RAW_PREFIX}")
+    except KeyboardInterrupt:
+        print("\n⏹️  Arrêt du worker")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if latencies:
+        print(f"📊 {len(latencies)} fichier(s), latence médiane "
+              f"{sorted(latencies)[len(latencies) // 2] * 1000:.0f} ms")
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker résident du pipeline IoT (MinIO)")
+    parser.add_argument(
+        "--bucket",
+        default="openclassrooms-datalake-8481716",
+        help="Nom du bucket (défaut: openclassrooms-datalake-8481716)"
+    )
+    parser.add_argument(
+        "--source",
+        choices=["poll", "webhook"],
+        default="poll",
+        help="poll: listing de raw/current/ avec StartAfter, webhook: notifications MinIO (défaut: poll)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Secondes entre deux listings en mode poll (défaut: 2)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port du serveur de notifications en mode webhook (défaut: 8765)"
+    )
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        default=None,
+        help="S'arrêter après N fichiers traités (défaut: jamais)"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Afficher le détail des étapes du pipeline pour chaque fichier"
+    )
+    parser.add_argument(
+        "--endpoint",
+        default="http://localhost:9000",
+        help="URL de l'endpoint MinIO (défaut: http://localhost:9000)"
+    )
+    parser.add_argument(
+        "--access-key",
+        default="minioadmin",
+        help="Access Key MinIO (défaut: minioadmin)"
+    )
+    parser.add_argument(
+        "--secret-key",
+        default="minioadmin",
+        help="Secret Key MinIO (défaut: minioadmin)"
+    )
+    parser.add_argument(
+        "--use-ssl",
+        action="store_true",
+        help="Utiliser SSL/TLS pour la connexion MinIO (défaut: False)"
+    )
+
+    args = parser.parse_args()
+
+    print(f"⏳ Chargement de pandas / pyarrow : {warm_up():.2f} s")
+    s3 = create_client(args.endpoint, args.access_key, args.secret_key, args.use_ssl)
+    print(f"Connexion à MinIO: {args.endpoint}")
+    run_worker(s3, args.bucket, args.source, args.interval, args.port, args.max_files, quiet=not args.verbose)
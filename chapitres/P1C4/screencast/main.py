@@ -1,5 +1,9 @@
 import boto3
 import argparse
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.exceptions import S3UploadFailedError
 from botocore.exceptions import ClientError
 
 
@@ -23,12 +27,13 @@ def list_buckets():
         raise
 
 
-def create_bucket(bucket_name):
+def create_bucket(bucket_name, show_buckets=True):
     """
     Crée un bucket MinIO avec le nom spécifié.
     
     Args:
         bucket_name (str): Nom du bucket
+        show_buckets (bool): Afficher la liste des buckets après la création (défaut: True)
     """
     global s3
     try:
@@ -37,8 +42,9 @@ def create_bucket(bucket_name):
         print(f"✅ Bucket {bucket_name} créé avec succès.")
         
         # Afficher la liste mise à jour
-        print("\nNouveaux buckets :")
-        list_buckets()
+        if show_buckets:
+            print("\nNouveaux buckets :")
+            list_buckets()
     except ClientError as e:
         error_code = e.response.get('Error', {}).get('Code', '')
         if error_code == 'BucketAlreadyExists':
@@ -51,7 +57,27 @@ def create_bucket(bucket_name):
             raise
 
 
-def upload_file(bucket_name, local_file, object_key):
+def list_objects(bucket_name, prefix=""):
+    """
+    Liste les objets d'un préfixe, page par page (1000 clés par requête).
+    
+    Args:
+        bucket_name (str): Nom du bucket
+        prefix (str): Préfixe à lister (défaut: tout le bucket)
+    
+    Returns:
+        dict: Taille en octets de chaque clé
+    """
+    global s3
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = obj["Size"]
+    return objects
+
+
+def upload_file(bucket_name, local_file, object_key, show_objects=True):
     """
     Upload un fichier vers un bucket MinIO.
     
@@ -59,6 +85,7 @@ def upload_file(bucket_name, local_file, object_key):
         bucket_name (str): Nom du bucket
         local_file (str): Chemin local du fichier à uploader
         object_key (str): Clé (chemin) dans le bucket
+        show_objects (bool): Afficher les objets du dossier de destination (défaut: True)
     """
     global s3
     try:
@@ -66,14 +93,17 @@ def upload_file(bucket_name, local_file, object_key):
         s3.upload_file(local_file, bucket_name, object_key)
         print(f"✅ Fichier uploadé avec succès.")
         
-        # Lister les objets du bucket
-        print("\nObjets dans le bucket :")
-        response = s3.list_objects_v2(Bucket=bucket_name)
-        if response.get("Contents"):
-            for obj in response["Contents"]:
-                print(f" - {obj['Key']}")
-        else:
-            print("  (aucun objet)")
+        # Lister les objets du dossier de destination (pas tout le bucket)
+        if show_objects:
+            prefix = posixpath.dirname(object_key)
+            prefix = f"{prefix}/" if prefix else ""
+            print(f"\nObjets dans {bucket_name}/{prefix} :")
+            objects = list_objects(bucket_name, prefix)
+            if objects:
+                for key in objects:
+                    print(f" - {key}")
+            else:
+                print("  (aucun objet)")
     except ClientError as e:
         error_code = e.response.get('Error', {}).get('Code', '')
         if error_code == 'NoSuchBucket':
@@ -88,14 +118,108 @@ def upload_file(bucket_name, local_file, object_key):
         raise
 
 
+def collect_files(paths, prefix):
+    """
+    Associe chaque fichier local à sa clé sous `prefix`. Un dossier est
+    parcouru récursivement et garde son arborescence.
+    
+    Args:
+        paths (list[str]): Fichiers et/ou dossiers locaux
+        prefix (str): Préfixe de destination (ex: "raw/current/")
+    
+    Returns:
+        dict: Clé -> chemin local
+    """
+    files = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    local_file = os.path.join(root, name)
+                    relative = os.path.relpath(local_file, path).replace(os.sep, "/")
+                    files[posixpath.join(prefix, relative)] = local_file
+        else:
+            files[posixpath.join(prefix, os.path.basename(path))] = path
+    return files
+
+
+def upload_files(bucket_name, paths, prefix="raw/current/", workers=8):
+    """
+    Upload en parallèle d'un ensemble de fichiers, puis une seule vérification.
+    
+    Les uploads partent sur `workers` threads (le client boto3 est partagé,
+    il est thread-safe). Au lieu de relister le bucket après chaque fichier,
+    le préfixe de destination est listé une seule fois (paginé) à la fin,
+    et chaque clé attendue est comparée à la taille du fichier local.
+    
+    Args:
+        bucket_name (str): Nom du bucket
+        paths (list[str]): Fichiers et/ou dossiers locaux à uploader
+        prefix (str): Préfixe de destination (défaut: "raw/current/")
+        workers (int): Nombre d'uploads simultanés (défaut: 8)
+    
+    Returns:
+        list[str]: Clés uploadées et vérifiées
+    """
+    global s3
+    files = collect_files(paths, prefix)
+    if not files:
+        print("⚠️  Aucun fichier à uploader.")
+        return []
+    
+    print(f"\nUpload de {len(files)} fichier(s) dans {bucket_name}/{prefix} ({workers} en parallèle)")
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(s3.upload_file, local_file, bucket_name, key): key
+            for key, local_file in files.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+                print(f" ✅ {key}")
+            except FileNotFoundError:
+                errors[key] = f"le fichier {files[key]} n'existe pas"
+                print(f" ❌ {key} : {errors[key]}")
+            except (ClientError, S3UploadFailedError) as e:
+                # upload_file encapsule l'erreur S3 dans S3UploadFailedError
+                errors[key] = str(e)
+                print(f" ❌ {key} : {errors[key]}")
+    
+    if any("NoSuchBucket" in error for error in errors.values()):
+        print(f"❌ Le bucket {bucket_name} n'existe pas.")
+        print("   Créez d'abord le bucket avec: python main.py create_bucket")
+        raise RuntimeError(f"Bucket {bucket_name} introuvable")
+    
+    # Vérification : un seul listing paginé du préfixe
+    uploaded = list_objects(bucket_name, prefix)
+    missing = [key for key in files if key not in uploaded and key not in errors]
+    mismatched = [
+        key for key, local_file in files.items()
+        if key in uploaded and key not in errors and uploaded[key] != os.path.getsize(local_file)
+    ]
+    verified = [key for key in files if key in uploaded and key not in errors and key not in mismatched]
+    
+    print(f"\nVérification ({prefix}) : {len(verified)}/{len(files)} fichier(s) présents avec la bonne taille")
+    for key in missing:
+        print(f" ❌ Absent après upload : {key}")
+    for key in mismatched:
+        print(f" ❌ Taille différente : {key}")
+    
+    if errors or missing or mismatched:
+        raise RuntimeError(f"{len(files) - len(verified)} fichier(s) non uploadé(s) sur {len(files)}")
+    return verified
+
+
 if __name__ == "__main__":
     global s3
     
     parser = argparse.ArgumentParser(description="Démonstration MinIO pour screencast")
     parser.add_argument(
         "action",
-        choices=["list_buckets", "create_bucket", "upload_file", "all"],
-        help="Action à exécuter: list_buckets, create_bucket, upload_file, ou all"
+        choices=["list_buckets", "create_bucket", "upload_file", "upload_files", "all"],
+        help="Action à exécuter: list_buckets, create_bucket, upload_file, upload_files (plusieurs fichiers en parallèle), ou all"
     )
     parser.add_argument(
         "--bucket",
@@ -112,6 +236,23 @@ if __name__ == "__main__":
         default="raw/current/sample.txt",
         help="Clé de destination (défaut: raw/current/sample.txt)"
     )
+    parser.add_argument(
+        "--files",
+        nargs="+",
+        default=["sample.txt"],
+        help="Fichiers et/ou dossiers locaux pour upload_files (défaut: sample.txt)"
+    )
+    parser.add_argument(
+        "--prefix",
+        default="raw/current/",
+        help="Préfixe de destination pour upload_files (défaut: raw/current/)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Nombre d'uploads simultanés pour upload_files (défaut: 8)"
+    )
     parser.add_argument(
         "--endpoint",
         default="http://localhost:9000",
@@ -152,6 +293,8 @@ if __name__ == "__main__":
         create_bucket(args.bucket)
     elif args.action == "upload_file":
         upload_file(args.bucket, args.file, args.s3_key)
+    elif args.action == "upload_files":
+        upload_files(args.bucket, args.files, args.prefix, args.workers)
     elif args.action == "all":
         # Exécution de toutes les étapes
         list_buckets()
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import deltalake
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyiceberg
+from deltalake import DeltaTable, QueryBuilder, write_deltalake
+
+from pyiceberg.catalog import Catalog
+from pyiceberg.schema import Schema
+from pyiceberg.types import DoubleType, LongType, NestedField, StringType
+
+from iceberg_catalog import load_local_catalog
+
+
+# -----------------------------
+# Jeux de données (schémas clients et sensors)
+# -----------------------------
+CITIES = ["Paris", "Lyon", "Marseille", "Lille", "Nantes", "Bordeaux"]
+COUNTRIES = ["France", "Belgique", "Suisse", "Canada", "Maroc"]
+PARCELS = ["North-1", "North-2", "East-2", "South-3", "West-1", "West-3"]
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """
+    Schéma + générateur de données + paramètres des opérations du banc d'essai.
+
+    - key : clé unique (ligne à ligne) utilisée pour update / delete / merge
+    - filter_column / filter_value : filtre d'égalité du scan filtré
+    - update_column / update_value : colonne modifiée par l'update et le merge
+    """
+
+    name: str
+    schema: Schema
+    make: Callable[[int, int, np.random.Generator], pa.Table]
+    key: str
+    filter_column: str
+    filter_value: str
+    update_column: str
+    update_value: object
+
+
+def make_clients(start: int, rows: int, rng: np.random.Generator) -> pa.Table:
+    ids = np.arange(start, start + rows, dtype=np.int64)
+    return pa.table(
+        {
+            "id": ids,
+            "name": pc.binary_join_element_wise(
+                pa.scalar("Client ", pa.large_string()),
+                pa.array(ids).cast(pa.large_string()),
+                pa.scalar("", pa.large_string()),
+            ),
+            "city": pa.array(np.array(CITIES)[rng.integers(0, len(CITIES), rows)], type=pa.large_string()),
+            "country": pa.array(np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), rows)], type=pa.large_string()),
+        },
+        schema=CLIENTS_SCHEMA.as_arrow(),
+    )
+
+
+def make_sensors(start: int, rows: int, rng: np.random.Generator) -> pa.Table:
+    return pa.table(
+        {
+            "sensor_id": np.arange(start, start + rows, dtype=np.int64),
+            "humidity": np.round(rng.uniform(20.0, 80.0, rows), 1),
+            "parcel": pa.array(np.array(PARCELS)[rng.integers(0, len(PARCELS), rows)], type=pa.large_string()),
+        },
+        schema=SENSORS_SCHEMA.as_arrow(),
+    )
+
+
+CLIENTS_SCHEMA = Schema(
+    NestedField(1, "id", LongType(), required=False),
+    NestedField(2, "name", StringType(), required=False),
+    NestedField(3, "city", StringType(), required=False),
+    NestedField(4, "country", StringType(), required=False),
+)
+
+SENSORS_SCHEMA = Schema(
+    NestedField(1, "sensor_id", LongType(), required=False),
+    NestedField(2, "humidity", DoubleType(), required=False),
+    NestedField(3, "parcel", StringType(), required=False),
+)
+
+DATASETS = {
+    "clients": Dataset("clients", CLIENTS_SCHEMA, make_clients, "id", "country", "France", "name", "updated"),
+    "sensors": Dataset("sensors", SENSORS_SCHEMA, make_sensors, "sensor_id", "parcel", "North-1", "humidity", -1.0),
+}
+
+
+# -----------------------------
+# Paramètres communs des opérations
+# -----------------------------
+@dataclass(frozen=True)
+class Workload:
+    """Données et plages de clés d'une exécution (identiques pour les deux formats)."""
+
+    dataset: Dataset
+    rows: int
+    initial: pa.Table
+    appended: pa.Table
+    replacement: pa.Table
+    merge_source: pa.Table
+    update_range: tuple[int, int]
+    delete_range: tuple[int, int]
+
+
+def build_workload(dataset: Dataset, rows: int, seed: int) -> Workload:
+    """
+    - load : `rows` lignes (clés 0..rows-1)
+    - append : 10 % de nouvelles lignes
+    - update : 10 % des lignes (plage de clés)
+    - delete : 10 % des lignes (autre plage)
+    - merge : 10 % de clés existantes modifiées + 10 % de nouvelles clés
+    - overwrite : remplacement complet par `rows` nouvelles lignes
+    """
+    rng = np.random.default_rng(seed)
+    tenth = max(rows // 10, 1)
+    initial = dataset.make(0, rows, rng)
+    appended = dataset.make(rows, tenth, rng)
+
+    matched = dataset.make(rows // 2 + tenth, tenth, rng)
+    matched = matched.set_column(
+        matched.schema.get_field_index(dataset.update_column),
+        dataset.update_column,
+        pa.repeat(pa.scalar(dataset.update_value, matched.schema.field(dataset.update_column).type), tenth),
+    )
+    inserted = dataset.make(rows + tenth, tenth, rng)
+
+    return Workload(
+        dataset=dataset,
+        rows=rows,
+        initial=initial,
+        appended=appended,
+        replacement=dataset.make(2 * rows, rows, rng),
+        merge_source=pa.concat_tables([matched, inserted]),
+        update_range=(rows // 2, rows // 2 + tenth),
+        delete_range=(0, tenth),
+    )
+
+
+def sql_range(column: str, bounds: tuple[int, int]) -> str:
+    return f"{column} >= {bounds[0]} AND {column} < {bounds[1]}"
+
+
+def sql_literal(value) -> str:
+    return f"'{value}'" if isinstance(value, str) else repr(value)
+
+
+# -----------------------------
+# Mesures disque
+# -----------------------------
+def list_files(root: Path) -> dict[str, int]:
+    """{chemin relatif: taille} de tous les fichiers (données + métadonnées) de la table."""
+    if not root.exists():
+        return {}
+    return {str(p.relative_to(root)): p.stat().st_size for p in root.rglob("*") if p.is_file()}
+
+
+def measure(root: Path, operation: Callable[[], object]) -> dict:
+    """Exécute une opération et mesure latence, fichiers écrits et octets sur disque."""
+    before = list_files(root)
+    start = time.perf_counter()
+    result = operation()
+    latency = time.perf_counter() - start
+    after = list_files(root)
+    written = [path for path in after if path not in before]
+    return {
+        "latency_s": latency,
+        "files_written": len(written),
+        "bytes_written": sum(after[path] for path in written),
+        "files_on_disk": len(after),
+        "bytes_on_disk": sum(after.values()),
+        "rows_returned": result.num_rows if isinstance(result, pa.Table) else None,
+    }
+
+
+# -----------------------------
+# Opérations Delta Lake (deltalake / delta-rs)
+# -----------------------------
+def delta_operations(root: Path, w: Workload) -> list[tuple[str, Callable[[], object]]]:
+    ds = w.dataset
+    uri = str(root)
+
+    def update():
+        DeltaTable(uri).update(
+            new_values={ds.update_column: ds.update_value},
+            predicate=sql_range(ds.key, w.update_range),
+        )
+
+    def filtered_scan():
+        # Moteur DataFusion de delta-rs : le filtre est poussé jusqu'aux fichiers
+        # (les fichiers réécrits par merge mélangent string et string_view côté dataset pyarrow)
+        return pa.table(
+            QueryBuilder()
+            .register("t", DeltaTable(uri))
+            .execute(f"SELECT * FROM t WHERE {ds.filter_column} = {sql_literal(ds.filter_value)}")
+            .read_all()
+        )
+
+    def merge():
+        (
+            DeltaTable(uri)
+            .merge(
+                source=w.merge_source,
+                predicate=f"source.{ds.key} = target.{ds.key}",
+                source_alias="source",
+                target_alias="target",
+            )
+            .when_matched_update_all()
+            .when_not_matched_insert_all()
+            .execute()
+        )
+
+    return [
+        ("load", lambda: write_deltalake(uri, w.initial, mode="overwrite")),
+        ("append", lambda: write_deltalake(uri, w.appended, mode="append")),
+        ("update", update),
+        ("delete", lambda: DeltaTable(uri).delete(sql_range(ds.key, w.delete_range))),
+        ("merge", merge),
+        ("full_scan", lambda: DeltaTable(uri).to_pyarrow_table()),
+        ("filtered_scan", filtered_scan),
+        ("time_travel", lambda: DeltaTable(uri, version=0).to_pyarrow_table()),
+        ("overwrite", lambda: write_deltalake(uri, w.replacement, mode="overwrite")),
+    ]
+
+
+# -----------------------------
+# Opérations Iceberg (pyiceberg, catalogue SQLite local)
+# -----------------------------
+def iceberg_operations(catalog: Catalog, identifier: str, w: Workload) -> list[tuple[str, Callable[[], object]]]:
+    ds = w.dataset
+
+    def load():
+        catalog.create_table(identifier, schema=ds.schema).append(w.initial)
+
+    def update():
+        # PyIceberg n'a pas d'UPDATE : lecture des lignes ciblées puis overwrite par filtre
+        table = catalog.load_table(identifier)
+        predicate = sql_range(ds.key, w.update_range)
+        rows = table.scan(row_filter=predicate).to_arrow()
+        column = rows.schema.get_field_index(ds.update_column)
+        rows = rows.set_column(
+            column,
+            ds.update_column,
+            pa.repeat(pa.scalar(ds.update_value, rows.schema.field(column).type), rows.num_rows),
+        )
+        table.overwrite(rows, overwrite_filter=predicate)
+
+    def time_travel():
+        table = catalog.load_table(identifier)
+        first = min(table.snapshots(), key=lambda s: s.sequence_number)
+        return table.scan(snapshot_id=first.snapshot_id).to_arrow()
+
+    return [
+        ("load", load),
+        ("append", lambda: catalog.load_table(identifier).append(w.appended)),
+        ("update", update),
+        ("delete", lambda: catalog.load_table(identifier).delete(sql_range(ds.key, w.delete_range))),
+        ("merge", lambda: catalog.load_table(identifier).upsert(w.merge_source, join_cols=[ds.key])),
+        ("full_scan", lambda: catalog.load_table(identifier).scan().to_arrow()),
+        ("filtered_scan", lambda: catalog.load_table(identifier).scan(
+            row_filter=f"{ds.filter_column} = {sql_literal(ds.filter_value)}"
+        ).to_arrow()),
+        ("time_travel", time_travel),
+        ("overwrite", lambda: catalog.load_table(identifier).overwrite(w.replacement)),
+    ]
+
+
+# -----------------------------
+# Exécution
+# -----------------------------
+def run_format(fmt: str, workdir: Path, w: Workload) -> list[dict]:
+    """Rejoue toutes les opérations sur une table neuve du format demandé."""
+    if fmt == "delta":
+        root = workdir / f"delta_{w.dataset.name}"
+        operations = delta_operations(root, w)
+    else:
+        catalog = load_local_catalog(workdir)
+        catalog.create_namespace_if_not_exists("bench")
+        identifier = f"bench.{w.dataset.name}"
+        root = workdir / "iceberg_demo" / "bench" / w.dataset.name
+        operations = iceberg_operations(catalog, identifier, w)
+
+    results = []
+    for operation, func in operations:
+        results.append({"operation": operation, **measure(root, func)})
+    return results
+
+
+def summarize(records: list[dict]) -> list[dict]:
+    """Médiane de latence par (format, dataset, rows, operation)."""
+    groups: dict[tuple, list[dict]] = {}
+    for record in records:
+        key = (record["format"], record["dataset"], record["rows"], record["operation"])
+        groups.setdefault(key, []).append(record)
+    return [
+        {
+            "format": fmt,
+            "dataset": dataset,
+            "rows": rows,
+            "operation": operation,
+            "runs": len(group),
+            "latency_s_median": statistics.median(r["latency_s"] for r in group),
+            "latency_s_min": min(r["latency_s"] for r in group),
+            "files_written": group[-1]["files_written"],
+            "bytes_written": group[-1]["bytes_written"],
+            "bytes_on_disk": group[-1]["bytes_on_disk"],
+        }
+        for (fmt, dataset, rows, operation), group in groups.items()
+    ]
+
+
+def print_summary(summary: list[dict]) -> None:
+    print(
+        f"{'dataset':<8} {'rows':>9} {'operation':<14} {'format':<8} "
+        f"{'latence ms':>11} {'fichiers':>9} {'octets écrits':>14} {'octets disque':>14}"
+    )
+    for s in sorted(summary, key=lambda s: (s["dataset"], s["rows"], s["operation"], s["format"])):
+        print(
+            f"{s['dataset']:<8} {s['rows']:>9} {s['operation']:<14} {s['format']:<8} "
+            f"{s['latency_s_median'] * 1000:>11.1f} {s['files_written']:>9} "
+            f"{s['bytes_written']:>14} {s['bytes_on_disk']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Banc d'essai Delta Lake vs Iceberg : écriture, update, merge et lecture"
+    )
+    parser.add_argument("--datasets", nargs="+", choices=sorted(DATASETS), default=sorted(DATASETS))
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Tailles de table à tester (défaut: 10000 100000)")
+    parser.add_argument("--formats", nargs="+", choices=["delta", "iceberg"], default=["delta", "iceberg"])
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure (défaut: 3)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=Path(__file__).parent / "bench_results.json",
+                        help="Fichier de résultats JSON (défaut: bench_results.json)")
+
+    args = parser.parse_args()
+
+    records = []
+    for dataset_name in args.datasets:
+        for rows in args.rows:
+            workload = build_workload(DATASETS[dataset_name], rows, args.seed)
+            for run in range(args.repeat):
+                for fmt in args.formats:
+                    # Table neuve à chaque exécution : les mesures ne dépendent pas de la précédente
+                    workdir = Path(tempfile.mkdtemp(prefix=f"bench_{fmt}_"))
+                    try:
+                        for result in run_format(fmt, workdir, workload):
+                            records.append(
+                                {"format": fmt, "dataset": dataset_name, "rows": rows, "run": run, **result}
+                            )
+                    finally:
+                        shutil.rmtree(workdir, ignore_errors=True)
+                print(f"✅ {dataset_name} / {rows} lignes : exécution {run + 1}/{args.repeat}")
+
+    summary = summarize(records)
+    print_summary(summary)
+
+    args.output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "environment": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "deltalake": deltalake.__version__,
+                    "pyiceberg": pyiceberg.__version__,
+                    "pyarrow": pa.__version__,
+                },
+                "parameters": {
+                    "datasets": args.datasets,
+                    "rows": args.rows,
+                    "formats": args.formats,
+                    "repeat": args.repeat,
+                    "seed": args.seed,
+                },
+                "summary": summary,
+                "runs": records,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    print(f"\nRésultats écrits dans {args.output}")
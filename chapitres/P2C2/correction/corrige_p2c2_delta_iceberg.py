@@ -1,18 +1,29 @@
 from __future__ import annotations
 
+from datetime import date
 from pathlib import Path
-import shutil
 
 import pandas as pd
-import pyarrow as pa
 
-from deltalake import DeltaTable, write_deltalake
+from deltalake import DeltaTable
 
 from pyiceberg.schema import Schema
 from pyiceberg.types import NestedField, LongType, StringType
 from pyiceberg.catalog import load_catalog
 from pyiceberg.exceptions import TableAlreadyExistsError
 
+from delta_write import write_daily_partition
+from iceberg_arrow import append_batches, dataframe_to_arrow, open_csv_batches
+from iceberg_layout import (
+    customers_partition_spec,
+    customers_sort_order,
+    ensure_customers_layout,
+    print_pruning,
+    scan_with_pruning,
+    sort_for_write,
+)
+from local_reads import measure, read_delta_local, read_iceberg_local, to_pandas
+
 
 # -----------------------------
 # Helpers
@@ -74,32 +85,37 @@ df_new = pd.DataFrame(
 print_title("1) Delta Lake : créer la table locale à partir de clients.csv")
 
 delta_path = BASE / "delta_clients"
+ingest_date = date.today()
 
-# Rejouable : on repart de zéro
-if delta_path.exists():
-    shutil.rmtree(delta_path)
-
-write_deltalake(str(delta_path), df_clients, mode="overwrite")
+# Rejouable sans supprimer la table : l'overwrite par prédicat (ingest_date = jour)
+# crée la table au premier lancement, puis ne remplace que la partition du jour
+# (une table non partitionnée, créée par l'ancienne version du script, est recréée une fois)
+write_daily_partition(delta_path, df_clients, ingest_date=ingest_date)
 dt = DeltaTable(str(delta_path))
-print(f"✅ Table Delta créée dans: {delta_path.resolve()}")
-print("Version actuelle (attendue: 0) :", dt.version())
+initial_version = dt.version()
+print(f"✅ Table Delta écrite dans: {delta_path.resolve()}")
+print("Colonnes de partition :", dt.metadata().partition_columns)
+print("Version actuelle (0 au premier lancement) :", initial_version)
 
 print_title("2) Delta Lake : ajouter 2 clients, puis vérifier la version")
-write_deltalake(str(delta_path), df_new, mode="append")
+write_daily_partition(delta_path, df_new, ingest_date=ingest_date, mode="append")
 dt = DeltaTable(str(delta_path))
 print("✅ Données ajoutées.")
-print("Version actuelle (attendue: 1) :", dt.version())
+print(f"Version actuelle (attendue: {initial_version + 1}) :", dt.version())
 print("\nTable Delta (dernières lignes) :")
-print(dt.to_pandas().tail())
+# Lecture locale : Parquet mappé en mémoire, résultat gardé en Arrow (pandas sans copie)
+delta_latest = read_delta_local(dt)
+print(to_pandas(delta_latest).tail())
 
-print_title("3) Delta Lake : time travel (relire la version 0)")
-dt_v0 = DeltaTable(str(delta_path), version=0)
-print("✅ Lecture de la version 0.")
-print(dt_v0.to_pandas().tail())
+print_title("3) Delta Lake : time travel (relire la version de l'étape 1)")
+dt_v0 = DeltaTable(str(delta_path), version=initial_version)
+print(f"✅ Lecture de la version {initial_version}.")
+delta_v0 = read_delta_local(dt_v0)
+print(to_pandas(delta_v0).tail())
 
 print("\n💡 Différence de taille :")
-print("Version 0 - nb lignes :", len(dt_v0.to_pandas()))
-print("Dernière version - nb lignes :", len(dt.to_pandas()))
+print(f"Version {initial_version} - nb lignes :", delta_v0.num_rows)
+print("Dernière version - nb lignes :", delta_latest.num_rows)
 
 
 # =============================
@@ -138,26 +154,28 @@ schema = Schema(
     NestedField(4, "country", StringType(), required=False),
 )
 
+# Partitionnement country + bucket(id), tri par id dans chaque fichier
 try:
-    table = catalog.create_table(identifier, schema=schema)
+    table = catalog.create_table(
+        identifier,
+        schema=schema,
+        partition_spec=customers_partition_spec(schema),
+        sort_order=customers_sort_order(schema),
+    )
     print("✅ Table Iceberg créée :", identifier)
 except TableAlreadyExistsError:
-    table = catalog.load_table(identifier)
+    table = ensure_customers_layout(catalog.load_table(identifier))
     print("✅ Table Iceberg déjà existante, chargée :", identifier)
 
 print("Location :", table.location())
+print("Partitionnement :", table.spec())
+print("Ordre de tri :", table.sort_order())
 
 # --- Append #1 : dataset initial ---
-arrow_initial = pa.table(
-    {
-        "id": df_clients["id"].tolist(),
-        "name": df_clients["name"].tolist(),
-        "city": df_clients["city"].tolist(),
-        "country": df_clients["country"].tolist(),
-    }
-)
-table.append(arrow_initial)
-print("✅ Iceberg : dataset initial ajouté (snapshot créé).")
+# Le CSV est lu directement en Arrow avec les types du schéma Iceberg et
+# envoyé en flux de record batches (pas de listes Python intermédiaires).
+nb_rows = append_batches(table, open_csv_batches(CSV_PATH, schema))
+print(f"✅ Iceberg : dataset initial ajouté ({nb_rows} lignes, snapshot créé).")
 
 snapshots_after_initial = list(table.snapshots())
 print("\nSnapshots après append #1 :")
@@ -165,14 +183,8 @@ for s in snapshots_after_initial:
     print(f"- snapshot_id={s.snapshot_id}  timestamp_ms={s.timestamp_ms}")
 
 # --- Append #2 : les 2 nouveaux clients (même ajout que Delta) ---
-arrow_new = pa.table(
-    {
-        "id": df_new["id"].tolist(),
-        "name": df_new["name"].tolist(),
-        "city": df_new["city"].tolist(),
-        "country": df_new["country"].tolist(),
-    }
-)
+# DataFrame pandas -> Arrow typé par le schéma Iceberg (sans .tolist())
+arrow_new = sort_for_write(table, dataframe_to_arrow(df_new, schema))
 table.append(arrow_new)
 print("\n✅ Iceberg : 2 nouveaux clients ajoutés (nouveau snapshot créé).")
 
@@ -183,11 +195,36 @@ for s in snapshots_after_new:
 
 # Lecture Iceberg
 print("\nLecture Iceberg (aperçu) :")
-for row in table.scan().to_arrow().to_pylist()[:10]:
+# limit=10 : seules les 10 premières lignes sont lues et converties
+for row in table.scan(limit=10).to_arrow().to_pylist():
     print(row)
 
+print_title("4 bis) Iceberg : scan filtré (row_filter + selected_fields) et pruning")
+result, stats = scan_with_pruning(
+    table,
+    row_filter="country == 'France'",
+    selected_fields=("id", "name", "city"),
+)
+print(result.to_pandas())
+print_pruning(stats)
+
+print_title("4 ter) Iceberg : décodage Parquet vs instantané Arrow mappé")
+# Par défaut : les fichiers Parquet du snapshot sont mappés puis décodés à chaque lecture
+# snapshot=True : la 1re lecture écrit une copie Arrow IPC dans _arrow_snapshots/ (si elle n'existe pas),
+# les suivantes mappent ce fichier, rien n'est décodé ni alloué
+for label, read in [
+    ("Parquet décodé", lambda: read_iceberg_local(table)),
+    ("Instantané Arrow (1re lecture)", lambda: read_iceberg_local(table, snapshot=True)),
+    ("Instantané Arrow (mappé)", lambda: read_iceberg_local(table, snapshot=True)),
+]:
+    rows, durations, allocated = measure(read)
+    print(f"{label:<32} {rows} lignes  {durations[0] * 1000:7.2f} ms  "
+          f"{allocated:>9,} octets alloués par Arrow pendant la lecture")
+france = read_iceberg_local(table, row_filter="country == 'France'", selected_fields=("id", "name", "city"))
+print(to_pandas(france))
+
 print_title("5) Comparaison rapide : Delta versions vs Iceberg snapshots")
-print(f"Delta - version actuelle : {dt.version()} (on attend 1)")
+print(f"Delta - version actuelle : {dt.version()} (on attend {initial_version + 1})")
 print(f"Iceberg - nb snapshots : {len(snapshots_after_new)} (on attend 2+ selon création/état)")
 
 print("\n✅ Exercice terminé.")
@@ -200,7 +237,7 @@ print(
     "└── default/\n"
     "    └── customers/\n"
     "        ├── data/\n"
-    "        │   └── 00000-*.parquet\n"
+    "        │   └── country=*/id_bucket=*/00000-*.parquet\n"
     "        └── metadata/\n"
     "            ├── v*.metadata.json\n"
     "            ├── snap-*.avro\n"
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from pyiceberg.schema import Schema
+from pyiceberg.table import Table
+
+from iceberg_layout import sort_for_write
+
+
+# -----------------------------
+# Conversion vers Arrow (schéma piloté par Iceberg)
+# -----------------------------
+def arrow_schema(schema: Schema) -> pa.Schema:
+    """Schéma Arrow correspondant au schéma Iceberg (types + field_id)."""
+    return schema.as_arrow()
+
+
+def dataframe_to_arrow(df: pd.DataFrame, schema: Schema) -> pa.Table:
+    """
+    Convertit un DataFrame pandas en table Arrow typée selon le schéma Iceberg.
+
+    Contrairement à `pa.table({"id": df["id"].tolist(), ...})`, aucune colonne
+    ne repasse par des listes Python : les colonnes numériques sont reprises
+    telles quelles (zéro copie) et les chaînes converties en une passe native.
+    """
+    target = arrow_schema(schema)
+    return pa.Table.from_pandas(
+        df[target.names], schema=target, preserve_index=False
+    ).replace_schema_metadata(None)
+
+
+def csv_convert_options(schema: Schema) -> pa_csv.ConvertOptions:
+    target = arrow_schema(schema)
+    return pa_csv.ConvertOptions(
+        column_types={field.name: field.type for field in target},
+        include_columns=target.names,
+    )
+
+
+def read_csv_arrow(csv_path: Path, schema: Schema) -> pa.Table:
+    """Lit un CSV directement en Arrow (parsing multithread), sans passer par pandas."""
+    return pa_csv.read_csv(csv_path, convert_options=csv_convert_options(schema))
+
+
+def open_csv_batches(
+    csv_path: Path, schema: Schema, block_size: int = 16 * 1024 * 1024
+) -> pa.RecordBatchReader:
+    """Ouvre un CSV en flux de record batches (un batch par bloc de `block_size` octets)."""
+    return pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=csv_convert_options(schema),
+    )
+
+
+# -----------------------------
+# Append en flux
+# -----------------------------
+def append_batches(
+    table: Table, batches: pa.RecordBatchReader, rows_per_append: int = 1_000_000
+) -> int:
+    """
+    Ajoute un flux de record batches à une table Iceberg, en un seul commit.
+
+    - Table non partitionnée : le flux est passé tel quel à `table.append`,
+      qui écrit les fichiers au fil de l'eau (mémoire bornée).
+    - Table partitionnée : PyIceberg n'accepte pas encore de flux, on regroupe
+      donc les batches par paquets de `rows_per_append` lignes, triés selon
+      l'ordre de tri de la table et tous ajoutés dans la même transaction.
+
+    Returns:
+        int: nombre de lignes ajoutées
+    """
+    if table.spec().is_unpartitioned():
+        rows = 0
+
+        def counted():
+            nonlocal rows
+            for batch in batches:
+                rows += batch.num_rows
+                yield batch
+
+        table.append(pa.RecordBatchReader.from_batches(batches.schema, counted()))
+        return rows
+
+    rows = 0
+    buffer: list[pa.RecordBatch] = []
+    buffered = 0
+    with table.transaction() as tx:
+        for batch in batches:
+            buffer.append(batch)
+            buffered += batch.num_rows
+            if buffered >= rows_per_append:
+                tx.append(sort_for_write(table, pa.Table.from_batches(buffer, schema=batches.schema)))
+                rows += buffered
+                buffer, buffered = [], 0
+        if buffer:
+            tx.append(sort_for_write(table, pa.Table.from_batches(buffer, schema=batches.schema)))
+            rows += buffered
+    return rows
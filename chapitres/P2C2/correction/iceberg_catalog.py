@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from pyiceberg.catalog import Catalog, load_catalog
+from sqlalchemy import event
+
+
+def load_local_catalog(base: Path) -> Catalog:
+    """
+    Catalogue SQL (SQLite) local utilisé par l'exercice P2C2 :
+    iceberg_catalog.db + warehouse iceberg_demo/ dans le dossier `base`.
+    """
+    warehouse_path = base / "iceberg_demo"
+    warehouse_path.mkdir(parents=True, exist_ok=True)
+    catalog_db = base / "iceberg_catalog.db"
+    return load_catalog(
+        "local",
+        **{
+            "type": "sql",
+            "uri": f"sqlite:///{catalog_db.resolve()}",
+            "warehouse": warehouse_path.resolve().as_uri(),
+        },
+    )
+
+
+def load_wal_catalog(base: Path, busy_timeout_ms: int = 30_000) -> Catalog:
+    """
+    Même catalogue, configuré pour plusieurs écrivains concurrents :
+
+    - journal_mode=WAL : les lectures ne bloquent plus pendant un commit ;
+    - busy_timeout : un écrivain attend le verrou au lieu d'échouer
+      immédiatement avec "database is locked".
+    """
+    catalog = load_local_catalog(base)
+
+    @event.listens_for(catalog.engine, "connect")
+    def _configure_sqlite(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+
+    # Les connexions ouvertes à l'initialisation n'ont pas ces réglages
+    catalog.engine.dispose()
+    return catalog
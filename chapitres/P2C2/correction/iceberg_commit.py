@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import argparse
+import queue
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+import pyarrow as pa
+from sqlalchemy.exc import OperationalError
+
+from pyiceberg.catalog import Catalog
+from pyiceberg.exceptions import CommitFailedException, NoSuchTableError
+from pyiceberg.schema import Schema
+from pyiceberg.table import Table, TableProperties
+from pyiceberg.types import LongType, NestedField, StringType
+
+from iceberg_catalog import load_wal_catalog
+
+
+# Conflit optimiste (metadata modifiée entre lecture et commit) ou verrou SQLite
+RETRYABLE_ERRORS = (CommitFailedException, OperationalError)
+# PyIceberg relance lui-même un commit en conflit (4 fois par défaut) sans le signaler à l'appelant :
+# les tables écrites via append_with_retry désactivent ces relances pour que chacune soit comptée
+LIBRARY_RETRY_DISABLED = {TableProperties.COMMIT_NUM_RETRIES: "0"}
+
+
+# -----------------------------
+# Commit avec retry
+# -----------------------------
+def append_with_retry(
+    table: Table,
+    data: pa.Table,
+    max_retries: int = 8,
+    base_backoff_s: float = 0.05,
+) -> int:
+    """
+    table.append avec retry sur conflit de commit : backoff exponentiel avec
+    jitter, puis rechargement de la table avant de rejouer l'append.
+
+    Le compte renvoyé n'est complet que si la table a été créée avec
+    LIBRARY_RETRY_DISABLED : sinon PyIceberg rejoue d'abord le commit en
+    interne, et ces tentatives n'apparaissent pas ici.
+
+    Returns:
+        int: nombre de retries nécessaires
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            table.append(data)
+            return attempt
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(base_backoff_s * (2 ** attempt) * random.uniform(0.5, 1.5))
+            table.refresh()
+    return max_retries
+
+
+# -----------------------------
+# Coordinateur de commits
+# -----------------------------
+class CommitCoordinator:
+    """
+    Regroupe les appends de plusieurs producteurs en un minimum de snapshots.
+
+    Les producteurs appellent `submit(data)` (thread-safe) et reçoivent un
+    Future. Un unique thread de commit vide la file : il concatène les tables
+    reçues pendant `max_wait_s` (ou jusqu'à `max_batch_rows` lignes) et les
+    ajoute en un seul snapshot, avec retry sur conflit. Le nombre de commits
+    ne dépend donc plus du nombre de producteurs.
+
+    Usage:
+        with CommitCoordinator(table) as coordinator:
+            future = coordinator.submit(arrow_table)
+            future.result()  # snapshot_id du commit qui contient ces lignes
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        table: Table,
+        max_batch_rows: int = 500_000,
+        max_wait_s: float = 0.2,
+        max_retries: int = 8,
+        base_backoff_s: float = 0.05,
+    ) -> None:
+        self.table = table
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_s = max_wait_s
+        self.max_retries = max_retries
+        self.base_backoff_s = base_backoff_s
+        self.stats = {"commits": 0, "rows": 0, "submits": 0, "retries": 0}
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="iceberg-committer", daemon=True)
+
+    def __enter__(self) -> CommitCoordinator:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(self, data: pa.Table) -> Future:
+        future: Future = Future()
+        self._queue.put((data, future))
+        return future
+
+    def close(self) -> None:
+        """Commite ce qui reste dans la file puis arrête le thread."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _collect(self) -> tuple[list, bool]:
+        """Attend un premier append, puis regroupe ceux qui arrivent pendant max_wait_s."""
+        item = self._queue.get()
+        if item is self._STOP:
+            return [], True
+        batch, rows = [item], item[0].num_rows
+        deadline = time.monotonic() + self.max_wait_s
+        while rows < self.max_batch_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+            rows += item[0].num_rows
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                data = pa.concat_tables([data for data, _ in batch], promote_options="default")
+                retries = append_with_retry(self.table, data, self.max_retries, self.base_backoff_s)
+                snapshot_id = self.table.current_snapshot().snapshot_id
+            except Exception as e:  # noqa: BLE001 - transmis aux producteurs
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.stats["commits"] += 1
+            self.stats["rows"] += data.num_rows
+            self.stats["submits"] += len(batch)
+            self.stats["retries"] += retries
+            for future in futures:
+                future.set_result(snapshot_id)
+
+
+# -----------------------------
+# Banc d'essai : N producteurs concurrents
+# -----------------------------
+def customers_schema() -> Schema:
+    return Schema(
+        NestedField(1, "id", LongType(), required=False),
+        NestedField(2, "name", StringType(), required=False),
+        NestedField(3, "city", StringType(), required=False),
+        NestedField(4, "country", StringType(), required=False),
+    )
+
+
+def fake_customers(start_id: int, rows: int, schema: Schema) -> pa.Table:
+    ids = pa.array(range(start_id, start_id + rows), type=pa.int64())
+    return pa.table(
+        {
+            "id": ids,
+            "name": pa.array([f"Client {i}" for i in range(start_id, start_id + rows)], type=pa.large_string()),
+            "city": pa.array(["Paris"] * rows, type=pa.large_string()),
+            "country": pa.array(["France"] * rows, type=pa.large_string()),
+        },
+        schema=schema.as_arrow(),
+    )
+
+
+def recreate_table(catalog: Catalog, identifier: str, schema: Schema) -> Table:
+    """
+    Supprime la table et ses fichiers, puis la recrée sans les relances
+    internes de PyIceberg (chaque conflit passe par append_with_retry).
+    """
+    try:
+        location = catalog.load_table(identifier).location()
+        catalog.purge_table(identifier)
+        # purge_table ne supprime que les fichiers référencés : les fichiers
+        # écrits par des commits en échec restent dans le dossier de la table
+        if location.startswith("file://"):
+            shutil.rmtree(unquote(urlparse(location).path), ignore_errors=True)
+    except NoSuchTableError:
+        pass
+    try:
+        catalog.create_namespace(identifier.split(".")[0])
+    except Exception:
+        pass
+    return catalog.create_table(identifier, schema=schema, properties=LIBRARY_RETRY_DISABLED)
+
+
+def run_direct(catalog: Catalog, identifier: str, writers: int, appends: int, rows: int) -> dict:
+    """Chaque producteur commite lui-même (un snapshot par append)."""
+    schema = customers_schema()
+    retries = []
+
+    def producer(worker: int) -> None:
+        table = catalog.load_table(identifier)
+        for i in range(appends):
+            data = fake_customers((worker * appends + i) * rows, rows, schema)
+            retries.append(append_with_retry(table, data, max_retries=20))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(producer, range(writers)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed_s": elapsed, "commits": writers * appends, "retries": sum(retries)}
+
+
+def run_coordinated(catalog: Catalog, identifier: str, writers: int, appends: int, rows: int) -> dict:
+    """Les producteurs soumettent au coordinateur, qui regroupe les commits."""
+    schema = customers_schema()
+    table = catalog.load_table(identifier)
+
+    start = time.perf_counter()
+    with CommitCoordinator(table) as coordinator:
+
+        def producer(worker: int) -> None:
+            futures = [
+                coordinator.submit(fake_customers((worker * appends + i) * rows, rows, schema))
+                for i in range(appends)
+            ]
+            for future in futures:
+                future.result()
+
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            list(pool.map(producer, range(writers)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed_s": elapsed, "commits": coordinator.stats["commits"], "retries": coordinator.stats["retries"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Appends Iceberg concurrents sur le catalogue SQLite : direct vs coordonné"
+    )
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Nombres de producteurs à tester (défaut: 1 2 4 8)")
+    parser.add_argument("--appends", type=int, default=10, help="Appends par producteur (défaut: 10)")
+    parser.add_argument("--rows", type=int, default=1000, help="Lignes par append (défaut: 1000)")
+    parser.add_argument("--table", default="default.customers_ingest",
+                        help="Table de test, recréée à chaque mesure (défaut: default.customers_ingest)")
+
+    args = parser.parse_args()
+
+    catalog = load_wal_catalog(Path(__file__).parent)
+    schema = customers_schema()
+
+    print(f"{'mode':<12} {'writers':>7} {'commits':>8} {'retries':>8} {'lignes/s':>10}")
+    for writers in args.writers:
+        total_rows = writers * args.appends * args.rows
+        for mode, runner in [("direct", run_direct), ("coordonné", run_coordinated)]:
+            recreate_table(catalog, args.table, schema)
+            result = runner(catalog, args.table, writers, args.appends, args.rows)
+            count = catalog.load_table(args.table).scan().count()
+            assert count == total_rows, f"{count} lignes au lieu de {total_rows}"
+            print(
+                f"{mode:<12} {writers:>7} {result['commits']:>8} {result['retries']:>8} "
+                f"{total_rows / result['elapsed_s']:>10.0f}"
+            )
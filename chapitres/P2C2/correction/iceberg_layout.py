@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import pyarrow as pa
+
+from pyiceberg.expressions import AlwaysTrue, BooleanExpression
+from pyiceberg.expressions.visitors import manifest_evaluator
+from pyiceberg.io.pyarrow import ArrowScan
+from pyiceberg.manifest import ManifestContent
+from pyiceberg.partitioning import PartitionField, PartitionSpec
+from pyiceberg.schema import Schema
+from pyiceberg.table import Table
+from pyiceberg.table.sorting import NullOrder, SortDirection, SortField, SortOrder
+from pyiceberg.transforms import BucketTransform, IdentityTransform
+
+
+ID_BUCKETS = 16
+
+
+# -----------------------------
+# Partitionnement + ordre de tri de default.customers
+# -----------------------------
+def customers_partition_spec(schema: Schema, num_buckets: int = ID_BUCKETS) -> PartitionSpec:
+    """Partitions : country (identité) + bucket(id) pour répartir les gros pays."""
+    return PartitionSpec(
+        PartitionField(
+            source_id=schema.find_field("country").field_id,
+            field_id=1000,
+            transform=IdentityTransform(),
+            name="country",
+        ),
+        PartitionField(
+            source_id=schema.find_field("id").field_id,
+            field_id=1001,
+            transform=BucketTransform(num_buckets),
+            name="id_bucket",
+        ),
+    )
+
+
+def customers_sort_order(schema: Schema) -> SortOrder:
+    """Tri par id dans chaque fichier : bornes min/max serrées pour le pruning."""
+    return SortOrder(
+        SortField(
+            source_id=schema.find_field("id").field_id,
+            transform=IdentityTransform(),
+            direction=SortDirection.ASC,
+            null_order=NullOrder.NULLS_LAST,
+        )
+    )
+
+
+def ensure_customers_layout(table: Table, num_buckets: int = ID_BUCKETS) -> Table:
+    """
+    Ajoute le partitionnement et l'ordre de tri à une table créée sans
+    (ex: catalogue d'une exécution précédente). Les fichiers déjà écrits gardent
+    leur ancien partitionnement ; seules les nouvelles écritures en profitent.
+    """
+    if table.spec().is_unpartitioned():
+        with table.update_spec() as update:
+            update.add_identity("country")
+            update.add_field("id", BucketTransform(num_buckets), "id_bucket")
+    if table.sort_order().is_unsorted:
+        with table.update_sort_order() as update:
+            update.asc("id", IdentityTransform())
+    return table
+
+
+def sort_for_write(table: Table, data: pa.Table) -> pa.Table:
+    """
+    Trie les données selon l'ordre déclaré de la table avant écriture
+    (PyIceberg enregistre l'ordre de tri mais ne trie pas lui-même).
+    """
+    sort_order = table.sort_order()
+    if sort_order.is_unsorted:
+        return data
+    schema = table.schema()
+    keys = [
+        (
+            schema.find_column_name(field.source_id),
+            "ascending" if field.direction == SortDirection.ASC else "descending",
+        )
+        for field in sort_order.fields
+        if isinstance(field.transform, IdentityTransform)
+    ]
+    return data.sort_by(keys) if keys else data
+
+
+# -----------------------------
+# Scan avec pruning mesuré
+# -----------------------------
+def scan_with_pruning(
+    table: Table,
+    row_filter: str | BooleanExpression = AlwaysTrue(),
+    selected_fields: tuple[str, ...] = ("*",),
+    limit: int | None = None,
+) -> tuple[pa.Table, dict]:
+    """
+    Exécute un scan filtré/projeté et mesure ce qui a été évité.
+
+    - Manifests : évalués sur leurs résumés de partition (comme le fait le
+      planificateur PyIceberg), sans ouvrir ceux qui sont écartés.
+    - Fichiers : total issu de la manifest list, comparé aux fichiers
+      effectivement planifiés après pruning par partition et statistiques.
+    """
+    scan = table.scan(row_filter=row_filter, selected_fields=selected_fields, limit=limit)
+    snapshot = scan.snapshot()
+    if snapshot is None:
+        return scan.to_arrow(), {
+            "manifests_total": 0, "manifests_scanned": 0, "manifests_pruned": 0,
+            "files_total": 0, "files_scanned": 0, "files_pruned": 0, "bytes_scanned": 0,
+        }
+
+    manifests = [
+        m for m in snapshot.manifests(table.io) if m.content == ManifestContent.DATA
+    ]
+    specs = table.specs()
+    schema = table.schema()
+    scanned_manifests = [
+        m for m in manifests
+        if manifest_evaluator(
+            specs[m.partition_spec_id], schema, scan.partition_filters[m.partition_spec_id]
+        )(m)
+    ]
+    files_total = sum((m.added_files_count or 0) + (m.existing_files_count or 0) for m in manifests)
+
+    # Lecture à partir des tâches déjà planifiées (pas de second planning)
+    tasks = list(scan.plan_files())
+    result = ArrowScan(
+        table.metadata, table.io, scan.projection(), scan.row_filter, scan.case_sensitive, scan.limit
+    ).to_table(tasks)
+    stats = {
+        "manifests_total": len(manifests),
+        "manifests_scanned": len(scanned_manifests),
+        "manifests_pruned": len(manifests) - len(scanned_manifests),
+        "files_total": files_total,
+        "files_scanned": len(tasks),
+        "files_pruned": files_total - len(tasks),
+        "bytes_scanned": sum(task.file.file_size_in_bytes for task in tasks),
+    }
+    return result, stats
+
+
+def print_pruning(stats: dict) -> None:
+    print(
+        f"Manifests : {stats['manifests_scanned']}/{stats['manifests_total']} lus "
+        f"({stats['manifests_pruned']} écartés)"
+    )
+    print(
+        f"Fichiers  : {stats['files_scanned']}/{stats['files_total']} lus "
+        f"({stats['files_pruned']} écartés, {stats['bytes_scanned']} octets lus)"
+    )
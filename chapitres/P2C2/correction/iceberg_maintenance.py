@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import argparse
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from pyarrow import fs as pa_fs
+
+from pyiceberg.expressions import AlwaysTrue
+from pyiceberg.io.pyarrow import (
+    ArrowScan,
+    compute_statistics_plan,
+    data_file_statistics_from_parquet_metadata,
+    parquet_path_to_id_mapping,
+)
+from pyiceberg.manifest import DataFile, DataFileContent, FileFormat
+from pyiceberg.table import Table, TableProperties
+from pyiceberg.table.snapshots import Snapshot
+from pyiceberg.typedef import Record
+
+from iceberg_catalog import load_local_catalog
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def print_title(title: str) -> None:
+    print("\n" + "=" * 80)
+    print(title)
+    print("=" * 80)
+
+
+def format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} o"
+    value = float(size)
+    for unit in ["Ko", "Mo", "Go"]:
+        value /= 1024
+        if value < 1024:
+            break
+    return f"{value:.1f} {unit}"
+
+
+def print_report(report: dict) -> None:
+    for kind, label in [
+        ("metadata", "Métadonnées (metadata.json)"),
+        ("manifest_lists", "Manifest lists"),
+        ("manifests", "Manifests"),
+        ("data", "Fichiers de données"),
+    ]:
+        if kind in report:
+            count, size = report[kind]
+            print(f"   - {label:<28}: {count} fichier(s), {format_bytes(size)}")
+
+
+def snapshot_files(table: Table, snapshot: Snapshot, entries_cache: dict) -> dict[str, dict[str, int]]:
+    """
+    Fichiers atteignables depuis un snapshot : manifest list, manifests et
+    fichiers de données vivants, avec leur taille.
+
+    `entries_cache` évite de relire les manifests partagés entre snapshots.
+    """
+    io = table.io
+    manifests = snapshot.manifests(io)
+    files = {
+        "manifest_lists": {snapshot.manifest_list: len(io.new_input(snapshot.manifest_list))},
+        "manifests": {m.manifest_path: m.manifest_length for m in manifests},
+        "data": {},
+    }
+    for manifest in manifests:
+        if manifest.manifest_path not in entries_cache:
+            entries_cache[manifest.manifest_path] = {
+                entry.data_file.file_path: entry.data_file.file_size_in_bytes
+                for entry in manifest.fetch_manifest_entry(io, discard_deleted=True)
+            }
+        files["data"].update(entries_cache[manifest.manifest_path])
+    return files
+
+
+def reachable_files(table: Table, snapshots: list[Snapshot], entries_cache: dict) -> dict[str, dict[str, int]]:
+    reachable: dict[str, dict[str, int]] = defaultdict(dict)
+    for snapshot in snapshots:
+        for kind, files in snapshot_files(table, snapshot, entries_cache).items():
+            reachable[kind].update(files)
+    return reachable
+
+
+def delete_files(table: Table, paths: list[str]) -> None:
+    for path in paths:
+        try:
+            table.io.delete(path)
+        except FileNotFoundError:
+            pass
+
+
+# -----------------------------
+# 1) Expiration des snapshots
+# -----------------------------
+def expire_snapshots(
+    table: Table,
+    older_than: datetime | None = None,
+    retain_last: int | None = None,
+    dry_run: bool = True,
+) -> dict:
+    """
+    Expire les snapshots plus anciens que `older_than` et/ou au-delà des
+    `retain_last` plus récents, puis supprime les fichiers qui ne sont plus
+    atteignables depuis aucun snapshot conservé.
+
+    Les têtes de branches/tags (dont le snapshot courant) ne sont jamais expirées.
+    """
+    snapshots = sorted(table.snapshots(), key=lambda s: s.timestamp_ms, reverse=True)
+    protected = {ref.snapshot_id for ref in table.metadata.refs.values()}
+
+    to_expire = set()
+    for position, snapshot in enumerate(snapshots):
+        if snapshot.snapshot_id in protected:
+            continue
+        too_old = older_than is not None and snapshot.timestamp_ms < older_than.timestamp() * 1000
+        beyond_count = retain_last is not None and position >= retain_last
+        if too_old or beyond_count:
+            to_expire.add(snapshot.snapshot_id)
+
+    kept = [s for s in snapshots if s.snapshot_id not in to_expire]
+    entries_cache: dict = {}
+    before = reachable_files(table, snapshots, entries_cache)
+    after = reachable_files(table, kept, entries_cache)
+
+    removable = {
+        kind: {path: size for path, size in files.items() if path not in after[kind]}
+        for kind, files in before.items()
+    }
+    report = {kind: (len(files), sum(files.values())) for kind, files in removable.items()}
+    report["snapshots"] = len(to_expire)
+
+    print(f"Snapshots expirés : {len(to_expire)} / {len(snapshots)}")
+    print_report(report)
+
+    if dry_run or not to_expire:
+        if dry_run:
+            print("ℹ️  Dry-run : aucun snapshot expiré.")
+        return report
+
+    table.maintenance.expire_snapshots().by_ids(sorted(to_expire)).commit()
+    for files in removable.values():
+        delete_files(table, list(files))
+    print("✅ Snapshots expirés et fichiers orphelins supprimés.")
+    return report
+
+
+def expire_metadata_files(table: Table, keep: int = 10, dry_run: bool = True) -> dict:
+    """
+    Supprime les anciens metadata.json hors des `keep` dernières entrées du
+    metadata log, et active leur nettoyage automatique pour les commits suivants.
+    """
+    filesystem, metadata_dir = pa_fs.FileSystem.from_uri(f"{table.location()}/metadata")
+    infos = filesystem.get_file_info(pa_fs.FileSelector(metadata_dir, allow_not_found=True))
+    live = {Path(entry.metadata_file).name for entry in table.metadata.metadata_log[-keep:]}
+    live.add(Path(table.metadata_location).name)
+    expired = [
+        info for info in infos
+        if info.path.endswith(".metadata.json") and Path(info.path).name not in live
+    ]
+    report = {"metadata": (len(expired), sum(info.size or 0 for info in expired))}
+    print_report(report)
+
+    if dry_run:
+        print("ℹ️  Dry-run : metadata.json conservés.")
+        return report
+
+    with table.transaction() as tx:
+        tx.set_properties(
+            {
+                TableProperties.METADATA_DELETE_AFTER_COMMIT_ENABLED: "true",
+                TableProperties.METADATA_PREVIOUS_VERSIONS_MAX: str(keep),
+            }
+        )
+    # Le commit ci-dessus a déjà pu en supprimer une partie
+    for info in expired:
+        try:
+            filesystem.delete_file(info.path)
+        except FileNotFoundError:
+            pass
+    print(f"✅ {len(expired)} metadata.json supprimé(s).")
+    return report
+
+
+# -----------------------------
+# 2) Compaction des petits fichiers de données
+# -----------------------------
+def compacted_data_file(table: Table, path: str, spec_id: int, partition: Record) -> DataFile:
+    """
+    DataFile Iceberg d'un fichier compacté. La partition est celle des fichiers
+    d'origine : elle ne peut pas être déduite des statistiques Parquet pour une
+    transformation non linéaire comme bucket(id).
+    """
+    input_file = table.io.new_input(path)
+    with input_file.open() as stream:
+        parquet_metadata = pq.read_metadata(stream)
+    schema = table.schema()
+    statistics = data_file_statistics_from_parquet_metadata(
+        parquet_metadata=parquet_metadata,
+        stats_columns=compute_statistics_plan(schema, table.properties),
+        parquet_column_mapping=parquet_path_to_id_mapping(schema),
+    )
+    return DataFile.from_args(
+        content=DataFileContent.DATA,
+        file_path=path,
+        file_format=FileFormat.PARQUET,
+        partition=partition,
+        file_size_in_bytes=len(input_file),
+        sort_order_id=None,
+        spec_id=spec_id,
+        equality_ids=None,
+        key_metadata=None,
+        **statistics.to_serialized_dict(),
+    )
+
+
+def compact_data_files(
+    table: Table,
+    target_file_size: int = 128 * 1024 * 1024,
+    small_file_ratio: float = 0.75,
+    min_input_files: int = 2,
+    dry_run: bool = True,
+) -> dict:
+    """
+    Réécrit, partition par partition, les fichiers plus petits que
+    `small_file_ratio * target_file_size` en fichiers proches de la taille cible.
+
+    Les petits fichiers sont lus un par un et écrits en flux (mémoire bornée),
+    puis remplacés en un seul commit (suppression des anciens + ajout des nouveaux).
+    """
+    threshold = int(target_file_size * small_file_ratio)
+    groups: dict[tuple, list] = defaultdict(list)
+    for task in table.scan().plan_files():
+        if task.delete_files:
+            continue  # fichiers avec deletes positionnels : laissés tels quels
+        data_file = task.file
+        if data_file.file_size_in_bytes < threshold:
+            groups[(data_file.spec_id, data_file.partition)].append(task)
+    groups = {key: tasks for key, tasks in groups.items() if len(tasks) >= min_input_files}
+
+    input_files = sum(len(tasks) for tasks in groups.values())
+    input_bytes = sum(t.file.file_size_in_bytes for tasks in groups.values() for t in tasks)
+    print(f"Partitions à compacter : {len(groups)}")
+    print(f"Petits fichiers en entrée : {input_files} ({format_bytes(input_bytes)})")
+
+    if dry_run or not groups:
+        if dry_run:
+            print("ℹ️  Dry-run : aucun fichier réécrit.")
+        return {"data": (input_files, input_bytes), "files_written": 0}
+
+    schema = table.schema()
+    arrow_schema = schema.as_arrow()
+    specs = table.specs()
+    new_files: list[DataFile] = []
+    for (spec_id, partition), tasks in groups.items():
+        partition_path = specs[spec_id].partition_to_path(partition, schema)
+        # Table non partitionnée (spec 0) : fichiers directement sous data/
+        data_dir = f"{table.location()}/data/{partition_path}" if partition_path else f"{table.location()}/data"
+        writer, written, output = None, 0, None
+        for task in tasks:
+            data = ArrowScan(table.metadata, table.io, schema, AlwaysTrue()).to_table([task])
+            if writer is None:
+                path = f"{data_dir}/compacted-{uuid.uuid4()}.parquet"
+                output = table.io.new_output(path).create(overwrite=True)
+                writer = pq.ParquetWriter(output, arrow_schema)
+                written = 0
+            writer.write_table(data.cast(arrow_schema))
+            written += task.file.file_size_in_bytes
+            if written >= target_file_size:
+                writer.close()
+                output.close()
+                new_files.append(compacted_data_file(table, path, spec_id, partition))
+                writer = None
+        if writer is not None:
+            writer.close()
+            output.close()
+            new_files.append(compacted_data_file(table, path, spec_id, partition))
+
+    with table.transaction() as tx:
+        with tx.update_snapshot().overwrite() as rewrite:
+            for tasks in groups.values():
+                for task in tasks:
+                    rewrite.delete_data_file(task.file)
+            for data_file in new_files:
+                rewrite.append_data_file(data_file)
+
+    output_bytes = sum(f.file_size_in_bytes for f in new_files)
+    print(f"✅ {input_files} fichier(s) remplacé(s) par {len(new_files)} ({format_bytes(output_bytes)}).")
+    print("   Les anciens fichiers restent lisibles en time travel jusqu'à l'expiration des snapshots.")
+    return {"data": (input_files, input_bytes), "files_written": len(new_files)}
+
+
+# -----------------------------
+# 3) Réécriture des manifests
+# -----------------------------
+def rewrite_manifests(table: Table, dry_run: bool = True) -> dict:
+    """
+    Fusionne les manifests du snapshot courant (un par append) en un minimum
+    de manifests, via un merge-append sans nouveau fichier.
+    """
+    snapshot = table.current_snapshot()
+    manifests = snapshot.manifests(table.io) if snapshot else []
+    report = {"manifests": (len(manifests), sum(m.manifest_length for m in manifests))}
+    print(f"Manifests dans le snapshot courant : {len(manifests)}")
+
+    if dry_run or len(manifests) < 2:
+        if dry_run:
+            print("ℹ️  Dry-run : manifests inchangés.")
+        return report
+
+    previous = {
+        key: table.properties.get(key)
+        for key in (TableProperties.MANIFEST_MERGE_ENABLED, TableProperties.MANIFEST_MIN_MERGE_COUNT)
+    }
+    with table.transaction() as tx:
+        tx.set_properties(
+            {
+                TableProperties.MANIFEST_MERGE_ENABLED: "true",
+                TableProperties.MANIFEST_MIN_MERGE_COUNT: "2",
+            }
+        )
+        tx.update_snapshot().merge_append().commit()
+        to_restore = {k: v for k, v in previous.items() if v is not None}
+        to_remove = [k for k, v in previous.items() if v is None]
+        if to_restore:
+            tx.set_properties(to_restore)
+        if to_remove:
+            tx.remove_properties(*to_remove)
+
+    merged = table.current_snapshot().manifests(table.io)
+    print(f"✅ {len(manifests)} manifest(s) fusionné(s) en {len(merged)}.")
+    print("   Les anciens manifests seront supprimés à l'expiration des snapshots.")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Maintenance des tables Iceberg du catalogue SQL local (P2C2)"
+    )
+    parser.add_argument(
+        "action",
+        choices=["expire_snapshots", "compact", "rewrite_manifests", "all"],
+        help="Action à exécuter: expire_snapshots, compact, rewrite_manifests, ou all",
+    )
+    parser.add_argument(
+        "--table",
+        default="default.customers",
+        help="Identifiant de la table Iceberg (défaut: default.customers)",
+    )
+    parser.add_argument(
+        "--older-than-hours",
+        type=float,
+        default=None,
+        help="Expirer les snapshots plus anciens que N heures",
+    )
+    parser.add_argument(
+        "--retain-last",
+        type=int,
+        default=None,
+        help="Conserver uniquement les N snapshots les plus récents",
+    )
+    parser.add_argument(
+        "--keep-metadata",
+        type=int,
+        default=10,
+        help="Nombre de metadata.json précédents conservés (défaut: 10)",
+    )
+    parser.add_argument(
+        "--target-file-size",
+        type=int,
+        default=128 * 1024 * 1024,
+        help="Taille cible des fichiers compactés en octets (défaut: 128 Mo)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Afficher ce qui serait supprimé ou réécrit sans rien modifier",
+    )
+
+    args = parser.parse_args()
+
+    catalog = load_local_catalog(Path(__file__).parent)
+    table = catalog.load_table(args.table)
+    print(f"Table: {args.table} ({len(table.snapshots())} snapshots)")
+
+    if args.action in ("compact", "all"):
+        print_title("1) Compaction des petits fichiers de données")
+        compact_data_files(table, target_file_size=args.target_file_size, dry_run=args.dry_run)
+
+    if args.action in ("rewrite_manifests", "all"):
+        print_title("2) Réécriture des manifests")
+        rewrite_manifests(table, dry_run=args.dry_run)
+
+    if args.action in ("expire_snapshots", "all"):
+        print_title("3) Expiration des snapshots")
+        if args.older_than_hours is None and args.retain_last is None:
+            print("ℹ️  Précisez --older-than-hours et/ou --retain-last.")
+        else:
+            older_than = None
+            if args.older_than_hours is not None:
+                older_than = datetime.now(timezone.utc) - timedelta(hours=args.older_than_hours)
+            expire_snapshots(table, older_than=older_than, retain_last=args.retain_last, dry_run=args.dry_run)
+        expire_metadata_files(table, keep=args.keep_metadata, dry_run=args.dry_run)
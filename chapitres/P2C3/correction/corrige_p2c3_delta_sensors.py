@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 from pathlib import Path
-import shutil
 
 import pandas as pd
-from datetime import datetime, timezone
-from deltalake import DeltaTable, write_deltalake
+import pyarrow.compute as pc
+from datetime import date, datetime, timezone
+from deltalake import DeltaTable
+
+from data_quality import SENSOR_RULES, evaluate_table
+from delta_write import partition_predicate, write_daily_partition
+from local_reads import read_delta_local, to_pandas
 
 
 def print_title(title: str) -> None:
@@ -47,24 +51,31 @@ CSV_PATH = BASE / "sensors.csv"
 DELTA_PATH = BASE / "data" / "sensors_delta"
 DELTA_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-# Rejouable : on repart de zéro
-if DELTA_PATH.exists():
-    shutil.rmtree(DELTA_PATH)
+# Partition du chargement (comme `ingest_date` dans le notebook P2C5)
+INGEST_DATE = date.today()
+# Les corrections ne visent que la partition du jour (les jours précédents restent intacts)
+DAY = partition_predicate({"ingest_date": INGEST_DATE})
 
 
 # -----------------------------
 # 1) Créer la table Delta
 # -----------------------------
-print_title("1) Créer la table Delta depuis sensors.csv")
+print_title("1) Créer la table Delta depuis sensors.csv (partitionnée par ingest_date)")
 
 df = pd.read_csv(CSV_PATH)
 df = df[["sensor_id", "humidity", "parcel"]]  # ordre canonique
 
-write_deltalake(str(DELTA_PATH), df, mode="overwrite")
+# Overwrite par prédicat : seule la partition ingest_date du jour est remplacée.
+# Rejouable sans supprimer la table : une relance repart du CSV pour le jour courant.
+# Une table non partitionnée (ancienne version du script) est recréée une fois en entier.
+write_daily_partition(DELTA_PATH, df, ingest_date=INGEST_DATE)
 table = DeltaTable(str(DELTA_PATH))
+initial_version = table.version()
 
-print("✅ Table Delta créée (version 0)")
-print(table.to_pandas().sort_values("sensor_id").reset_index(drop=True))
+print(f"✅ Partition {INGEST_DATE} écrite (version {initial_version}, 0 au premier lancement)")
+print("Colonnes de partition:", table.metadata().partition_columns)
+today = pc.field("ingest_date") == pc.scalar(INGEST_DATE)
+print(to_pandas(read_delta_local(table, filter=today)).sort_values("sensor_id").reset_index(drop=True))
 print("Version actuelle:", table.version())
 
 
@@ -79,7 +90,7 @@ new_data = pd.DataFrame({
     "parcel": ["West-1", "North-2"],
 })[["sensor_id", "humidity", "parcel"]]
 
-write_deltalake(str(DELTA_PATH), new_data, mode="append")
+write_daily_partition(DELTA_PATH, new_data, ingest_date=INGEST_DATE, mode="append")
 table = DeltaTable(str(DELTA_PATH))
 
 print("✅ Nouvelles mesures ajoutées (append) → nouvelle version")
@@ -92,7 +103,7 @@ print("Version actuelle:", table.version())
 print_title("3) Update : corriger sensor_id=101 (humidity -> 145.2)")
 
 table.update(
-    predicate="sensor_id = 101",
+    predicate=f"{DAY} AND sensor_id = 101",
     updates={"humidity": "145.2"}
 )
 table = DeltaTable(str(DELTA_PATH))
@@ -106,7 +117,7 @@ print("Version actuelle:", table.version())
 # -----------------------------
 print_title("4) Delete : supprimer la parcelle obsolète 'Old-9'")
 
-table.delete("parcel = 'Old-9'")
+table.delete(f"{DAY} AND parcel = 'Old-9'")
 table = DeltaTable(str(DELTA_PATH))
 
 print("✅ Parcelle obsolète supprimée → nouvelle version")
@@ -122,12 +133,13 @@ updates_df = pd.DataFrame({
     "sensor_id": [102, 106],
     "humidity": [47.0, 41.9],
     "parcel": ["East-2", "West-3"],
-})[["sensor_id", "humidity", "parcel"]]
+    "ingest_date": [INGEST_DATE, INGEST_DATE],
+})[["sensor_id", "humidity", "parcel", "ingest_date"]]
 
 (
     table.merge(
         source=updates_df,
-        predicate="source.sensor_id = target.sensor_id",
+        predicate="source.sensor_id = target.sensor_id AND source.ingest_date = target.ingest_date",
         source_alias="source",
         target_alias="target",
     )
@@ -148,21 +160,29 @@ print("Version actuelle:", table.version())
 
 
 # -----------------------------
-# 6) Historique + time travel (lecture version 0)
+# 6) Historique + time travel (lecture de la version de l'étape 1)
 # -----------------------------
-print_title("6) Historique (versions d’écriture) + time travel (lecture version 0)")
+print_title("6) Historique (versions d’écriture) + time travel (lecture de la version de l'étape 1)")
 
 hist_df = pretty_history(table)
 print(hist_df.to_string(index=False))
 
-print_title("Lecture de la version 0 (table d'origine)")
-table_v0 = DeltaTable(str(DELTA_PATH), version=0)
-print(table_v0.to_pandas().sort_values("sensor_id").reset_index(drop=True))
+print_title(f"Lecture de la version {initial_version} (partition du jour d'origine)")
+table_v0 = DeltaTable(str(DELTA_PATH), version=initial_version)
+print(to_pandas(read_delta_local(table_v0, filter=today)).sort_values("sensor_id").reset_index(drop=True))
 
-print_title("Table finale (dernière version)")
-final_df = table.to_pandas().sort_values("sensor_id").reset_index(drop=True)
+print_title("Table finale (dernière version, partition du jour)")
+# Lecture locale : Parquet mappé en mémoire, résultat gardé en Arrow (pandas sans copie)
+final_table = read_delta_local(table, filter=today)
+final_df = to_pandas(final_table).sort_values("sensor_id").reset_index(drop=True)
 print(final_df)
 
+# Contrôle qualité de la table finale (signale sans filtrer : humidity 145.2 > 100)
+quality_report, quality_failures = evaluate_table(final_table.drop_columns(["ingest_date"]), SENSOR_RULES)
+print("\n" + quality_report.summary())
+if quality_failures is not None:
+    print(quality_failures.drop_columns(["_batch"]).to_pandas().to_string(index=False))
+
 
 # -----------------------------
 # Contrôle : résultat attendu
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from deltalake import DeltaTable, write_deltalake
+
+from data_quality import SENSOR_RULES, QualityReport, precompute_masks, validate_batches, write_quarantine
+from delta_write import partition_predicate, write_daily_partition
+
+
+BASE = Path(__file__).parent
+SENSORS_FULL_CSV = BASE.parent.parent / "P2C5" / "src" / "sensors_full.csv"
+INGEST_PATH = BASE / "data" / "sensors_ingest"
+QUARANTINE_PATH = BASE / "data" / "sensors_quarantine"
+
+# Schéma imposé, comme le StructType du notebook P2C5
+SENSORS_SCHEMA = pa.schema([
+    ("sensor_id", pa.int64()),
+    ("humidity", pa.float64()),
+    ("parcel", pa.string()),
+])
+
+
+# -----------------------------
+# Lecture CSV parallèle en flux
+# -----------------------------
+def csv_header(csv_path: Path) -> tuple[list[str], int]:
+    """(noms de colonnes, taille de la ligne d'en-tête en octets)."""
+    with open(csv_path, "rb") as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8-sig")])), len(line)
+
+
+def chunk_ranges(csv_path: Path, chunk_bytes: int) -> Iterator[tuple[int, int]]:
+    """
+    Découpe le fichier (après l'en-tête) en plages d'environ `chunk_bytes`
+    octets, chacune terminée par un saut de ligne. Suppose qu'aucun champ
+    ne contient de saut de ligne entre guillemets (vrai pour les CSV capteurs).
+    """
+    size = csv_path.stat().st_size
+    _, start = csv_header(csv_path)
+    with open(csv_path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+def read_chunk(
+    csv_path: Path, start: int, end: int, column_names: list[str], schema: pa.Schema
+) -> pa.Table:
+    """Parse une plage d'octets du CSV avec le schéma imposé (pas d'inférence de types)."""
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pa_csv.read_csv(
+        pa.BufferReader(data),
+        read_options=pa_csv.ReadOptions(column_names=column_names, use_threads=False),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={field.name: field.type for field in schema},
+            include_columns=schema.names,
+        ),
+    )
+
+
+def parallel_csv_batches(
+    csv_path: Path,
+    schema: pa.Schema = SENSORS_SCHEMA,
+    chunk_bytes: int = 64 * 1024 * 1024,
+    workers: int | None = None,
+    transform: Callable[[pa.RecordBatch], pa.RecordBatch] | None = None,
+) -> pa.RecordBatchReader:
+    """
+    Flux de record batches lu par `workers` threads (un bloc de `chunk_bytes`
+    chacun, le parsing Arrow libère le GIL). Les blocs sont rendus dans l'ordre
+    du fichier et au plus `workers` sont en mémoire à la fois.
+
+    `transform` est appliquée à chaque batch dans le thread qui l'a parsé
+    (ex: les règles qualité sans état).
+    """
+    workers = workers or os.cpu_count() or 1
+    column_names, _ = csv_header(csv_path)
+    transform = transform or (lambda batch: batch)
+
+    def parse(start: int, end: int) -> list[pa.RecordBatch]:
+        return [transform(batch) for batch in read_chunk(csv_path, start, end, column_names, schema).to_batches()]
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for start, end in chunk_ranges(csv_path, chunk_bytes):
+                pending.append(pool.submit(parse, start, end))
+                if len(pending) >= workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    # Schéma de sortie : celui d'un batch vide passé par `transform`
+    output_schema = transform(pa.RecordBatch.from_pylist([], schema)).schema
+    return pa.RecordBatchReader.from_batches(output_schema, batches())
+
+
+def with_ingest_date(reader: pa.RecordBatchReader, ingest_date: date) -> pa.RecordBatchReader:
+    """Ajoute la colonne de partition ingest_date à chaque batch, au fil de l'eau."""
+    schema = reader.schema.append(pa.field("ingest_date", pa.date32()))
+    value = pa.scalar(ingest_date, pa.date32())
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        for batch in reader:
+            yield pa.RecordBatch.from_arrays(
+                [*batch.columns, pa.repeat(value, batch.num_rows)], schema=schema
+            )
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+# -----------------------------
+# Ingestion Delta
+# -----------------------------
+def ingest_csv(
+    csv_path: Path,
+    table_path: Path,
+    ingest_date: date,
+    mode: str = "overwrite",
+    schema: pa.Schema = SENSORS_SCHEMA,
+    chunk_bytes: int = 64 * 1024 * 1024,
+    workers: int | None = None,
+    target_file_size: int | None = None,
+    rules: list | None = None,
+    quarantine_path: Path = QUARANTINE_PATH,
+) -> tuple[int, QualityReport | None]:
+    """
+    Charge un CSV dans la partition ingest_date d'une table Delta sans jamais
+    le matérialiser entièrement : les batches lus en parallèle sont passés en
+    flux à `write_deltalake`. En mode "overwrite", seule la partition du jour
+    est remplacée, comme avec `write_daily_partition`.
+
+    Avec `rules` (ex: SENSOR_RULES), chaque batch est contrôlé au passage : les
+    règles sans état sont évaluées par les threads de parsing, l'unicité dans
+    l'ordre du flux. Les lignes en échec sont écartées puis ajoutées à la table
+    `quarantine_path` après le commit.
+
+    Returns:
+        tuple: (version de la table après le commit, rapport qualité ou None)
+    """
+    transform = partial(precompute_masks, rules=rules) if rules else None
+    reader = parallel_csv_batches(csv_path, schema, chunk_bytes, workers, transform)
+    report, quarantine = None, []
+    if rules:
+        report = QualityReport()
+        reader = validate_batches(reader, rules, report, quarantine)
+    reader = with_ingest_date(reader, ingest_date)
+    write_deltalake(
+        str(table_path),
+        reader,
+        mode=mode,
+        partition_by=["ingest_date"],
+        predicate=partition_predicate({"ingest_date": ingest_date}) if mode == "overwrite" else None,
+        target_file_size=target_file_size,
+    )
+    write_quarantine(quarantine_path, quarantine, mode=mode, ingest_date=ingest_date)
+    return DeltaTable(str(table_path)).version(), report
+
+
+def ingest_csv_pandas(csv_path: Path, table_path: Path, ingest_date: date, mode: str = "overwrite") -> int:
+    """Chemin actuel des scripts de correction (référence du benchmark)."""
+    df = pd.read_csv(csv_path)[SENSORS_SCHEMA.names]
+    write_daily_partition(table_path, df, ingest_date=ingest_date, mode=mode)
+    return DeltaTable(str(table_path)).version()
+
+
+# -----------------------------
+# Fichier de test agrandi
+# -----------------------------
+def generate_scaled_csv(source: Path, destination: Path, copies: int) -> int:
+    """
+    Écrit `copies` copies de sensors_full.csv avec des sensor_id décalés
+    (sensor_id + copie * 1 000 000, comme le crossJoin du notebook P2C5),
+    une copie à la fois.
+    """
+    base = pa_csv.read_csv(source, convert_options=pa_csv.ConvertOptions(
+        column_types={field.name: field.type for field in SENSORS_SCHEMA}
+    )).select(SENSORS_SCHEMA.names)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with pa_csv.CSVWriter(str(destination), base.schema) as writer:
+        for copy in range(copies):
+            writer.write_table(base.set_column(0, "sensor_id", pc.add(base["sensor_id"], copy * 1_000_000)))
+    return base.num_rows * copies
+
+
+def peak_memory_mb() -> float | None:
+    """
+    Pic de mémoire résidente du processus (ru_maxrss : Ko sous Linux, octets
+    sous macOS) ; None sous Windows, où le module resource n'existe pas.
+    """
+    if sys.platform == "win32":
+        return None
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion CSV -> Delta en flux (parsing Arrow parallèle)")
+    parser.add_argument("action", choices=["generate", "ingest"],
+                        help="generate: fabrique un gros CSV capteurs, ingest: le charge dans Delta")
+    parser.add_argument("--csv", default=None,
+                        help="CSV à charger (défaut: data/sensors_full_x<copies>.csv, généré s'il n'existe pas)")
+    parser.add_argument("--copies", type=int, default=1000,
+                        help="Copies de sensors_full.csv du CSV généré (défaut: 1000, soit 6 M lignes)")
+    parser.add_argument("--table", default=str(INGEST_PATH), help="Table Delta cible (défaut: data/sensors_ingest)")
+    parser.add_argument("--mode", choices=["overwrite", "append"], default="overwrite")
+    parser.add_argument("--method", choices=["arrow", "pandas"], default="arrow",
+                        help="arrow: flux de batches parallèle, pandas: pd.read_csv + write_deltalake (référence)")
+    parser.add_argument("--workers", type=int, default=None, help="Threads de parsing (défaut: nombre de cœurs)")
+    parser.add_argument("--chunk-mb", type=int, default=64, help="Taille d'un bloc CSV lu par thread (défaut: 64)")
+    parser.add_argument("--quality", action="store_true",
+                        help="Contrôle qualité (SENSOR_RULES) pendant l'ingestion, lignes en échec dans data/sensors_quarantine")
+    parser.add_argument("--reset", action="store_true", help="Supprime la table cible avant le chargement")
+
+    args = parser.parse_args()
+
+    scaled_csv = BASE / "data" / f"sensors_full_x{args.copies}.csv"
+    if args.action == "generate":
+        start = time.perf_counter()
+        rows = generate_scaled_csv(SENSORS_FULL_CSV, scaled_csv, args.copies)
+        print(f"✅ {scaled_csv} : {rows:,} lignes, {scaled_csv.stat().st_size / 1024 ** 2:,.0f} Mo "
+              f"({time.perf_counter() - start:.1f} s)")
+        raise SystemExit(0)
+
+    csv_path = Path(args.csv) if args.csv else scaled_csv
+    if args.csv is None and not scaled_csv.exists():
+        # Le CSV agrandi n'est pas versionné : il est régénéré depuis sensors_full.csv
+        rows = generate_scaled_csv(SENSORS_FULL_CSV, scaled_csv, args.copies)
+        print(f"✅ {scaled_csv} généré : {rows:,} lignes")
+    table_path = Path(args.table)
+    if args.reset:
+        for path in (table_path, QUARANTINE_PATH):
+            if path.exists():
+                shutil.rmtree(path)
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    report = None
+    if args.method == "arrow":
+        version, report = ingest_csv(
+            csv_path, table_path, date.today(), mode=args.mode,
+            chunk_bytes=args.chunk_mb * 1024 * 1024, workers=args.workers,
+            rules=SENSOR_RULES if args.quality else None,
+        )
+    else:
+        version = ingest_csv_pandas(csv_path, table_path, date.today(), mode=args.mode)
+    elapsed = time.perf_counter() - start
+
+    table = DeltaTable(str(table_path))
+    rows = sum(pa.table(table.get_add_actions(flatten=True))["num_records"].to_pylist())
+    print(f"Fichier   : {csv_path} ({csv_path.stat().st_size / 1024 ** 2:,.0f} Mo)")
+    print(f"Méthode   : {args.method}" + (f" ({args.workers or os.cpu_count()} threads)" if args.method == "arrow" else ""))
+    print(f"Table     : {table_path} (version {version}, {rows:,} lignes, {len(table.file_uris())} fichiers)")
+    print(f"Durée     : {elapsed:.2f} s ({rows / elapsed:,.0f} lignes/s)")
+    peak = peak_memory_mb()
+    print(f"Pic mémoire (RSS) : {peak:,.0f} Mo" if peak is not None else "Pic mémoire (RSS) : non mesuré sous Windows")
+    if report is not None:
+        print(f"Qualité   : {QUARANTINE_PATH}")
+        print(report.summary())
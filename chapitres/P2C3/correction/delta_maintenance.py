@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from deltalake import DeltaTable
+from pyarrow import fs as pa_fs
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def print_title(title: str) -> None:
+    print("\n" + "=" * 90)
+    print(title)
+    print("=" * 90)
+
+
+def format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} o"
+    value = float(size)
+    for unit in ["Ko", "Mo", "Go"]:
+        value /= 1024
+        if value < 1024:
+            break
+    return f"{value:.1f} {unit}"
+
+
+def s3_storage_options(
+    endpoint: str | None,
+    access_key: str | None,
+    secret_key: str | None,
+    region: str = "us-east-1",
+) -> dict[str, str]:
+    """Options de stockage deltalake pour une table sur S3 ou MinIO."""
+    options = {"AWS_REGION": region}
+    if endpoint:
+        options["AWS_ENDPOINT_URL"] = endpoint
+        if endpoint.startswith("http://"):
+            options["AWS_ALLOW_HTTP"] = "true"
+    if access_key:
+        options["AWS_ACCESS_KEY_ID"] = access_key
+    if secret_key:
+        options["AWS_SECRET_ACCESS_KEY"] = secret_key
+    return options
+
+
+def open_filesystem(
+    table_uri: str, storage_options: dict[str, str] | None = None
+) -> tuple[pa_fs.FileSystem, str]:
+    """
+    Retourne (filesystem PyArrow, chemin racine de la table) pour une table
+    locale (file://) ou S3/MinIO (s3://).
+    """
+    storage_options = storage_options or {}
+    if table_uri.startswith("s3://"):
+        endpoint = storage_options.get("AWS_ENDPOINT_URL")
+        scheme = "https"
+        if endpoint and endpoint.startswith("http://"):
+            scheme = "http"
+        filesystem = pa_fs.S3FileSystem(
+            access_key=storage_options.get("AWS_ACCESS_KEY_ID"),
+            secret_key=storage_options.get("AWS_SECRET_ACCESS_KEY"),
+            region=storage_options.get("AWS_REGION", "us-east-1"),
+            endpoint_override=endpoint.split("://", 1)[-1] if endpoint else None,
+            scheme=scheme,
+        )
+        return filesystem, table_uri[len("s3://"):].rstrip("/")
+
+    local_path = unquote(urlparse(table_uri).path) if table_uri.startswith("file://") else table_uri
+    return pa_fs.LocalFileSystem(), str(Path(local_path).resolve())
+
+
+def parse_interval_hours(value: str | None, default_hours: float) -> float:
+    """Convertit 'interval 24 hours' / 'interval 7 days' (propriétés Delta) en heures."""
+    if not value:
+        return default_hours
+    match = re.match(r"^\s*(?:interval\s+)?(\d+)\s+(\w+?)s?\s*$", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Durée de rétention non reconnue: {value!r}")
+    amount, unit = int(match.group(1)), match.group(2).lower()
+    factors = {"minute": 1 / 60, "hour": 1, "day": 24, "week": 24 * 7}
+    if unit not in factors:
+        raise ValueError(f"Unité de rétention non reconnue: {unit!r}")
+    return amount * factors[unit]
+
+
+# -----------------------------
+# 1) Rétention (propriétés de table)
+# -----------------------------
+def set_retention(
+    table: DeltaTable, deleted_file_hours: int = 24, log_hours: int = 24
+) -> None:
+    """Équivalent local de ALTER TABLE ... SET TBLPROPERTIES (P2C5)."""
+    table.alter.set_table_properties(
+        {
+            "delta.deletedFileRetentionDuration": f"interval {deleted_file_hours} hours",
+            "delta.logRetentionDuration": f"interval {log_hours} hours",
+        }
+    )
+    print("✅ Rétention configurée :")
+    print(f"   - delta.deletedFileRetentionDuration = interval {deleted_file_hours} hours")
+    print(f"   - delta.logRetentionDuration = interval {log_hours} hours")
+
+
+# -----------------------------
+# 2) VACUUM (fichiers de données tombstonés)
+# -----------------------------
+def plan_vacuum(
+    table: DeltaTable,
+    retention_hours: int | None = None,
+    enforce_retention_duration: bool = True,
+    storage_options: dict[str, str] | None = None,
+) -> dict:
+    """
+    Liste les fichiers tombstonés supprimables et leur taille, sans rien supprimer.
+
+    La liste est celle calculée par delta-rs (dry-run), donc elle respecte la
+    rétention ; les tailles sont lues en un seul appel get_file_info groupé.
+    """
+    relative_paths = table.vacuum(
+        retention_hours=retention_hours,
+        dry_run=True,
+        enforce_retention_duration=enforce_retention_duration,
+    )
+    filesystem, root = open_filesystem(table.table_uri, storage_options)
+    paths = [f"{root}/{p}" for p in relative_paths]
+    infos = filesystem.get_file_info(paths) if paths else []
+    files = [
+        {"path": info.path, "size": info.size or 0}
+        for info in infos
+        if info.type == pa_fs.FileType.File
+    ]
+    return {
+        "files": files,
+        "num_files": len(files),
+        "bytes": sum(f["size"] for f in files),
+    }
+
+
+def vacuum(
+    table: DeltaTable,
+    retention_hours: int | None = None,
+    dry_run: bool = True,
+    enforce_retention_duration: bool = True,
+    storage_options: dict[str, str] | None = None,
+) -> dict:
+    """
+    VACUUM des fichiers tombstonés.
+
+    La suppression passe par DeltaTable.vacuum : delta-rs écrit les commits
+    VACUUM START / VACUUM END dans _delta_log, l'opération apparaît donc
+    dans l'historique de la table (audit).
+    """
+    plan = plan_vacuum(table, retention_hours, enforce_retention_duration, storage_options)
+    print(f"Fichiers tombstonés éligibles : {plan['num_files']}")
+    print(f"Espace récupérable : {format_bytes(plan['bytes'])}")
+
+    if dry_run:
+        for f in plan["files"][:20]:
+            print(f" - {f['path']} ({format_bytes(f['size'])})")
+        if plan["num_files"] > 20:
+            print(f"   ... et {plan['num_files'] - 20} autre(s)")
+        print("ℹ️  Dry-run : aucun fichier supprimé.")
+        return {"num_files": plan["num_files"], "bytes": plan["bytes"], "deleted": 0}
+
+    deleted = table.vacuum(
+        retention_hours=retention_hours,
+        dry_run=False,
+        enforce_retention_duration=enforce_retention_duration,
+    )
+    print(f"✅ {len(deleted)} fichier(s) supprimé(s), {format_bytes(plan['bytes'])} récupérés.")
+    return {"num_files": plan["num_files"], "bytes": plan["bytes"], "deleted": len(deleted)}
+
+
+# -----------------------------
+# 3) Expiration du journal (_delta_log)
+# -----------------------------
+def list_log_files(
+    table: DeltaTable, storage_options: dict[str, str] | None = None
+) -> tuple[pa_fs.FileSystem, list[pa_fs.FileInfo]]:
+    filesystem, root = open_filesystem(table.table_uri, storage_options)
+    selector = pa_fs.FileSelector(f"{root}/_delta_log", allow_not_found=True)
+    infos = [i for i in filesystem.get_file_info(selector) if i.type == pa_fs.FileType.File]
+    return filesystem, infos
+
+
+def log_version(path: str) -> int | None:
+    match = re.match(r"^(\d{20})\.", Path(path).name)
+    return int(match.group(1)) if match else None
+
+
+def plan_log_expiration(
+    table: DeltaTable, storage_options: dict[str, str] | None = None
+) -> dict:
+    """
+    Estime les entrées de _delta_log que cleanup_metadata() supprimerait :
+    commits JSON antérieurs au dernier checkpoint et plus vieux que
+    delta.logRetentionDuration (30 jours par défaut).
+    """
+    config = table.metadata().configuration
+    retention_hours = parse_interval_hours(
+        config.get("delta.logRetentionDuration"), default_hours=30 * 24
+    )
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=retention_hours)
+
+    _, infos = list_log_files(table, storage_options)
+    checkpoints = [
+        log_version(i.path) for i in infos if ".checkpoint" in Path(i.path).name
+    ]
+    # Le checkpoint créé par expire_logs() sera à la version courante
+    last_checkpoint = max([v for v in checkpoints if v is not None] + [table.version()])
+
+    expired = []
+    for info in infos:
+        version = log_version(info.path)
+        if not info.path.endswith(".json") or version is None or info.mtime is None:
+            continue
+        if version < last_checkpoint and info.mtime.replace(tzinfo=timezone.utc) < cutoff:
+            expired.append(info)
+    return {
+        "retention_hours": retention_hours,
+        "num_files": len(expired),
+        "bytes": sum(i.size or 0 for i in expired),
+        "total_files": len(infos),
+    }
+
+
+def expire_logs(
+    table: DeltaTable, dry_run: bool = True, storage_options: dict[str, str] | None = None
+) -> dict:
+    plan = plan_log_expiration(table, storage_options)
+    print(f"Rétention du journal : {plan['retention_hours']:g} h")
+    print(f"Entrées de journal expirées : {plan['num_files']} / {plan['total_files']}")
+    print(f"Espace récupérable (journal) : {format_bytes(plan['bytes'])}")
+
+    if dry_run:
+        print("ℹ️  Dry-run : journal inchangé.")
+        return {"num_files": plan["num_files"], "bytes": plan["bytes"], "deleted": 0}
+
+    # cleanup_metadata ne supprime que ce qui précède un checkpoint
+    table.create_checkpoint()
+    _, before = list_log_files(table, storage_options)
+    table.cleanup_metadata()
+    _, after = list_log_files(table, storage_options)
+    remaining = {i.path for i in after}
+    removed = [i for i in before if i.path not in remaining]
+    removed_bytes = sum(i.size or 0 for i in removed)
+    print(f"✅ {len(removed)} entrée(s) de journal supprimée(s), {format_bytes(removed_bytes)} récupérés.")
+    return {"num_files": len(removed), "bytes": removed_bytes, "deleted": len(removed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Maintenance d'une table Delta locale ou S3/MinIO (VACUUM + rétention du journal)"
+    )
+    parser.add_argument(
+        "action",
+        choices=["set_retention", "vacuum", "expire_logs", "all"],
+        help="Action à exécuter: set_retention, vacuum, expire_logs, ou all",
+    )
+    parser.add_argument(
+        "--table",
+        default=str(Path(__file__).parent / "data" / "sensors_delta"),
+        help="Chemin local ou URI s3:// de la table Delta (défaut: data/sensors_delta)",
+    )
+    parser.add_argument(
+        "--retention-hours",
+        type=int,
+        default=None,
+        help="Rétention des fichiers supprimés pour VACUUM (défaut: propriété de la table, 7 jours sinon)",
+    )
+    parser.add_argument(
+        "--log-retention-hours",
+        type=int,
+        default=24,
+        help="Rétention du journal appliquée par set_retention (défaut: 24)",
+    )
+    parser.add_argument(
+        "--no-enforce-retention",
+        action="store_true",
+        help="Autoriser une rétention inférieure à celle de la table (ex: --retention-hours 0 en démo)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Afficher les fichiers et l'espace récupérable sans rien supprimer",
+    )
+    parser.add_argument("--endpoint", default=None, help="URL de l'endpoint S3/MinIO (ex: http://localhost:9000)")
+    parser.add_argument("--access-key", default=None, help="Access Key S3/MinIO")
+    parser.add_argument("--secret-key", default=None, help="Secret Key S3/MinIO")
+
+    args = parser.parse_args()
+
+    storage_options = None
+    if args.table.startswith("s3://"):
+        storage_options = s3_storage_options(args.endpoint, args.access_key, args.secret_key)
+
+    table = DeltaTable(args.table, storage_options=storage_options)
+    print(f"Table: {table.table_uri} (version {table.version()})")
+
+    if args.action == "set_retention" or (args.action == "all" and not args.dry_run):
+        print_title("1) Rétention de la table")
+        retention = args.retention_hours if args.retention_hours is not None else 24
+        set_retention(table, retention, args.log_retention_hours)
+        table = DeltaTable(args.table, storage_options=storage_options)
+
+    if args.action in ("vacuum", "all"):
+        print_title("2) VACUUM des fichiers tombstonés")
+        vacuum(
+            table,
+            retention_hours=args.retention_hours,
+            dry_run=args.dry_run,
+            enforce_retention_duration=not args.no_enforce_retention,
+            storage_options=storage_options,
+        )
+
+    if args.action in ("expire_logs", "all"):
+        print_title("3) Expiration des entrées de _delta_log")
+        expire_logs(table, dry_run=args.dry_run, storage_options=storage_options)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from deltalake import DeltaTable, WriterProperties, write_deltalake
+from deltalake.exceptions import TableNotFoundError
+
+
+# Module présent à l'identique dans P2C2/correction et P2C3/correction, pour que
+# chaque chapitre reste autonome : modifier les deux copies ensemble.
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def sql_literal(value) -> str:
+    """Formate une valeur Python en littéral SQL pour un prédicat delta-rs."""
+    if isinstance(value, (date, datetime)):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def partition_predicate(partition_values: dict) -> str:
+    """{"ingest_date": date(2026, 1, 1)} -> "ingest_date = '2026-01-01'"."""
+    return " AND ".join(
+        f"{column} = {sql_literal(value)}" for column, value in partition_values.items()
+    )
+
+
+def to_arrow(data: pd.DataFrame | pa.Table) -> pa.Table:
+    if isinstance(data, pd.DataFrame):
+        return pa.Table.from_pandas(data, preserve_index=False)
+    return data
+
+
+def parquet_bytes_per_row(table: pa.Table, sample_rows: int = 10_000) -> float:
+    """Estime la taille Parquet (compressée) d'une ligne en écrivant un échantillon en mémoire."""
+    sample = table.slice(0, min(sample_rows, table.num_rows))
+    if sample.num_rows == 0:
+        return 1.0
+    sink = pa.BufferOutputStream()
+    pq.write_table(sample, sink, compression="snappy")
+    return max(sink.getvalue().size / sample.num_rows, 1.0)
+
+
+def rows_per_file(
+    table: pa.Table, target_file_size: int | None, max_rows_per_file: int | None
+) -> int | None:
+    """
+    Nombre de lignes par fichier respectant la taille cible et le plafond de
+    lignes (l'un ou l'autre, ou les deux) ; None si aucune limite n'est donnée.
+    """
+    if target_file_size is None and max_rows_per_file is None:
+        return None
+    rows = max_rows_per_file if max_rows_per_file is not None else table.num_rows
+    if target_file_size is not None:
+        rows = min(rows, int(target_file_size // parquet_bytes_per_row(table)))
+    return max(rows, 1)
+
+
+def table_partition_columns(
+    table_path: str | Path, storage_options: dict[str, str] | None = None
+) -> list[str] | None:
+    """Colonnes de partition d'une table Delta existante, None si la table n'existe pas encore."""
+    try:
+        return DeltaTable(str(table_path), storage_options=storage_options).metadata().partition_columns
+    except TableNotFoundError:
+        return None
+
+
+# -----------------------------
+# Écriture partitionnée
+# -----------------------------
+def write_delta_partition(
+    table_path: str | Path,
+    data: pd.DataFrame | pa.Table,
+    partition_by: list[str] | None = None,
+    partition_values: dict | None = None,
+    mode: str = "overwrite",
+    target_file_size: int | None = None,
+    max_rows_per_file: int | None = None,
+    storage_options: dict[str, str] | None = None,
+) -> None:
+    """
+    Écrit dans une table Delta partitionnée.
+
+    - partition_by : colonnes de partition (ex: ["ingest_date"]), comme
+      `.partitionBy("ingest_date")` dans le notebook P2C5.
+    - partition_values : en mode "overwrite", seule la partition décrite est
+      remplacée (overwrite par prédicat) au lieu de toute la table ; un
+      rechargement quotidien ne réécrit donc que le jour concerné.
+    - target_file_size : taille cible des fichiers Parquet (octets).
+    - max_rows_per_file : plafond de lignes par fichier (équivalent de
+      l'option Spark `maxRecordsPerFile`).
+
+    Si la table existe avec un autre partitionnement (ex: créée par une
+    version non partitionnée du script), delta-rs refuse l'overwrite par
+    prédicat : en mode "overwrite", la table est alors recréée une fois en
+    entier avec le nouveau partitionnement (schema_mode="overwrite").
+    """
+    table = to_arrow(data)
+    predicate = None
+    if mode == "overwrite" and partition_values:
+        predicate = partition_predicate(partition_values)
+    schema_mode = None
+    if mode == "overwrite" and partition_by is not None:
+        existing = table_partition_columns(table_path, storage_options)
+        if existing is not None and existing != list(partition_by):
+            predicate = None
+            schema_mode = "overwrite"
+
+    batch_rows = rows_per_file(table, target_file_size, max_rows_per_file)
+    writer_properties = None
+    if batch_rows is not None:
+        # delta-rs ne coupe un fichier qu'entre deux batches : on découpe
+        # l'entrée en batches de `batch_rows` lignes et on force une coupure
+        # après chacun d'eux.
+        data_to_write = pa.RecordBatchReader.from_batches(
+            table.schema, table.to_batches(max_chunksize=batch_rows)
+        )
+        target_file_size = 1
+        writer_properties = WriterProperties(max_row_group_size=batch_rows)
+    else:
+        data_to_write = table
+
+    write_deltalake(
+        str(table_path),
+        data_to_write,
+        mode=mode,
+        partition_by=partition_by,
+        predicate=predicate,
+        schema_mode=schema_mode,
+        target_file_size=target_file_size,
+        writer_properties=writer_properties,
+        storage_options=storage_options,
+    )
+
+
+def write_daily_partition(
+    table_path: str | Path,
+    data: pd.DataFrame | pa.Table,
+    ingest_date: date,
+    mode: str = "overwrite",
+    target_file_size: int | None = None,
+    max_rows_per_file: int | None = None,
+    storage_options: dict[str, str] | None = None,
+) -> None:
+    """Ajoute la colonne ingest_date et écrit (ou remplace) la partition du jour."""
+    table = to_arrow(data)
+    if "ingest_date" not in table.column_names:
+        table = table.append_column(
+            "ingest_date", pa.array([ingest_date] * table.num_rows, type=pa.date32())
+        )
+    write_delta_partition(
+        table_path,
+        table,
+        partition_by=["ingest_date"],
+        partition_values={"ingest_date": ingest_date},
+        mode=mode,
+        target_file_size=target_file_size,
+        max_rows_per_file=max_rows_per_file,
+        storage_options=storage_options,
+    )
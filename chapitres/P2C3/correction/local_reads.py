@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import unquote, urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from deltalake import DeltaTable
+from pyarrow import fs as pa_fs
+
+if TYPE_CHECKING:
+    from pyiceberg.expressions import BooleanExpression
+    from pyiceberg.table import Table
+
+
+# Module présent à l'identique dans P2C2/correction et P2C3/correction, pour que
+# chaque chapitre reste autonome : modifier les deux copies ensemble.
+
+
+BASE = Path(__file__).parent
+DELTA_PATH = BASE / "data" / "sensors_delta"
+
+# Instantanés Arrow rangés dans la table : Delta (VACUUM) et Iceberg ignorent ce dossier
+SNAPSHOT_DIR = "_arrow_snapshots"
+# Instantanés gardés par table (les plus récemment écrits)
+MAX_SNAPSHOTS = 2
+
+
+# -----------------------------
+# Fichiers locaux en mémoire mappée
+# -----------------------------
+def local_path(uri: str) -> Path | None:
+    """Chemin local d'une URI de table (file:// ou chemin), None pour un stockage objet (s3://...)."""
+    if uri.startswith("file://"):
+        return Path(unquote(urlparse(uri).path))
+    if "://" in uri:
+        return None
+    return Path(uri)
+
+
+def mmap_filesystem(root: Path | None = None) -> pa_fs.FileSystem:
+    """
+    Système de fichiers local dont les fichiers ouverts sont mappés en mémoire
+    (mmap), pas copiés ; limité au dossier root s'il est donné.
+    """
+    filesystem = pa_fs.LocalFileSystem(use_mmap=True)
+    return pa_fs.SubTreeFileSystem(str(root.resolve()), filesystem) if root is not None else filesystem
+
+
+def to_pandas(data: pa.Table, zero_copy: bool = True) -> pd.DataFrame:
+    """
+    Convertit en pandas seulement quand on le demande.
+
+    zero_copy=True : colonnes pandas adossées aux tableaux Arrow (pd.ArrowDtype),
+    sans copie ; zero_copy=False : conversion classique en types NumPy (copie).
+    """
+    if zero_copy:
+        return data.to_pandas(types_mapper=pd.ArrowDtype)
+    return data.to_pandas()
+
+
+# -----------------------------
+# Instantané Arrow (IPC) par version de table
+# -----------------------------
+def snapshot_file(root: Path, key: str) -> Path:
+    return root / SNAPSHOT_DIR / f"{key}.arrow"
+
+
+def read_snapshot(path: Path) -> pa.Table:
+    """Table lue dans un fichier Arrow IPC mappé : les colonnes pointent sur le page cache, rien n'est alloué."""
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+
+def write_snapshot(data: pa.Table, path: Path) -> pa.Table:
+    """
+    Écrit la table au format Arrow IPC non compressé (fichier temporaire
+    unique puis os.replace : deux lecteurs peuvent écrire la même version)
+    puis la relit mappée ; seuls les MAX_SNAPSHOTS instantanés les plus
+    récents de la table sont gardés.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as sink:
+        with pa.ipc.new_file(sink, data.schema) as writer:
+            writer.write_table(data)
+    os.replace(sink.name, path)
+
+    snapshots = sorted(path.parent.glob("*.arrow"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for old in snapshots[MAX_SNAPSHOTS:]:
+        old.unlink(missing_ok=True)
+    return read_snapshot(path)
+
+
+def select_rows(data: pa.Table, columns: list[str] | None, filter: pc.Expression | None) -> pa.Table:
+    """Lignes et colonnes demandées d'un instantané complet."""
+    if filter is not None:
+        data = data.filter(filter)
+    return data.select(columns) if columns is not None else data
+
+
+# -----------------------------
+# Delta Lake
+# -----------------------------
+def delta_snapshot_key(table: DeltaTable, root: Path) -> str | None:
+    """
+    Clé de l'instantané d'une version : numéro de version + date du commit
+    dans _delta_log (une table recréée au même chemin repart à la version 0).
+    None si le commit n'est plus dans le journal (expiré après checkpoint).
+    """
+    version = table.version()
+    commit = root / "_delta_log" / f"{version:020d}.json"
+    if not commit.exists():
+        return None
+    return f"delta-v{version}-{commit.stat().st_mtime_ns}"
+
+
+def read_delta_local(
+    table: DeltaTable,
+    columns: list[str] | None = None,
+    filter: pc.Expression | None = None,
+    snapshot: bool = False,
+) -> pa.Table:
+    """
+    Lit une version d'une table Delta locale en Arrow, sans passer par pandas.
+
+    - Les fichiers Parquet sont mappés en mémoire (pas de copie dans un
+      tampon de lecture) ; colonnes et filtre sont poussés au scan.
+    - Avec snapshot=True (à demander : la lecture écrit alors dans la table),
+      une lecture complète est aussi écrite en Arrow IPC dans
+      _arrow_snapshots/ : les lectures suivantes de la même version avec
+      snapshot=True mappent ce fichier (pas de décodage Parquet, aucune
+      allocation) et n'en gardent que les colonnes / lignes demandées.
+
+    Une table sur stockage objet (s3://) est lue normalement par delta-rs.
+    """
+    root = local_path(table.table_uri)
+    if root is None:
+        return table.to_pyarrow_dataset().to_table(columns=columns, filter=filter)
+
+    key = delta_snapshot_key(table, root) if snapshot else None
+    if key is not None and snapshot_file(root, key).exists():
+        return select_rows(read_snapshot(snapshot_file(root, key)), columns, filter)
+
+    data = table.to_pyarrow_dataset(filesystem=mmap_filesystem(root)).to_table(columns=columns, filter=filter)
+    if key is not None and columns is None and filter is None:
+        return write_snapshot(data, snapshot_file(root, key))
+    return data
+
+
+# -----------------------------
+# Iceberg
+# -----------------------------
+def strip_field_metadata(data: pa.Table) -> pa.Table:
+    """Retire les field_id Parquet des champs (schéma identique à celui de scan().to_arrow())."""
+    return data.cast(pa.schema([field.remove_metadata() for field in data.schema]))
+
+
+def read_iceberg_local(
+    table: Table,
+    row_filter: str | BooleanExpression | None = None,
+    selected_fields: tuple[str, ...] = ("*",),
+    snapshot: bool = False,
+) -> pa.Table:
+    """
+    Lit le snapshot courant d'une table Iceberg locale en Arrow.
+
+    PyIceberg planifie le scan (pruning par partitions et statistiques), puis
+    les fichiers retenus sont lus mappés en mémoire avec la projection et le
+    filtre (row_filter=None : toutes les lignes). Avec snapshot=True (à
+    demander), une lecture complète est écrite en Arrow IPC (clé :
+    snapshot_id) et relue mappée aux appels suivants avec snapshot=True.
+
+    Repli sur scan().to_arrow() si la table n'est pas locale, a des fichiers
+    de suppression (delete files) ou un schéma qui a évolué (colonnes
+    renommées : la lecture par nom ne suffit plus).
+    """
+    # pyiceberg n'est requis que pour les tables Iceberg (chapitre P2C2)
+    from pyiceberg.expressions import AlwaysTrue
+    from pyiceberg.expressions.visitors import bind
+    from pyiceberg.io.pyarrow import expression_to_pyarrow
+
+    scan = table.scan(row_filter=AlwaysTrue() if row_filter is None else row_filter, selected_fields=selected_fields)
+    current = table.current_snapshot()
+    root = local_path(table.location())
+    if root is None or current is None or len(table.metadata.schemas) > 1:
+        return scan.to_arrow()
+
+    full_read = isinstance(scan.row_filter, AlwaysTrue) and tuple(selected_fields) == ("*",)
+    key = f"iceberg-{current.snapshot_id}" if snapshot and full_read else None
+    if key is not None and snapshot_file(root, key).exists():
+        return read_snapshot(snapshot_file(root, key))
+
+    tasks = list(scan.plan_files())
+    if any(task.delete_files for task in tasks):
+        return scan.to_arrow()
+
+    columns = [field.name for field in scan.projection().fields]
+    filter = None
+    if not isinstance(scan.row_filter, AlwaysTrue):
+        filter = expression_to_pyarrow(bind(table.schema(), scan.row_filter, case_sensitive=True), table.schema())
+    paths = [str(local_path(task.file.file_path)) for task in tasks]
+    if not paths:
+        return scan.to_arrow()
+    data = strip_field_metadata(
+        ds.dataset(paths, format="parquet", filesystem=mmap_filesystem()).to_table(columns=columns, filter=filter)
+    )
+    if key is not None:
+        return write_snapshot(data, snapshot_file(root, key))
+    return data
+
+
+# -----------------------------
+# Mesures
+# -----------------------------
+def measure(read, repeat: int = 1) -> tuple[int, list[float], int]:
+    """
+    Lance read() repeat fois : nombre de lignes, durée de chaque lecture (s)
+    et octets alloués par le pool Arrow pendant la dernière (décodage
+    Parquet, copies), y compris ceux déjà libérés à la fin de la lecture ;
+    les fichiers mappés ne passent pas par le pool.
+    """
+    pool = pa.default_memory_pool()
+    durations, rows, allocated = [], 0, 0
+    for _ in range(repeat):
+        # Lectures précédentes libérées (cycles de références compris) avant la mesure
+        gc.collect()
+        # Cumul des allocations (jamais décrémenté), pas la mémoire encore occupée
+        allocated_before = pool.total_bytes_allocated()
+        start = time.perf_counter()
+        result = read()
+        durations.append(time.perf_counter() - start)
+        rows = len(result)
+        allocated = pool.total_bytes_allocated() - allocated_before
+        del result
+    return rows, durations, allocated
+
+
+def run_benchmark(path: Path, repeat: int) -> None:
+    """
+    Lectures répétées d'une même version : delta-rs + pandas, lecture locale
+    mappée, puis avec instantané Arrow (écrit dans la table à la 1re lecture).
+    """
+    table = DeltaTable(str(path))
+    print(f"📁 {path} (version {table.version()})")
+
+    def timed(label: str, read) -> None:
+        rows, durations, allocated = measure(read, repeat)
+        print(f"   {label:<42} {rows:>12,} lignes  1re : {durations[0]:6.3f} s  "
+              f"suivantes : {min(durations[1:] or durations):6.3f} s  (alloué par Arrow : {allocated / 1e6:,.0f} Mo)")
+
+    timed("DeltaTable.to_pandas()", table.to_pandas)
+    timed("read_delta_local (Parquet mappé)", lambda: read_delta_local(table))
+    timed("read_delta_local (instantané Arrow)", lambda: read_delta_local(table, snapshot=True))
+    timed("to_pandas(read_delta_local(...))", lambda: to_pandas(read_delta_local(table, snapshot=True)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lectures locales d'une table Delta : Parquet mappé en mémoire, instantané Arrow par version"
+    )
+    parser.add_argument("action", choices=["read", "bench", "clear"],
+                        help="read: aperçu de la table, bench: lectures répétées comparées, clear: supprimer les instantanés")
+    parser.add_argument("--table", default=str(DELTA_PATH), help="Chemin de la table Delta (défaut: data/sensors_delta)")
+    parser.add_argument("--repeat", type=int, default=3, help="Lectures par mode pour bench (défaut: 3)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="read : écrire (ou relire) l'instantané Arrow de la version dans _arrow_snapshots/")
+
+    args = parser.parse_args()
+
+    if args.action == "bench":
+        run_benchmark(Path(args.table), args.repeat)
+    elif args.action == "clear":
+        removed = list((Path(args.table) / SNAPSHOT_DIR).glob("*.arrow"))
+        for path in removed:
+            path.unlink()
+        print(f"🗑️  {len(removed)} instantané(s) supprimé(s)")
+    else:
+        data = read_delta_local(DeltaTable(args.table), snapshot=args.snapshot)
+        print(to_pandas(data).head(20))
+        source = f"mappés depuis {SNAPSHOT_DIR}/" if args.snapshot else "Parquet mappé puis décodé"
+        print(f"\n{data.num_rows:,} lignes, {data.nbytes:,} octets ({source})")
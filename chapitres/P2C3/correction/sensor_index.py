@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import argparse
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+from urllib.parse import unquote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from deltalake import DeltaTable
+from pyarrow import fs as pa_fs
+
+from delta_maintenance import open_filesystem, print_title
+from delta_write import sql_literal, write_daily_partition
+
+
+BASE = Path(__file__).parent
+DELTA_PATH = BASE / "data" / "sensors_delta"
+GROWN_PATH = BASE / "data" / "sensors_grown"
+SENSORS_FULL_CSV = BASE.parent.parent / "P2C5" / "src" / "sensors_full.csv"
+
+# Index secondaire rangé dans la table : VACUUM ignore les dossiers préfixés par "_"
+INDEX_DIR = "_sensor_index"
+INDEX_FILE = "index.parquet"
+INDEX_KEY = "sensor_id"
+INDEX_VERSION_KEY = b"sensor_index.table_version"
+
+
+# -----------------------------
+# Index sensor_id -> fichiers
+# -----------------------------
+@dataclass
+class SensorIndex:
+    """Couples (sensor_id, fichier) de la version `version` de la table, triés par sensor_id."""
+
+    version: int
+    entries: pa.Table
+
+    def files_for(self, keys: list[int]) -> list[str]:
+        """Fichiers (chemins relatifs du journal Delta) contenant au moins une des clés."""
+        mask = pc.is_in(self.entries[INDEX_KEY], pa.array(keys, pa.int64()))
+        return sorted(set(self.entries["path"].filter(mask).to_pylist()))
+
+
+PATH_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Index déjà chargé, par table : valable tant que sa version est celle de la table
+_LOADED: dict[str, SensorIndex] = {}
+
+
+def empty_entries() -> pa.Table:
+    return pa.table({INDEX_KEY: pa.array([], pa.int64()), "path": pa.array([], PATH_TYPE)})
+
+
+def index_location(table: DeltaTable, storage_options: dict[str, str] | None = None) -> tuple[pa_fs.FileSystem, str]:
+    filesystem, root = open_filesystem(table.table_uri, storage_options)
+    return filesystem, f"{root}/{INDEX_DIR}/{INDEX_FILE}"
+
+
+def load_index(table: DeltaTable, storage_options: dict[str, str] | None = None) -> SensorIndex | None:
+    loaded = _LOADED.get(table.table_uri)
+    if loaded is not None and loaded.version == table.version():
+        return loaded
+    filesystem, path = index_location(table, storage_options)
+    if filesystem.get_file_info(path).type == pa_fs.FileType.NotFound:
+        return None
+    entries = pq.read_table(path, filesystem=filesystem, read_dictionary=["path"])
+    version = int(entries.schema.metadata[INDEX_VERSION_KEY])
+    return SensorIndex(version, entries.replace_schema_metadata(None))
+
+
+def save_index(table: DeltaTable, index: SensorIndex, storage_options: dict[str, str] | None = None) -> None:
+    """
+    Écrit l'index (quelques centaines de Ko pour 300 000 lignes) : sensor_id
+    trié en DELTA_BINARY_PACKED, chemins en dictionnaire.
+    """
+    filesystem, path = index_location(table, storage_options)
+    filesystem.create_dir(path.rsplit("/", 1)[0], recursive=True)
+    entries = index.entries.replace_schema_metadata({INDEX_VERSION_KEY: str(index.version).encode()})
+    pq.write_table(
+        entries, path, filesystem=filesystem,
+        use_dictionary=["path"], column_encoding={INDEX_KEY: "DELTA_BINARY_PACKED"},
+    )
+    _LOADED[table.table_uri] = index
+
+
+def file_keys(filesystem: pa_fs.FileSystem, root: str, paths: list[str]) -> pa.Table:
+    """Clés distinctes de chaque fichier (seule la colonne sensor_id est lue)."""
+    parts = [empty_entries()]
+    for path in paths:
+        keys = pc.unique(pq.read_table(f"{root}/{unquote(path)}", columns=[INDEX_KEY], filesystem=filesystem)[INDEX_KEY])
+        parts.append(pa.table({
+            INDEX_KEY: keys.cast(pa.int64()),
+            "path": pc.dictionary_encode(pa.repeat(pa.scalar(path, pa.string()), len(keys))),
+        }))
+    return pa.concat_tables(parts).unify_dictionaries()
+
+
+def apply_file_changes(
+    index: SensorIndex, removed: list[str], added: pa.Table, version: int
+) -> SensorIndex:
+    """Nouvel index : entrées des fichiers retirés supprimées, entrées des fichiers ajoutés insérées."""
+    kept = index.entries.filter(pc.invert(pc.is_in(index.entries["path"], pa.array(removed, pa.string()))))
+    entries = pa.concat_tables([kept, added]).unify_dictionaries().combine_chunks().sort_by(INDEX_KEY)
+    return SensorIndex(version, entries)
+
+
+def refresh_index(table: DeltaTable, storage_options: dict[str, str] | None = None) -> SensorIndex:
+    """
+    Met l'index à jour avec la version courante de la table.
+
+    Seuls les fichiers ajoutés depuis la dernière mise à jour sont lus
+    (colonne sensor_id) ; ceux qui ont disparu du journal (update, delete,
+    optimize... faits par un autre outil) sont retirés. Sans index, tous les
+    fichiers actifs sont indexés.
+    """
+    index = load_index(table, storage_options) or SensorIndex(-1, empty_entries())
+    if index.version == table.version():
+        return index
+
+    filesystem, root = open_filesystem(table.table_uri, storage_options)
+    active = set(pa.table(table.get_add_actions(flatten=True))["path"].to_pylist())
+    indexed = set(pc.unique(index.entries["path"]).to_pylist())
+    added = file_keys(filesystem, root, sorted(active - indexed))
+    index = apply_file_changes(index, sorted(indexed - active), added, table.version())
+    save_index(table, index, storage_options)
+    return index
+
+
+# -----------------------------
+# Fichiers candidats (d'après l'index)
+# -----------------------------
+def partition_columns(table: DeltaTable) -> list[str]:
+    return list(table.metadata().partition_columns)
+
+
+def file_actions(table: DeltaTable, paths: list[str]) -> list[dict]:
+    """Actions add (chemin, taille, valeurs de partition) des fichiers demandés."""
+    actions = pa.table(table.get_add_actions(flatten=True))
+    actions = actions.filter(pc.is_in(actions["path"], pa.array(paths, pa.string())))
+    columns = partition_columns(table)
+    return [
+        {
+            "path": row["path"],
+            "size": row["size_bytes"],
+            "partition_values": {c: partition_value(row[f"partition.{c}"]) for c in columns},
+        }
+        for row in actions.to_pylist()
+    ]
+
+
+def partition_value(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def key_predicate(keys: list[int], alias: str | None = None) -> str:
+    column = f"{alias}.{INDEX_KEY}" if alias else INDEX_KEY
+    if len(keys) == 1:
+        return f"{column} = {sql_literal(keys[0])}"
+    return f"{column} IN ({', '.join(sql_literal(k) for k in keys)})"
+
+
+def candidate_partitions(
+    table: DeltaTable, index: SensorIndex, keys: list[int], alias: str | None = None
+) -> str | None:
+    """
+    Prédicat sur les colonnes de partition des fichiers qui contiennent les
+    clés, d'après l'index : ajouté au prédicat de update / delete / merge,
+    il écarte les autres partitions avant toute lecture. Chaîne vide pour une
+    table non partitionnée, None si aucun fichier ne contient les clés.
+    """
+    paths = index.files_for(keys)
+    if not paths:
+        return None
+    actions = file_actions(table, paths)
+    clauses = []
+    for column in partition_columns(table):
+        name = f"{alias}.{column}" if alias else column
+        values = {action["partition_values"][column] for action in actions}
+        literals = sorted(sql_literal(value) for value in values if value is not None)
+        parts = [f"{name} IN ({', '.join(literals)})"] if literals else []
+        if None in values:
+            parts.append(f"{name} IS NULL")
+        clauses.append(parts[0] if len(parts) == 1 else f"({' OR '.join(parts)})")
+    return " AND ".join(clauses)
+
+
+def narrowed_predicate(table: DeltaTable, index: SensorIndex, keys: list[int]) -> str | None:
+    """Prédicat sur les clés, restreint aux partitions candidates ; None si aucune ligne n'est concernée."""
+    partitions = candidate_partitions(table, index, keys)
+    if partitions is None:
+        return None
+    return f"{key_predicate(keys)} AND {partitions}" if partitions else key_predicate(keys)
+
+
+# -----------------------------
+# Opérations ponctuelles sur sensor_id
+# -----------------------------
+def lookup(
+    table: DeltaTable, sensor_ids: list[int], storage_options: dict[str, str] | None = None
+) -> pa.Table:
+    """Lignes des capteurs demandés, en ne lisant que les fichiers qui les contiennent."""
+    index = refresh_index(table, storage_options)
+    filesystem, root = open_filesystem(table.table_uri, storage_options)
+    columns = partition_columns(table)
+    schema = pa.schema(table.schema().to_arrow())
+    parts = []
+    for action in file_actions(table, index.files_for(sensor_ids)):
+        data = pq.read_table(
+            f"{root}/{unquote(action['path'])}",
+            filesystem=filesystem,
+            filters=pc.is_in(pc.field(INDEX_KEY), pa.array(sensor_ids, pa.int64())),
+        )
+        for column in columns:
+            value = pa.scalar(action["partition_values"][column]).cast(schema.field(column).type)
+            data = data.append_column(column, pa.repeat(value, data.num_rows))
+        parts.append(data.select(schema.names).cast(schema))
+    return pa.concat_tables(parts) if parts else schema.empty_table()
+
+
+def update_by_key(
+    table: DeltaTable,
+    sensor_ids: list[int],
+    updates: dict[str, str],
+    storage_options: dict[str, str] | None = None,
+) -> dict:
+    """
+    UPDATE ... SET <col> = <expr> WHERE sensor_id IN (...) par DeltaTable.update,
+    limité aux partitions des fichiers de l'index. Les expressions sont
+    des expressions SQL delta-rs (ex: "humidity + 1").
+
+    Returns:
+        dict: Métriques delta-rs (vides si aucun fichier ne contient ces capteurs)
+    """
+    index = refresh_index(table, storage_options)
+    predicate = narrowed_predicate(table, index, sensor_ids)
+    if predicate is None:
+        return {}
+    metrics = table.update(predicate=predicate, updates=updates)
+    refresh_index(table, storage_options)
+    return metrics
+
+
+def delete_by_key(
+    table: DeltaTable, sensor_ids: list[int], storage_options: dict[str, str] | None = None
+) -> dict:
+    """DELETE WHERE sensor_id IN (...) par DeltaTable.delete, limité aux partitions des fichiers de l'index."""
+    index = refresh_index(table, storage_options)
+    predicate = narrowed_predicate(table, index, sensor_ids)
+    if predicate is None:
+        return {}
+    metrics = table.delete(predicate)
+    refresh_index(table, storage_options)
+    return metrics
+
+
+def merge_by_key(
+    table: DeltaTable,
+    source: pa.Table,
+    update_columns: list[str],
+    storage_options: dict[str, str] | None = None,
+) -> dict:
+    """
+    MERGE sur sensor_id par DeltaTable.merge : `update_columns` des lignes
+    existantes remplacées par celles de `source` (when_matched_update),
+    capteurs absents insérés (when_not_matched_insert_all).
+
+    Les capteurs déjà présents ne sont, d'après l'index, que dans certaines
+    partitions : la condition de merge y restreint la cible, sans risque
+    d'insérer en double un capteur existant.
+    """
+    index = refresh_index(table, storage_options)
+    keys = source[INDEX_KEY].to_pylist()
+    predicate = f"source.{INDEX_KEY} = target.{INDEX_KEY}"
+    partitions = candidate_partitions(table, index, keys, alias="target")
+    if partitions:
+        predicate = f"{predicate} AND {partitions}"
+
+    metrics = (
+        table.merge(source=source, predicate=predicate, source_alias="source", target_alias="target")
+        .when_matched_update(updates={name: f"source.{name}" for name in update_columns})
+        .when_not_matched_insert_all()
+        .execute()
+    )
+    refresh_index(table, storage_options)
+    return metrics
+
+
+# -----------------------------
+# Démo : table grossie comme dans le notebook P2C5 (crossJoin)
+# -----------------------------
+def build_grown_table(path: Path, multiplier: int, max_rows_per_file: int, seed: int = 0) -> None:
+    """
+    sensors_full.csv + `multiplier` copies (sensor_id + batch * 1 000 000)
+    mélangées puis écrites en fichiers de `max_rows_per_file` lignes, comme
+    le `crossJoin` + `repartition` + `maxRecordsPerFile` du notebook : les
+    plages min/max de sensor_id se chevauchent d'un fichier à l'autre.
+    """
+    base = pa_csv.read_csv(
+        SENSORS_FULL_CSV,
+        convert_options=pa_csv.ConvertOptions(column_types={"sensor_id": pa.int64(), "humidity": pa.float64()}),
+    )
+    today = date.today()
+    write_daily_partition(path, base, ingest_date=today)
+
+    growth = pa.concat_tables([
+        base.set_column(0, "sensor_id", pc.add(base["sensor_id"], batch * 1_000_000))
+        for batch in range(multiplier)
+    ])
+    growth = growth.take(np.random.default_rng(seed).permutation(growth.num_rows))
+    write_daily_partition(
+        path, growth, ingest_date=today + timedelta(days=1), mode="append", max_rows_per_file=max_rows_per_file
+    )
+
+
+def timed(label: str, func: Callable[[], object]) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = func()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:<48} {elapsed:>9.1f} ms")
+    return result, elapsed
+
+
+def sorted_rows(data: pa.Table) -> list[dict]:
+    return data.sort_by([(name, "ascending") for name in data.column_names]).to_pylist()
+
+
+def index_pairs(entries: pa.Table) -> set[tuple[int, str]]:
+    return set(zip(entries[INDEX_KEY].to_pylist(), entries["path"].to_pylist()))
+
+
+def run_demo(multiplier: int, max_rows_per_file: int) -> None:
+    baseline_path = GROWN_PATH.with_name(GROWN_PATH.name + "_baseline")
+    for path in (GROWN_PATH, baseline_path):
+        if path.exists():
+            shutil.rmtree(path)
+    GROWN_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    print_title(f"1) Table grossie (x{multiplier}, {max_rows_per_file} lignes max par fichier)")
+    build_grown_table(GROWN_PATH, multiplier, max_rows_per_file)
+    shutil.copytree(GROWN_PATH, baseline_path)
+    table, baseline = DeltaTable(str(GROWN_PATH)), DeltaTable(str(baseline_path))
+
+    # Capteurs de la copie du milieu : leur sensor_id tombe dans la plage min/max de presque tous les fichiers
+    offset = (multiplier // 2) * 1_000_000
+    key, deleted_key, merged_key = offset + 1000, offset + 1001, offset + 1002
+    actions = pa.table(table.get_add_actions(flatten=True))
+    overlapping = actions.filter(pc.and_(
+        pc.less_equal(actions["min.sensor_id"], key), pc.greater_equal(actions["max.sensor_id"], key)
+    )).num_rows
+    print(f"Fichiers : {actions.num_rows}, dont {overlapping} dont la plage min/max contient sensor_id = {key}")
+
+    print_title("2) Construction de l'index sensor_id -> fichiers")
+    index, _ = timed("refresh_index (première construction)", lambda: refresh_index(table))
+    print(f"Entrées : {index.entries.num_rows}, fichiers contenant sensor_id = {key} : {len(index.files_for([key]))}")
+    timed("refresh_index (déjà à jour)", lambda: refresh_index(table))
+
+    print_title(f"3) Lecture ponctuelle : sensor_id = {key}")
+    indexed, _ = timed("avec l'index", lambda: lookup(table, [key]))
+    full, _ = timed("sans index (filtre sur toute la table)",
+                    lambda: baseline.to_pyarrow_table(filters=[(INDEX_KEY, "=", key)]))
+    print("Même résultat ?", sorted_rows(indexed) == sorted_rows(full))
+
+    print_title(f"4) UPDATE humidity = humidity + 1 WHERE sensor_id = {key}")
+    metrics, _ = timed("avec l'index", lambda: update_by_key(table, [key], {"humidity": "humidity + 1"}))
+    print("   fichiers réécrits :", metrics.get("num_removed_files"))
+    metrics, _ = timed("delta-rs update (sans index)",
+                       lambda: baseline.update(predicate=f"sensor_id = {key}", updates={"humidity": "humidity + 1"}))
+    print("   fichiers réécrits :", metrics.get("num_removed_files"))
+
+    print_title(f"5) DELETE WHERE sensor_id = {deleted_key}")
+    metrics, _ = timed("avec l'index", lambda: delete_by_key(table, [deleted_key]))
+    print("   fichiers réécrits :", metrics.get("num_removed_files"))
+    metrics, _ = timed("delta-rs delete (sans index)", lambda: baseline.delete(f"sensor_id = {deleted_key}"))
+    print("   fichiers réécrits :", metrics.get("num_removed_files"))
+
+    print_title(f"6) MERGE : sensor_id = {merged_key} corrigé, sensor_id = 99999999 inséré")
+    source = pa.table({
+        "sensor_id": pa.array([merged_key, 99_999_999], pa.int64()),
+        "humidity": [47.0, 41.9],
+        "parcel": ["East-2", "West-3"],
+        "ingest_date": pa.array([date.today()] * 2, pa.date32()),
+    })
+    metrics, _ = timed("avec l'index", lambda: merge_by_key(table, source, ["humidity", "parcel"]))
+    print("   fichiers réécrits :", metrics.get("num_target_files_removed"))
+    metrics, _ = timed("delta-rs merge (sans index)", lambda: (
+        baseline.merge(source=source, predicate="source.sensor_id = target.sensor_id",
+                       source_alias="source", target_alias="target")
+        .when_matched_update(updates={"humidity": "source.humidity", "parcel": "source.parcel"})
+        .when_not_matched_insert_all()
+        .execute()
+    ))
+    print("   fichiers réécrits :", metrics.get("num_target_files_removed"))
+
+    print_title("Contrôle")
+    table, baseline = DeltaTable(str(GROWN_PATH)), DeltaTable(str(baseline_path))
+    same = sorted_rows(table.to_pyarrow_table()) == sorted_rows(baseline.to_pyarrow_table())
+    print("✅ Table identique à celle modifiée par delta-rs ?", same)
+    print("✅ Opérations dans l'historique :",
+          [entry["operation"] for entry in reversed(table.history(3))])
+    rebuilt = file_keys(*open_filesystem(table.table_uri), pa.table(table.get_add_actions(flatten=True))["path"].to_pylist())
+    stored = load_index(table)
+    print("✅ Index à jour (version, entrées) ?",
+          stored.version == table.version()
+          and index_pairs(stored.entries) == index_pairs(rebuilt))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Index secondaire sensor_id -> fichiers pour les lectures, UPDATE, DELETE et MERGE ponctuels"
+    )
+    parser.add_argument("action", choices=["build", "lookup", "demo"],
+                        help="build: (re)met l'index à jour, lookup: lit des capteurs, demo: comparaison avec delta-rs")
+    parser.add_argument("--table", default=str(DELTA_PATH), help="Chemin de la table Delta (défaut: data/sensors_delta)")
+    parser.add_argument("--sensor-id", type=int, nargs="+", default=[101], help="Capteur(s) à lire (action lookup)")
+    parser.add_argument("--multiplier", type=int, default=50, help="Copies de sensors_full.csv pour la démo (défaut: 50)")
+    parser.add_argument("--max-rows-per-file", type=int, default=500,
+                        help="Lignes max par fichier pour la démo (défaut: 500, comme maxRecordsPerFile)")
+
+    args = parser.parse_args()
+
+    if args.action == "demo":
+        run_demo(args.multiplier, args.max_rows_per_file)
+    elif args.action == "build":
+        table = DeltaTable(args.table)
+        index = refresh_index(table)
+        print(f"✅ Index à jour (version {index.version}) : {index.entries.num_rows} entrées, "
+              f"{len(set(index.entries['path'].to_pylist()))} fichiers")
+    else:
+        print(lookup(DeltaTable(args.table), args.sensor_id).to_pandas())
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from deltalake import CommitProperties, DeltaTable, WriterProperties, write_deltalake
+
+from sensors_daily_local import BASE, RAW_PATH, RAW_VERSION_KEY, print_title
+
+
+# -----------------------------
+# Définition des cubes
+# -----------------------------
+CUBES_PATH = BASE / "data" / "cubes"
+RAW_TABLE_ID_KEY = "sensor_cubes.raw_table_id"
+ROW_GROUP_SIZE = 16_384
+
+LEVELS = ["hour", "day", "week"]  # du plus fin au plus grossier
+DIMENSIONS = {"parcel": "parcel_id", "sensor": "sensor_id"}
+METRICS = ["humidity", "temperature", "soil_ph", "battery_pct"]
+
+# États mergeables stockés par mesure, et comment les combiner entre buckets
+STATES = {"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"}
+AGGREGATES = ["count", "sum", "avg", "min", "max", "variance", "stddev"]
+
+
+def cube_path(dimension: str, level: str) -> Path:
+    return CUBES_PATH / f"{dimension}_{level}"
+
+
+def bucket_start(ts: pa.Array | pa.ChunkedArray, level: str) -> pa.Array:
+    """Début du bucket (heure, jour ou semaine commençant le lundi)."""
+    if level == "week":
+        return pc.floor_temporal(ts, 1, "week", week_starts_monday=True)
+    return pc.floor_temporal(ts, 1, level)
+
+
+def is_aligned(value: datetime | None, level: str) -> bool:
+    """True si `value` tombe sur une frontière de bucket du niveau (None = pas de borne)."""
+    if value is None:
+        return True
+    if (value.minute, value.second, value.microsecond) != (0, 0, 0):
+        return False
+    if level in ("day", "week") and value.hour != 0:
+        return False
+    return level != "week" or value.weekday() == 0
+
+
+# -----------------------------
+# Calcul des états
+# -----------------------------
+def combine_states(states: pa.Table, key: str, level: str | None = None) -> pa.Table:
+    """
+    Combine des états ayant le même (bucket, clé). Avec `level`, les buckets sont
+    d'abord ramenés au niveau demandé (ex: heure -> jour) : c'est le rollup.
+    """
+    if level is not None:
+        states = states.set_column(0, "bucket", bucket_start(states["bucket"], level))
+    group_keys = ["bucket", key] if "bucket" in states.column_names else [key]
+    aggregations = []
+    for metric in METRICS:
+        for state, combine in STATES.items():
+            column = f"{metric}_{state}"
+            if column in states.column_names:
+                options = pc.ScalarAggregateOptions(min_count=0) if combine == "sum" else None
+                aggregations.append((column, combine, options))
+    combined = states.group_by(group_keys).aggregate(aggregations)
+    return pa.table({
+        **{k: combined[k] for k in group_keys},
+        **{column: combined[f"{column}_{combine}"] for column, combine, _ in aggregations},
+    })
+
+
+def raw_states(batch: pa.RecordBatch, key: str) -> pa.Table:
+    """États horaires d'un lot de mesures RAW (valeurs nulles ignorées, comme en SQL)."""
+    columns = {"bucket": bucket_start(batch["measurement_ts"], "hour"), key: batch[key]}
+    for metric in METRICS:
+        values = batch[metric]
+        columns[f"{metric}_count"] = pc.cast(pc.is_valid(values), pa.int64())
+        columns[f"{metric}_sum"] = values
+        columns[f"{metric}_sumsq"] = pc.multiply(values, values)
+        columns[f"{metric}_min"] = values
+        columns[f"{metric}_max"] = values
+    return combine_states(pa.table(columns), key)
+
+
+def raw_source(raw_path: Path) -> tuple[str, int]:
+    """(id de la table RAW, version) : l'id change si la table est recréée."""
+    table = DeltaTable(str(raw_path))
+    return table.metadata().id, table.version()
+
+
+def cube_source(dimension: str, level: str) -> tuple[str, int] | None:
+    """Source (id RAW, version) enregistrée par le dernier build du cube."""
+    path = cube_path(dimension, level)
+    if not DeltaTable.is_deltatable(str(path)):
+        return None
+    for entry in DeltaTable(str(path)).history():
+        if RAW_VERSION_KEY in entry:
+            return entry.get(RAW_TABLE_ID_KEY), int(entry[RAW_VERSION_KEY])
+    return None
+
+
+def build_cubes(raw_path: Path, batch_size: int = 1_000_000, force: bool = False) -> dict:
+    """
+    Matérialise les cubes heure / jour / semaine par parcelle et par capteur.
+
+    La table RAW n'est lue qu'une fois (par lots) pour le niveau horaire ; le
+    niveau jour est calculé à partir des heures et la semaine à partir des jours.
+    Les cubes déjà à jour (même table RAW, même version) ne sont pas recalculés.
+    """
+    source = raw_source(raw_path)
+    raw_table_id, raw_version = source
+    todo = [
+        dimension for dimension in DIMENSIONS
+        if force or any(cube_source(dimension, level) != source for level in LEVELS)
+    ]
+    if not todo:
+        return {"raw_version": raw_version, "built": []}
+
+    dataset = DeltaTable(str(raw_path), version=raw_version).to_pyarrow_dataset()
+    columns = ["measurement_ts", *{DIMENSIONS[d] for d in todo}, *METRICS]
+    partials: dict[str, list[pa.Table]] = {dimension: [] for dimension in todo}
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        if batch.num_rows:
+            for dimension in todo:
+                partials[dimension].append(raw_states(batch, DIMENSIONS[dimension]))
+
+    built = []
+    commit = CommitProperties(
+        custom_metadata={RAW_VERSION_KEY: str(raw_version), RAW_TABLE_ID_KEY: raw_table_id}
+    )
+    for dimension in todo:
+        key = DIMENSIONS[dimension]
+        cube = combine_states(pa.concat_tables(partials[dimension]), key)
+        for level in LEVELS:
+            if level != "hour":
+                cube = combine_states(cube, key, level=level)
+            cube = cube.sort_by([("bucket", "ascending"), (key, "ascending")])
+            # Trié par bucket + petits row groups : un filtre sur la période ne lit
+            # que les row groups concernés (statistiques min/max Parquet)
+            write_deltalake(
+                str(cube_path(dimension, level)), cube,
+                mode="overwrite", schema_mode="overwrite", commit_properties=commit,
+                writer_properties=WriterProperties(max_row_group_size=ROW_GROUP_SIZE),
+            )
+            built.append({"cube": f"{dimension}_{level}", "rows": cube.num_rows})
+    return {"raw_version": raw_version, "built": built}
+
+
+# -----------------------------
+# Requêtes
+# -----------------------------
+def choose_level(granularity: str, start: datetime | None, end: datetime | None) -> str:
+    """
+    Niveau le plus grossier utilisable : pas plus grossier que la granularité
+    demandée, et dont les frontières tombent sur les bornes [start, end).
+    """
+    candidates = LEVELS if granularity == "total" else LEVELS[: LEVELS.index(granularity) + 1]
+    for level in reversed(candidates):
+        if is_aligned(start, level) and is_aligned(end, level):
+            return level
+    return "hour"
+
+
+def finalize(states: pa.Table, metric: str, aggregate: str) -> pa.Array:
+    count = pc.cast(states[f"{metric}_count"], pa.float64())
+    total = states[f"{metric}_sum"]
+    empty = pc.equal(count, 0)
+    if aggregate == "count":
+        return states[f"{metric}_count"]
+    if aggregate == "sum":
+        return pc.if_else(empty, pa.scalar(None, pa.float64()), total)
+    if aggregate == "min":
+        return states[f"{metric}_min"]
+    if aggregate == "max":
+        return states[f"{metric}_max"]
+    if aggregate == "avg":
+        return pc.if_else(empty, pa.scalar(None, pa.float64()), pc.divide(total, count))
+    # Variance d'échantillon (comme variance() / stddev() en Spark) : (Σx² - (Σx)²/n) / (n - 1)
+    variance = pc.divide(
+        pc.subtract(states[f"{metric}_sumsq"], pc.divide(pc.multiply(total, total), count)),
+        pc.subtract(count, 1),
+    )
+    variance = pc.if_else(
+        pc.less_equal(count, 1), pa.scalar(None, pa.float64()), pc.max_element_wise(variance, 0.0)
+    )
+    return pc.sqrt(variance) if aggregate == "stddev" else variance
+
+
+def query_cube(
+    metric: str,
+    aggregate: str,
+    dimension: str = "parcel",
+    granularity: str = "total",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    keys: list[str] | None = None,
+) -> tuple[pa.Table, str]:
+    """
+    Répond à `aggregate(metric)` par parcelle ou capteur, sur [start, end),
+    groupé par heure / jour / semaine ou sur toute la période ("total").
+
+    Returns:
+        (résultat, niveau de cube utilisé)
+    """
+    if metric not in METRICS or aggregate not in AGGREGATES:
+        raise ValueError(f"Agrégat non supporté : {aggregate}({metric})")
+    if granularity not in LEVELS and granularity != "total":
+        raise ValueError(f"Granularité inconnue : {granularity}")
+
+    key = DIMENSIONS[dimension]
+    level = choose_level(granularity, start, end)
+
+    expression = ds.scalar(True)
+    if start is not None:
+        expression &= ds.field("bucket") >= pa.scalar(start, pa.timestamp("us"))
+    if end is not None:
+        expression &= ds.field("bucket") < pa.scalar(end, pa.timestamp("us"))
+    if keys:
+        expression &= ds.field(key).isin(keys)
+
+    columns = ["bucket", key, *(f"{metric}_{state}" for state in STATES)]
+    states = DeltaTable(str(cube_path(dimension, level))).to_pyarrow_dataset().to_table(
+        columns=columns, filter=expression
+    )
+    if granularity == "total":
+        states = combine_states(states.drop_columns(["bucket"]), key)
+    elif granularity != level:
+        states = combine_states(states, key, level=granularity)
+
+    group_keys = [key] if granularity == "total" else ["bucket", key]
+    result = pa.table({
+        **{k: states[k] for k in group_keys},
+        f"{aggregate}_{metric}": finalize(states, metric, aggregate),
+    })
+    return result.sort_by([(k, "ascending") for k in group_keys]), level
+
+
+# -----------------------------
+# Contrôle : mêmes requêtes directement sur la table RAW
+# -----------------------------
+RAW_FUNCTIONS = {
+    "count": ("count", None),
+    "sum": ("sum", None),
+    "avg": ("mean", None),
+    "min": ("min", None),
+    "max": ("max", None),
+    "variance": ("variance", pc.VarianceOptions(ddof=1)),
+    "stddev": ("stddev", pc.VarianceOptions(ddof=1)),
+}
+
+
+def query_raw(
+    raw_path: Path, metric: str, aggregate: str, dimension: str, granularity: str,
+    start: datetime | None, end: datetime | None,
+) -> pa.Table:
+    """Même requête calculée sur la table RAW (ce que faisaient les dashboards)."""
+    key = DIMENSIONS[dimension]
+    expression = ds.scalar(True)
+    if start is not None:
+        expression &= ds.field("measurement_ts") >= pa.scalar(start, pa.timestamp("us"))
+    if end is not None:
+        expression &= ds.field("measurement_ts") < pa.scalar(end, pa.timestamp("us"))
+    rows = DeltaTable(str(raw_path)).to_pyarrow_dataset().to_table(
+        columns=["measurement_ts", key, metric], filter=expression
+    )
+    group_keys = [key]
+    if granularity != "total":
+        rows = rows.append_column("bucket", bucket_start(rows["measurement_ts"], granularity))
+        group_keys = ["bucket", key]
+    function, options = RAW_FUNCTIONS[aggregate]
+    result = rows.group_by(group_keys).aggregate([(metric, function, options)])
+    return pa.table({
+        **{k: result[k] for k in group_keys},
+        f"{aggregate}_{metric}": result[f"{metric}_{function}"],
+    }).sort_by([(k, "ascending") for k in group_keys])
+
+
+def same_result(left: pa.Table, right: pa.Table, tolerance: float = 1e-6) -> bool:
+    if left.num_rows != right.num_rows or left.column_names != right.column_names:
+        return False
+    for name in left.column_names:
+        a, b = left[name].to_pylist(), right[name].to_pylist()
+        for x, y in zip(a, b):
+            if isinstance(x, float) or isinstance(y, float):
+                if (x is None) != (y is None) or (x is not None and abs(x - y) > tolerance * max(1.0, abs(y))):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def check_queries(raw_path: Path, count: int = 30, seed: int = 0) -> bool:
+    """Requêtes aléatoires : résultat du cube == résultat calculé sur la table RAW."""
+    timestamps = DeltaTable(str(raw_path)).to_pyarrow_table(columns=["measurement_ts"])["measurement_ts"]
+    first, last = pc.min(timestamps).as_py(), pc.max(timestamps).as_py()
+    span_hours = int((last - first).total_seconds() // 3600) + 1
+    rng = random.Random(seed)
+    ok = True
+    for _ in range(count):
+        metric, aggregate = rng.choice(METRICS), rng.choice(AGGREGATES)
+        dimension, granularity = rng.choice(list(DIMENSIONS)), rng.choice([*LEVELS, "total"])
+        start = first.replace(minute=0, second=0, microsecond=0) + timedelta(hours=rng.randrange(span_hours))
+        start = rng.choice([start, start.replace(hour=0), start.replace(hour=0) - timedelta(days=start.weekday())])
+        end = start + timedelta(hours=rng.choice([5, 24, 72, 24 * 7, 24 * 14]))
+
+        t0 = time.perf_counter()
+        result, level = query_cube(metric, aggregate, dimension, granularity, start, end)
+        cube_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        expected = query_raw(raw_path, metric, aggregate, dimension, granularity, start, end)
+        raw_ms = (time.perf_counter() - t0) * 1000
+
+        match = same_result(result, expected)
+        ok &= match
+        print(
+            f"{'✅' if match else '❌'} {aggregate}({metric}) par {dimension:<6} {granularity:<5} "
+            f"[{start:%Y-%m-%d %H:%M}, {end:%Y-%m-%d %H:%M}) → cube {level:<4} "
+            f"{cube_ms:>7.1f} ms (table RAW : {raw_ms:.1f} ms)"
+        )
+    return ok
+
+
+def parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cubes pré-agrégés heure / jour / semaine des mesures capteurs (par parcelle et par capteur)"
+    )
+    parser.add_argument("action", choices=["build", "query", "check"])
+    parser.add_argument("--force", action="store_true", help="build : recalcule même si les cubes sont à jour")
+    parser.add_argument("--metric", choices=METRICS, default="humidity")
+    parser.add_argument("--agg", choices=AGGREGATES, default="avg")
+    parser.add_argument("--dimension", choices=list(DIMENSIONS), default="parcel")
+    parser.add_argument("--granularity", choices=[*LEVELS, "total"], default="day")
+    parser.add_argument("--start", type=parse_datetime, default=None, help="Début inclus (ISO, ex: 2026-01-05)")
+    parser.add_argument("--end", type=parse_datetime, default=None, help="Fin exclue (ISO)")
+    parser.add_argument("--keys", nargs="+", default=None, help="Parcelles ou capteurs à garder")
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        print_title("Construction des cubes")
+        start = time.perf_counter()
+        stats = build_cubes(RAW_PATH, force=args.force)
+        for cube in stats["built"]:
+            print(f"✅ {cube['cube']:<14} {cube['rows']:>9} lignes")
+        if not stats["built"]:
+            print(f"Cubes déjà à jour (version RAW {stats['raw_version']})")
+        print(f"Durée : {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    elif args.action == "query":
+        result, level = query_cube(
+            args.metric, args.agg, args.dimension, args.granularity, args.start, args.end, args.keys
+        )
+        print(f"Cube utilisé : {args.dimension}_{level}")
+        print(result.to_pandas().to_string(index=False))
+
+    else:
+        build_cubes(RAW_PATH)
+        print_title("Contrôle : requêtes sur les cubes vs table RAW")
+        print("\n✅ Tous les résultats sont identiques ?", check_queries(RAW_PATH))
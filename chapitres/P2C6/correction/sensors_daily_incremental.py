@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import argparse
+import shutil
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from deltalake import CommitProperties, DeltaTable, write_deltalake
+
+from sensors_daily_local import (
+    CSV_PATH,
+    DAILY_KEYS,
+    DAILY_PATH,
+    MEASURES,
+    RAW_PATH,
+    RAW_VERSION_KEY,
+    aggregate_daily,
+    compare_daily,
+    daily_partials,
+    finalize_daily,
+    print_title,
+    read_sensors_csv,
+    write_daily,
+    write_raw,
+)
+
+
+# Lignes retirées de la table RAW (leur contribution est soustraite des partiels)
+REMOVED_CHANGES = ["delete", "update_preimage"]
+
+
+# -----------------------------
+# Suivi de la version RAW intégrée
+# -----------------------------
+def processed_raw_version(daily_path: Path) -> int | None:
+    """Dernière version RAW intégrée dans sensors_daily (métadonnée du dernier commit qui la porte)."""
+    if not DeltaTable.is_deltatable(str(daily_path)):
+        return None
+    for entry in DeltaTable(str(daily_path)).history():
+        if RAW_VERSION_KEY in entry:
+            return int(entry[RAW_VERSION_KEY])
+    return None
+
+
+def change_data_feed_enabled(raw_path: Path) -> bool:
+    configuration = DeltaTable(str(raw_path)).metadata().configuration
+    return configuration.get("delta.enableChangeDataFeed", "false").lower() == "true"
+
+
+# -----------------------------
+# Variation des partiels depuis le Change Data Feed
+# -----------------------------
+def raw_changes(raw_path: Path, start_version: int, end_version: int) -> pa.Table:
+    """Lignes ajoutées / retirées de la table RAW entre deux versions (incluses)."""
+    reader = DeltaTable(str(raw_path)).load_cdf(
+        starting_version=start_version,
+        ending_version=end_version,
+        columns=["measurement_ts", "parcel_id", *MEASURES, "_change_type"],
+    )
+    changes = pa.table(reader.read_all())
+    # delta-rs renvoie les chaînes en string_view, que certains kernels Arrow ne gèrent pas
+    return changes.cast(pa.schema([
+        field.with_type(pa.string()) if field.type == pa.string_view() else field
+        for field in changes.schema
+    ]))
+
+
+def change_partials(changes: pa.Table) -> pa.Table:
+    """
+    Partiels signés : +1 pour insert / update_postimage, -1 pour delete /
+    update_preimage. Une correction de mesure retire donc l'ancienne valeur et
+    ajoute la nouvelle ; seuls les groupes (day, parcel_id) touchés apparaissent.
+    """
+    sign = pc.if_else(
+        pc.is_in(changes["_change_type"], pa.array(REMOVED_CHANGES)),
+        pa.scalar(-1, pa.int64()),
+        pa.scalar(1, pa.int64()),
+    )
+    return daily_partials(changes, sign=sign)
+
+
+def merge_partials(daily_path: Path, deltas: pa.Table, raw_version: int) -> dict:
+    """
+    Additionne les variations aux partiels stockés et recalcule les moyennes
+    des groupes touchés (moyenne exacte : somme / nombre, jamais moyenne de moyennes).
+    Un groupe dont il ne reste aucune ligne est supprimé.
+    """
+    updates = {"row_count": "target.row_count + source.row_count"}
+    for measure in MEASURES:
+        total = f"(target.{measure}_sum + source.{measure}_sum)"
+        count = f"(target.{measure}_count + source.{measure}_count)"
+        updates[f"{measure}_sum"] = total
+        updates[f"{measure}_count"] = count
+        updates[f"avg_{measure}"] = f"CASE WHEN {count} = 0 THEN NULL ELSE {total} / CAST({count} AS DOUBLE) END"
+
+    # Bornes de jours touchés : delta-rs écarte les fichiers cibles hors de cette plage
+    first_day, last_day = pc.min(deltas["day"]).as_py(), pc.max(deltas["day"]).as_py()
+    predicate = " AND ".join(
+        [f"target.{key} = source.{key}" for key in DAILY_KEYS]
+        + [f"target.day >= '{first_day.isoformat()}'", f"target.day <= '{last_day.isoformat()}'"]
+    )
+
+    return (
+        DeltaTable(str(daily_path))
+        .merge(
+            source=finalize_daily(deltas),
+            predicate=predicate,
+            source_alias="source",
+            target_alias="target",
+            commit_properties=CommitProperties(custom_metadata={RAW_VERSION_KEY: str(raw_version)}),
+        )
+        .when_matched_delete(predicate="target.row_count + source.row_count = 0")
+        .when_matched_update(updates=updates)
+        .when_not_matched_insert_all()
+        .execute()
+    )
+
+
+# -----------------------------
+# Rafraîchissement
+# -----------------------------
+def refresh_daily(raw_path: Path, daily_path: Path) -> dict:
+    """
+    Met sensors_daily à jour à partir des commits RAW postérieurs à la dernière
+    version intégrée.
+
+    - aucun nouveau commit : rien à faire ;
+    - Change Data Feed disponible : seuls les groupes touchés sont recalculés et mergés ;
+    - sinon (première exécution, CDF désactivé ou historique nettoyé) : reconstruction complète.
+    """
+    raw_version = DeltaTable(str(raw_path)).version()
+    last_version = processed_raw_version(daily_path)
+
+    if last_version is not None and last_version >= raw_version:
+        return {"mode": "noop", "raw_version": raw_version, "groups": 0}
+
+    if last_version is not None and change_data_feed_enabled(raw_path):
+        try:
+            changes = raw_changes(raw_path, last_version + 1, raw_version)
+        except Exception as e:  # noqa: BLE001 - versions vacuumées, CDF activé en cours de route...
+            print(f"⚠️ Change Data Feed illisible ({e}) → reconstruction complète")
+        else:
+            deltas = change_partials(changes)
+            if deltas.num_rows == 0:
+                return {"mode": "noop", "raw_version": raw_version, "groups": 0}
+            metrics = merge_partials(daily_path, deltas, raw_version)
+            return {
+                "mode": "incremental",
+                "from_version": last_version + 1,
+                "raw_version": raw_version,
+                "changed_rows": changes.num_rows,
+                "groups": deltas.num_rows,
+                "inserted": metrics.get("num_target_rows_inserted"),
+                "updated": metrics.get("num_target_rows_updated"),
+                "deleted": metrics.get("num_target_rows_deleted"),
+            }
+
+    daily = aggregate_daily(raw_path, version=raw_version)
+    write_daily(daily, daily_path, raw_version)
+    return {"mode": "full", "raw_version": raw_version, "groups": daily.num_rows}
+
+
+def check_against_full(raw_path: Path, daily_path: Path) -> bool:
+    """Compare sensors_daily à un recalcul complet (moyennes à 1e-9 près)."""
+    full = aggregate_daily(raw_path).to_pandas()
+    current = DeltaTable(str(daily_path)).to_pandas()
+    return compare_daily(current, full) and bool((current["row_count"] > 0).all())
+
+
+# -----------------------------
+# Démo : nouvelles mesures, correction, suppression
+# -----------------------------
+def new_readings(raw_path: Path, hours: int) -> pa.Table:
+    """Simule `hours` heures de nouvelles mesures : les dernières lignes RAW décalées dans le temps."""
+    raw = DeltaTable(str(raw_path)).to_pyarrow_table()
+    last_ts = pc.max(raw["measurement_ts"]).as_py()
+    recent = raw.filter(pc.greater(raw["measurement_ts"], pa.scalar(last_ts - timedelta(hours=hours))))
+    shifted = pc.add(recent["measurement_ts"], pa.scalar(timedelta(hours=hours), pa.duration("us")))
+    return recent.set_column(0, "measurement_ts", shifted)
+
+
+def timed_refresh(label: str) -> None:
+    start = time.perf_counter()
+    stats = refresh_daily(RAW_PATH, DAILY_PATH)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:>8.1f} ms  {stats}")
+    print("   conforme au recalcul complet ?", check_against_full(RAW_PATH, DAILY_PATH))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rafraîchissement incrémental de sensors_daily à partir des commits de la table RAW"
+    )
+    parser.add_argument("--demo", action="store_true",
+                        help="Repart de zéro et rejoue append / update / delete sur la table RAW")
+    parser.add_argument("--scale", type=int, default=1, help="Taille des données de la démo (défaut: 1)")
+
+    args = parser.parse_args()
+
+    if not args.demo:
+        print(refresh_daily(RAW_PATH, DAILY_PATH))
+        raise SystemExit(0)
+
+    for path in (RAW_PATH, DAILY_PATH):
+        if path.exists():
+            shutil.rmtree(path)
+    RAW_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    print_title("1) Chargement initial puis premier rafraîchissement (complet)")
+    write_raw(read_sensors_csv(CSV_PATH, scale=args.scale), RAW_PATH)
+    timed_refresh("premier rafraîchissement")
+    timed_refresh("sans nouveau commit")
+
+    print_title("2) Append de quelques heures de mesures")
+    write_deltalake(str(RAW_PATH), new_readings(RAW_PATH, hours=3), mode="append")
+    timed_refresh("après append (3 h)")
+
+    print_title("3) Correction d'une mesure (update) + suppression d'un capteur (delete)")
+    raw = DeltaTable(str(RAW_PATH))
+    raw.update(predicate="sensor_id = 'S-013' AND humidity > 50", new_values={"humidity": 50.0})
+    DeltaTable(str(RAW_PATH)).delete("sensor_id = 'S-006'")
+    timed_refresh("après update + delete (2 commits)")
+
+    print_title("Comparaison : reconstruction complète")
+    start = time.perf_counter()
+    write_daily(aggregate_daily(RAW_PATH), DAILY_PATH, DeltaTable(str(RAW_PATH)).version())
+    print(f"reconstruction complète                  {(time.perf_counter() - start) * 1000:>8.1f} ms")
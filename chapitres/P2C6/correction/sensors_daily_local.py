@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import argparse
+import shutil
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from deltalake import CommitProperties, DeltaTable, write_deltalake
+
+
+def print_title(title: str) -> None:
+    print("\n" + "=" * 90)
+    print(title)
+    print("=" * 90)
+
+
+# -----------------------------
+# Paths
+# -----------------------------
+BASE = Path(__file__).parent
+CSV_PATH = BASE.parent / "src" / "greenfarm_sensors.csv"
+RAW_PATH = BASE / "data" / "raw_sensors"
+DAILY_PATH = BASE / "data" / "sensors_daily"
+
+# Même schéma que le notebook (measurement_ts directement typé en timestamp)
+RAW_SCHEMA = pa.schema([
+    ("measurement_ts", pa.timestamp("us")),
+    ("parcel_id", pa.string()),
+    ("sensor_id", pa.string()),
+    ("humidity", pa.float64()),
+    ("temperature", pa.float64()),
+    ("soil_ph", pa.float64()),
+    ("battery_pct", pa.float64()),
+])
+
+DAILY_KEYS = ["day", "parcel_id"]
+MEASURES = ["humidity", "temperature"]
+
+# Version de la table RAW intégrée dans sensors_daily (métadonnée du commit Delta)
+RAW_VERSION_KEY = "sensors_daily.raw_version"
+
+
+# -----------------------------
+# RAW : CSV -> Delta
+# -----------------------------
+def read_sensors_csv(csv_path: Path, scale: int = 1) -> pa.Table:
+    """
+    Lit le CSV en Arrow (parsing multithread, pas de pandas).
+
+    scale > 1 : duplique les données en décalant les dates, pour mesurer le
+    job sur un volume plus proche de la production (mêmes parcelles, plus de jours).
+    """
+    table = pa_csv.read_csv(
+        csv_path,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=RAW_SCHEMA, include_columns=RAW_SCHEMA.names
+        ),
+    )
+    if scale <= 1:
+        return table
+
+    ts = table["measurement_ts"]
+    span = pc.max(ts).as_py() - pc.min(ts).as_py() + timedelta(days=1)
+    copies = []
+    for i in range(scale):
+        shifted = pc.add(ts, pa.scalar(span * i, pa.duration("us")))
+        copies.append(table.set_column(0, "measurement_ts", shifted))
+    return pa.concat_tables(copies)
+
+
+def write_raw(table: pa.Table, raw_path: Path) -> None:
+    """Écrit la table RAW avec le Change Data Feed activé (lu par le rafraîchissement incrémental)."""
+    write_deltalake(
+        str(raw_path),
+        table,
+        mode="overwrite",
+        configuration={"delta.enableChangeDataFeed": "true"},
+    )
+
+
+# -----------------------------
+# Agrégation vectorisée (hash aggregation Arrow)
+# -----------------------------
+def daily_partials(batch: pa.RecordBatch | pa.Table, sign: pa.Array | None = None) -> pa.Table:
+    """
+    Agrégats partiels d'un lot de mesures : nombre de lignes, somme et nombre de
+    valeurs non nulles par (day, parcel_id). Les partiels de plusieurs lots se
+    combinent en les additionnant, ce qui permet de lire la table RAW par lots
+    (mémoire bornée) et de mettre sensors_daily à jour de façon incrémentale.
+
+    sign : +1 / -1 par ligne (lignes ajoutées / retirées), pour calculer la
+    variation des partiels à partir du Change Data Feed.
+    """
+    if sign is None:
+        sign = pa.repeat(pa.scalar(1, pa.int64()), batch.num_rows)
+    columns = {
+        "day": pc.cast(batch["measurement_ts"], pa.date32()),  # to_date(measurement_ts)
+        "parcel_id": batch["parcel_id"],
+        "row_count": sign,
+    }
+    for measure in MEASURES:
+        values = batch[measure]
+        columns[f"{measure}_sum"] = pc.multiply(values, pc.cast(sign, pa.float64()))
+        columns[f"{measure}_count"] = pc.if_else(pc.is_valid(values), sign, 0)
+    return combine_partials(pa.table(columns))
+
+
+def combine_partials(partials: pa.Table) -> pa.Table:
+    """Additionne des partiels ayant les mêmes clés (day, parcel_id)."""
+    columns = [c for c in partials.column_names if c not in DAILY_KEYS]
+    # min_count=0 : une somme sans valeur non nulle vaut 0 (et non null)
+    combined = partials.group_by(DAILY_KEYS).aggregate(
+        [(c, "sum", pc.ScalarAggregateOptions(min_count=0)) for c in columns]
+    )
+    return pa.table({
+        **{key: combined[key] for key in DAILY_KEYS},
+        **{c: combined[f"{c}_sum"] for c in columns},
+    })
+
+
+def finalize_daily(partials: pa.Table) -> pa.Table:
+    """
+    avg = somme / nombre (null si aucune valeur, comme avg() en Spark).
+
+    Les partiels (row_count, <mesure>_sum, <mesure>_count) restent dans la table :
+    le rafraîchissement incrémental les additionne aux nouveaux partiels.
+    """
+    columns = {key: partials[key] for key in DAILY_KEYS}
+    for measure in MEASURES:
+        count = partials[f"{measure}_count"]
+        columns[f"avg_{measure}"] = pc.if_else(
+            pc.equal(count, 0),
+            pa.scalar(None, pa.float64()),
+            pc.divide(partials[f"{measure}_sum"], pc.cast(count, pa.float64())),
+        )
+    columns["row_count"] = partials["row_count"]
+    for measure in MEASURES:
+        columns[f"{measure}_sum"] = partials[f"{measure}_sum"]
+        columns[f"{measure}_count"] = partials[f"{measure}_count"]
+    return pa.table(columns).sort_by([(key, "ascending") for key in DAILY_KEYS])
+
+
+def aggregate_daily(raw_path: Path, batch_size: int = 1_000_000, version: int | None = None) -> pa.Table:
+    """
+    sensors_daily sans Spark : lecture de la table RAW par lots (projection sur
+    les 4 colonnes utiles), agrégats partiels par lot puis combinaison.
+    """
+    dataset = DeltaTable(str(raw_path), version=version).to_pyarrow_dataset()
+    columns = ["measurement_ts", "parcel_id", *MEASURES]
+    partials = [
+        daily_partials(batch)
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size)
+        if batch.num_rows
+    ]
+    if not partials:
+        return finalize_daily(daily_partials(RAW_SCHEMA.empty_table()))
+    return finalize_daily(combine_partials(pa.concat_tables(partials)))
+
+
+def write_daily(daily: pa.Table, daily_path: Path, raw_version: int) -> None:
+    """Reconstruction complète ; `raw_version` est la version RAW agrégée."""
+    write_deltalake(
+        str(daily_path),
+        daily,
+        mode="overwrite",
+        schema_mode="overwrite",
+        commit_properties=CommitProperties(custom_metadata={RAW_VERSION_KEY: str(raw_version)}),
+    )
+
+
+# -----------------------------
+# Référence : calcul du notebook (to_date + groupBy + avg) en pandas
+# -----------------------------
+def reference_daily(raw_path: Path) -> pd.DataFrame:
+    df = DeltaTable(str(raw_path)).to_pandas()
+    df["day"] = df["measurement_ts"].dt.date
+    return (
+        df.groupby(DAILY_KEYS, as_index=False)
+        .agg(avg_humidity=("humidity", "mean"), avg_temperature=("temperature", "mean"))
+        .sort_values(DAILY_KEYS)
+        .reset_index(drop=True)
+    )
+
+
+def compare_daily(result: pd.DataFrame, expected: pd.DataFrame, tolerance: float = 1e-9) -> bool:
+    """Mêmes clés (day, parcel_id) et mêmes moyennes à `tolerance` près."""
+    result = result.assign(day=pd.to_datetime(result["day"])).sort_values(DAILY_KEYS).reset_index(drop=True)
+    expected = expected.assign(day=pd.to_datetime(expected["day"])).sort_values(DAILY_KEYS).reset_index(drop=True)
+    if len(result) != len(expected):
+        return False
+    if not result[DAILY_KEYS].equals(expected[DAILY_KEYS]):
+        return False
+    for column in [f"avg_{m}" for m in MEASURES]:
+        diff = (result[column] - expected[column]).abs().fillna(0)
+        if (diff > tolerance).any():
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Construit sensors_daily (moyennes par jour et parcelle) en local, sans Spark"
+    )
+    parser.add_argument("--csv", type=Path, default=CSV_PATH, help="CSV des mesures (greenfarm_sensors.csv)")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Duplique les données N fois (jours décalés) pour le benchmark (défaut: 1)")
+    parser.add_argument("--batch-size", type=int, default=1_000_000, help="Lignes par lot lu (défaut: 1000000)")
+    parser.add_argument("--expected", type=Path, default=None,
+                        help="Export CSV de agriculture.analytics.sensors_daily (notebook) à comparer")
+
+    args = parser.parse_args()
+
+    # Rejouable : on repart de zéro
+    for path in (RAW_PATH, DAILY_PATH):
+        if path.exists():
+            shutil.rmtree(path)
+    RAW_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    print_title("1) RAW : CSV -> table Delta raw_sensors")
+    raw = read_sensors_csv(args.csv, scale=args.scale)
+    write_raw(raw, RAW_PATH)
+    print(f"✅ {raw.num_rows} mesures écrites dans {RAW_PATH}")
+
+    print_title("2) sensors_daily : agrégation Arrow par (day, parcel_id)")
+    raw_version = DeltaTable(str(RAW_PATH)).version()
+    start = time.perf_counter()
+    daily = aggregate_daily(RAW_PATH, batch_size=args.batch_size, version=raw_version)
+    local_s = time.perf_counter() - start
+    start = time.perf_counter()
+    write_daily(daily, DAILY_PATH, raw_version)
+    write_s = time.perf_counter() - start
+    print(daily.select(DAILY_KEYS + [f"avg_{m}" for m in MEASURES]).slice(0, 20).to_pandas())
+    print(f"✅ {daily.num_rows} lignes écrites dans {DAILY_PATH} (écriture : {write_s * 1000:.1f} ms)")
+
+    print_title("3) Comparaison avec le calcul du notebook (pandas)")
+    start = time.perf_counter()
+    expected = reference_daily(RAW_PATH)
+    reference_s = time.perf_counter() - start
+    result = DeltaTable(str(DAILY_PATH)).to_pandas()
+
+    print(f"Arrow  (lecture RAW + agrégation) : {local_s * 1000:>9.1f} ms")
+    print(f"pandas (lecture RAW + agrégation) : {reference_s * 1000:>9.1f} ms")
+    print("✅ Résultat identique au calcul du notebook ?", compare_daily(result, expected))
+
+    if args.expected is not None:
+        notebook = pd.read_csv(args.expected)
+        print("✅ Résultat identique à l'export du notebook ?", compare_daily(result, notebook, tolerance=1e-6))
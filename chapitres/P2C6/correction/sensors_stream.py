@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from deltalake import CommitProperties, DeltaTable, write_deltalake
+
+from sensors_daily_incremental import check_against_full, merge_partials, raw_changes, refresh_daily
+from sensors_daily_local import (
+    BASE,
+    CSV_PATH,
+    daily_partials,
+    finalize_daily,
+    print_title,
+    read_sensors_csv,
+    write_daily,
+)
+
+
+# Tables propres au flux : le chargement batch (sensors_daily_local.py) écrit
+# dans data/raw_sensors, un flux qui y ajouterait le CSV compterait tout deux fois
+STREAM_DIR = BASE / "data" / "stream"
+RAW_PATH = STREAM_DIR / "raw_sensors"
+DAILY_PATH = STREAM_DIR / "sensors_daily"
+CORRECTIONS_PATH = STREAM_DIR / "sensors_daily_corrections"
+# Dernier batch entièrement traité (RAW, sensors_daily et corrections)
+CHECKPOINT_PATH = STREAM_DIR / "_checkpoint.json"
+
+# État du flux, enregistré dans les métadonnées du commit d'append RAW
+BATCH_ID_KEY = "sensors_stream.batch_id"
+WATERMARK_KEY = "sensors_stream.watermark"
+
+
+# -----------------------------
+# État du flux (batch_id + watermark)
+# -----------------------------
+def stream_state(raw_path: Path) -> tuple[int, datetime | None, int | None]:
+    """(dernier batch_id ajouté à RAW, watermark, version RAW de cet append) lus dans l'historique."""
+    if not DeltaTable.is_deltatable(str(raw_path)):
+        return -1, None, None
+    for entry in DeltaTable(str(raw_path)).history():
+        if BATCH_ID_KEY in entry:
+            watermark = entry.get(WATERMARK_KEY)
+            return (
+                int(entry[BATCH_ID_KEY]),
+                datetime.fromisoformat(watermark) if watermark else None,
+                entry["version"],
+            )
+    return -1, None, None
+
+
+def read_checkpoint(checkpoint_path: Path) -> tuple[int, datetime | None] | None:
+    """(batch_id, watermark) du dernier batch entièrement traité, None sans checkpoint."""
+    if not checkpoint_path.exists():
+        return None
+    state = json.loads(checkpoint_path.read_text())
+    watermark = state["watermark"]
+    return state["batch_id"], datetime.fromisoformat(watermark) if watermark else None
+
+
+def write_checkpoint(checkpoint_path: Path, batch_id: int, watermark: datetime | None) -> None:
+    """Écriture atomique (fichier temporaire unique puis os.replace)."""
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=checkpoint_path.parent, suffix=".tmp", delete=False) as f:
+        json.dump({"batch_id": batch_id, "watermark": watermark.isoformat() if watermark else None}, f)
+    os.replace(f.name, checkpoint_path)
+
+
+def next_watermark(batch: pa.Table, watermark: datetime | None, lateness: timedelta) -> datetime | None:
+    """
+    Watermark d'event time : plus grand measurement_ts vu, moins le retard toléré.
+    Il ne recule jamais (un batch ancien ne le fait pas régresser).
+    """
+    if batch.num_rows == 0:
+        return watermark
+    candidate = pc.max(batch["measurement_ts"]).as_py() - lateness
+    return candidate if watermark is None else max(watermark, candidate)
+
+
+def split_late(batch: pa.Table, watermark: datetime | None) -> tuple[pa.Table, pa.Table]:
+    """(lignes à l'heure, lignes en retard) par rapport au watermark du batch précédent."""
+    if watermark is None:
+        return batch, batch.slice(0, 0)
+    late = pc.less(batch["measurement_ts"], pa.scalar(watermark, pa.timestamp("us")))
+    return batch.filter(pc.invert(late)), batch.filter(late)
+
+
+# -----------------------------
+# Écritures
+# -----------------------------
+def append_raw(raw_path: Path, batch: pa.Table, batch_id: int, watermark: datetime | None) -> int:
+    """Append du micro-batch dans la table RAW ; batch_id et watermark sont commités avec lui."""
+    metadata = {BATCH_ID_KEY: str(batch_id)}
+    if watermark is not None:
+        metadata[WATERMARK_KEY] = watermark.isoformat()
+    write_deltalake(
+        str(raw_path),
+        batch,
+        mode="append",
+        configuration={"delta.enableChangeDataFeed": "true"},
+        commit_properties=CommitProperties(custom_metadata=metadata),
+    )
+    return DeltaTable(str(raw_path)).version()
+
+
+def corrections_recorded(corrections_path: Path, batch_id: int) -> bool:
+    """Le journal contient-il déjà les corrections de ce batch ?"""
+    if not DeltaTable.is_deltatable(str(corrections_path)):
+        return False
+    dataset = DeltaTable(str(corrections_path)).to_pyarrow_dataset()
+    return dataset.count_rows(filter=pc.field("batch_id") == batch_id) > 0
+
+
+def record_corrections(
+    corrections_path: Path, late: pa.Table, batch_id: int, watermark: datetime
+) -> int:
+    """
+    Journal des corrections : pour chaque (day, parcel_id) touché par des
+    mesures en retard, la variation des partiels appliquée à sensors_daily.
+    Les consommateurs qui ont déjà lu un jour clos savent ainsi qu'il a changé.
+    """
+    partials = daily_partials(late)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    corrections = pa.table({
+        "batch_id": pa.repeat(pa.scalar(batch_id, pa.int64()), partials.num_rows),
+        "watermark": pa.repeat(pa.scalar(watermark, pa.timestamp("us")), partials.num_rows),
+        "corrected_at": pa.repeat(pa.scalar(now, pa.timestamp("us")), partials.num_rows),
+        **{name: partials[name] for name in partials.column_names},
+    })
+    write_deltalake(str(corrections_path), corrections, mode="append")
+    return corrections.num_rows
+
+
+def update_daily(daily_path: Path, batch: pa.Table, raw_version: int) -> None:
+    """Intègre un micro-batch (insert-only) dans sensors_daily sans relire la table RAW."""
+    partials = daily_partials(batch)
+    if not DeltaTable.is_deltatable(str(daily_path)):
+        write_daily(finalize_daily(partials), daily_path, raw_version)
+    else:
+        merge_partials(daily_path, partials, raw_version)
+
+
+# -----------------------------
+# Boucle micro-batch
+# -----------------------------
+def process_batch(
+    batch: pa.Table,
+    batch_id: int,
+    watermark: datetime | None,
+    lateness: timedelta,
+    raw_path: Path = RAW_PATH,
+    daily_path: Path = DAILY_PATH,
+    corrections_path: Path = CORRECTIONS_PATH,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+) -> tuple[datetime | None, dict]:
+    """
+    1. sépare les lignes en retard (event time < watermark courant) ;
+    2. append du batch complet dans RAW, avec le nouveau watermark ;
+    3. merge des partiels du batch dans sensors_daily (jours ouverts et jours clos) ;
+    4. journalise les corrections des jours clos touchés par des lignes en retard ;
+    5. enregistre le batch dans le checkpoint.
+    """
+    _, late = split_late(batch, watermark)
+    new_watermark = next_watermark(batch, watermark, lateness)
+    raw_version = append_raw(raw_path, batch, batch_id, new_watermark)
+    update_daily(daily_path, batch, raw_version)
+    corrected = record_corrections(corrections_path, late, batch_id, watermark) if late.num_rows else 0
+    write_checkpoint(checkpoint_path, batch_id, new_watermark)
+    return new_watermark, {"rows": batch.num_rows, "late_rows": late.num_rows, "corrected_groups": corrected}
+
+
+def resume_stream(
+    raw_path: Path = RAW_PATH,
+    daily_path: Path = DAILY_PATH,
+    corrections_path: Path = CORRECTIONS_PATH,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+) -> tuple[int, datetime | None]:
+    """
+    État de reprise (dernier batch_id, watermark).
+
+    Un arrêt entre l'append RAW et le checkpoint laisse un batch inachevé :
+    sensors_daily est rattrapé via le Change Data Feed et les corrections de
+    ce batch sont recalculées depuis son commit RAW (si le journal ne les a
+    pas déjà), puis le checkpoint est avancé.
+
+    Refuse une table RAW sans checkpoint : elle n'a pas été écrite par ce flux.
+    """
+    checkpoint = read_checkpoint(checkpoint_path)
+    if not DeltaTable.is_deltatable(str(raw_path)):
+        return -1, None
+    if checkpoint is None:
+        raise ValueError(f"{raw_path} existe sans checkpoint de flux ({checkpoint_path.name}) : relancez avec --reset")
+
+    refresh_daily(raw_path, daily_path)
+    checkpoint_batch_id, checkpoint_watermark = checkpoint
+    last_batch_id, watermark, raw_version = stream_state(raw_path)
+    if last_batch_id > checkpoint_batch_id:
+        rows = raw_changes(raw_path, raw_version, raw_version)
+        _, late = split_late(rows, checkpoint_watermark)
+        if late.num_rows and not corrections_recorded(corrections_path, last_batch_id):
+            record_corrections(corrections_path, late, last_batch_id, checkpoint_watermark)
+        write_checkpoint(checkpoint_path, last_batch_id, watermark)
+    return last_batch_id, watermark
+
+
+def run_stream(
+    batches: Iterator[pa.Table],
+    lateness: timedelta,
+    raw_path: Path = RAW_PATH,
+    daily_path: Path = DAILY_PATH,
+    corrections_path: Path = CORRECTIONS_PATH,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+    max_batches: int | None = None,
+) -> list[dict]:
+    """
+    Ingère les micro-batches dans l'ordre. Reprise après arrêt : les batch_id
+    déjà commités dans RAW sont ignorés et un batch inachevé est terminé
+    (voir resume_stream).
+    """
+    last_batch_id, watermark = resume_stream(raw_path, daily_path, corrections_path, checkpoint_path)
+
+    stats = []
+    for batch_id, batch in enumerate(batches):
+        if batch_id <= last_batch_id:
+            continue
+        if max_batches is not None and len(stats) >= max_batches:
+            break
+        start = time.perf_counter()
+        watermark, batch_stats = process_batch(
+            batch, batch_id, watermark, lateness, raw_path, daily_path, corrections_path, checkpoint_path
+        )
+        stats.append({
+            "batch_id": batch_id,
+            "watermark": watermark,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            **batch_stats,
+        })
+    return stats
+
+
+# -----------------------------
+# Source simulée : mesures arrivant avec du retard
+# -----------------------------
+def simulated_arrivals(
+    readings: pa.Table, mean_delay: timedelta, max_delay: timedelta, seed: int
+) -> pa.Table:
+    """
+    Réordonne les mesures selon leur heure d'arrivée simulée : measurement_ts +
+    délai aléatoire (exponentiel, plafonné), comme un capteur qui bufferise
+    pendant une coupure réseau.
+    """
+    rng = np.random.default_rng(seed)
+    delays = np.minimum(
+        rng.exponential(mean_delay.total_seconds(), readings.num_rows), max_delay.total_seconds()
+    )
+    arrival = pc.add(
+        readings["measurement_ts"], pa.array((delays * 1_000_000).astype("int64"), pa.duration("us"))
+    )
+    return readings.take(pc.sort_indices(arrival))
+
+
+def micro_batches(readings: pa.Table, batch_rows: int) -> Iterator[pa.Table]:
+    for offset in range(0, readings.num_rows, batch_rows):
+        yield readings.slice(offset, batch_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingestion micro-batch des mesures avec watermark et corrections des jours clos"
+    )
+    parser.add_argument("--lateness-hours", type=float, default=2.0,
+                        help="Retard toléré avant qu'une mesure soit traitée comme correction (défaut: 2)")
+    parser.add_argument("--batch-rows", type=int, default=20, help="Lignes par micro-batch (défaut: 20)")
+    parser.add_argument("--max-batches", type=int, default=None,
+                        help="S'arrête après N nouveaux batches (relancer pour reprendre)")
+    parser.add_argument("--mean-delay-minutes", type=float, default=120.0,
+                        help="Retard moyen d'arrivée simulé (défaut: 120)")
+    parser.add_argument("--max-delay-hours", type=float, default=72.0,
+                        help="Retard maximal d'arrivée simulé (défaut: 72)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true",
+                        help="Supprime les tables du flux (data/stream) et son checkpoint avant de démarrer")
+
+    args = parser.parse_args()
+
+    if args.reset and STREAM_DIR.exists():
+        shutil.rmtree(STREAM_DIR)
+    STREAM_DIR.mkdir(parents=True, exist_ok=True)
+
+    readings = simulated_arrivals(
+        read_sensors_csv(CSV_PATH),
+        mean_delay=timedelta(minutes=args.mean_delay_minutes),
+        max_delay=timedelta(hours=args.max_delay_hours),
+        seed=args.seed,
+    )
+
+    print_title(f"Micro-batches de {args.batch_rows} lignes, retard toléré {args.lateness_hours} h")
+    try:
+        stats = run_stream(
+            micro_batches(readings, args.batch_rows),
+            lateness=timedelta(hours=args.lateness_hours),
+            max_batches=args.max_batches,
+        )
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    for s in stats:
+        print(
+            f"batch {s['batch_id']:>3} : {s['rows']:>4} lignes, {s['late_rows']:>3} en retard, "
+            f"{s['corrected_groups']:>3} groupes corrigés, watermark {s['watermark']:%Y-%m-%d %H:%M}, "
+            f"{s['latency_ms']:.1f} ms"
+        )
+
+    if stats:
+        latencies = sorted(s["latency_ms"] for s in stats)
+        print_title("Bilan")
+        print(f"Batches : {len(stats)}, lignes : {sum(s['rows'] for s in stats)}, "
+              f"en retard : {sum(s['late_rows'] for s in stats)}")
+        print(f"Latence par batch : médiane {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms")
+        print("✅ sensors_daily conforme au recalcul complet ?", check_against_full(RAW_PATH, DAILY_PATH))
+    else:
+        print("Aucun nouveau batch (déjà ingérés).")